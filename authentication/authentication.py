@@ -0,0 +1,58 @@
+import copy
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from main.cache import TieredCache
+
+user_cache = TieredCache(
+    "byteping:auth:user",
+    local_ttl=settings.BYTEPING_AUTH_LOCAL_TTL,
+    shared_ttl=settings.BYTEPING_AUTH_SHARED_TTL,
+)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves the token's user through user_cache
+
+    The same checks as JWTAuthentication.get_user run against the cached user.
+    authentication.signals invalidates the entry whenever a User is saved or
+    deleted, so password changes, deactivation and email verification apply
+    within BYTEPING_AUTH_LOCAL_TTL seconds in every process. Each request gets
+    its own copy, so changes to request.user do not leak into later requests.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(
+                _("Token contained no recognizable user identification")
+            ) from e
+
+        user = user_cache.get(str(user_id), lambda: self.load_user(user_id))
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(
+                api_settings.REVOKE_TOKEN_CLAIM
+            ) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+
+        return copy.copy(user)
+
+    def load_user(self, user_id):
+        return self.user_model.objects.filter(
+            **{api_settings.USER_ID_FIELD: user_id}
+        ).first()
@@ -0,0 +1,15 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import user_cache
+from .models import User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    """
+    Drop the cached authentication user on any change (password, is_active,
+    is_email_verified, profile fields)
+    """
+    user_cache.invalidate(str(instance.pk))
@@ -1,3 +1,159 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .authentication import CachedJWTAuthentication, user_cache
+from .models import User
+
+
+class AuthenticationQueryCountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        user_cache.clear_local()
+        self.user = User.objects.create_user(
+            username="owner@byteping.invalid",
+            email="owner@byteping.invalid",
+            password="byteping-test",
+        )
+        self.client = APIClient()
+
+    def authenticate(self):
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}"
+        )
+
+    def test_login(self):
+        with self.assertNumQueries(1):
+            response = self.client.post(
+                "/api/auth/login/",
+                {"email": "owner@byteping.invalid", "password": "byteping-test"},
+                format="json",
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_user(self):
+        self.authenticate()
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/auth/user/")
+        self.assertEqual(response.status_code, 200)
+
+    def test_profile(self):
+        self.authenticate()
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/auth/profile/")
+        self.assertEqual(response.status_code, 200)
+
+    def test_update_profile(self):
+        self.authenticate()
+        # Includes invalidating the cached configs of the user's services
+        with self.assertNumQueries(3):
+            response = self.client.put(
+                "/api/auth/profile/update/", {"first_name": "Byte"}, format="json"
+            )
+        self.assertEqual(response.status_code, 200)
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        user_cache.clear_local()
+        self.user = User.objects.create_user(
+            username="owner@byteping.invalid",
+            email="owner@byteping.invalid",
+            password="byteping-test",
+        )
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}"
+        )
+
+    def test_repeat_requests_skip_user_lookup(self):
+        self.client.get("/api/auth/user/")
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/auth/user/")
+        self.assertEqual(response.status_code, 200)
+
+    def test_deactivation_invalidates_cached_user(self):
+        self.client.get("/api/auth/user/")
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get("/api/auth/user/").status_code, 401)
+
+    def test_requests_do_not_share_the_cached_user(self):
+        token = RefreshToken.for_user(self.user).access_token
+        authentication = CachedJWTAuthentication()
+        first = authentication.get_user(token)
+        first.first_name = "Changed"
+        second = authentication.get_user(token)
+        self.assertIsNot(first, second)
+        self.assertEqual(second.first_name, "")
+
+    def test_email_verification_is_visible_immediately(self):
+        self.client.get("/api/auth/user/")
+        self.user.is_email_verified = True
+        self.user.save()
+        response = self.client.get("/api/auth/user/")
+        self.assertTrue(response.data["user"]["is_email_verified"])
+
+
+class RateLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    @override_settings(BYTEPING_RATE_LIMITS={"login_account": (2, 60)})
+    def test_login_is_rejected_before_hashing(self):
+        payload = {"email": "nobody@byteping.invalid", "password": "wrong-password"}
+        for _ in range(2):
+            self.assertEqual(
+                self.client.post(
+                    "/api/auth/login/", payload, format="json"
+                ).status_code,
+                400,
+            )
+        with self.assertNumQueries(0):
+            response = self.client.post("/api/auth/login/", payload, format="json")
+        self.assertEqual(response.status_code, 429)
+
+    @override_settings(BYTEPING_RATE_LIMITS={"forgot_password_ip": (1, 3600)})
+    def test_forgot_password_is_limited_per_ip(self):
+        payload = {"email": "nobody@byteping.invalid"}
+        self.client.post("/api/auth/forgot-password/", payload, format="json")
+        response = self.client.post(
+            "/api/auth/forgot-password/", payload, format="json"
+        )
+        self.assertEqual(response.status_code, 429)
+
+    @override_settings(BYTEPING_RATE_LIMITS={"forgot_password_ip": (1, 3600)})
+    def test_spoofed_forwarded_for_does_not_get_a_fresh_bucket(self):
+        payload = {"email": "nobody@byteping.invalid"}
+        self.client.post(
+            "/api/auth/forgot-password/",
+            payload,
+            format="json",
+            HTTP_X_FORWARDED_FOR="203.0.113.1",
+        )
+        response = self.client.post(
+            "/api/auth/forgot-password/",
+            payload,
+            format="json",
+            HTTP_X_FORWARDED_FOR="203.0.113.2",
+        )
+        self.assertEqual(response.status_code, 429)
+
+    @override_settings(BYTEPING_RATE_LIMITS={"login_account": (2, 60)})
+    def test_limit_slides_with_the_window(self):
+        payload = {"email": "nobody@byteping.invalid", "password": "wrong-password"}
+        with mock.patch("authentication.throttling.time.time") as clock:
+            clock.return_value = 6000.0
+            for _ in range(2):
+                self.client.post("/api/auth/login/", payload, format="json")
+            # Halfway through the next window one of the two has slid out
+            clock.return_value = 6090.0
+            response = self.client.post("/api/auth/login/", payload, format="json")
+            self.assertEqual(response.status_code, 400)
+            response = self.client.post("/api/auth/login/", payload, format="json")
+            self.assertEqual(response.status_code, 429)
@@ -0,0 +1,99 @@
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+from main import metrics
+
+
+class RateLimitThrottle(BaseThrottle):
+    """
+    Sliding-window rate limit kept in the shared cache, keyed by scope and
+    client identity
+
+    Limits are configured in BYTEPING_RATE_LIMITS as scope -> (capacity,
+    seconds), i.e. `capacity` requests per `seconds`. Each window of `seconds`
+    has a counter bumped with add/incr, which are atomic in the shared cache,
+    and a request is allowed while the current count plus the previous window's
+    count, weighted by how much of it still overlaps, stays within capacity.
+    Rejected requests count too, so a client that keeps hammering stays out.
+    DRF checks throttles before the view runs, so a rejected request never
+    reaches password hashing or SMTP.
+    """
+
+    scope = None
+
+    def get_identity(self, request):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        identity = self.get_identity(request)
+        if not identity or self.scope not in settings.BYTEPING_RATE_LIMITS:
+            return True
+
+        capacity, seconds = settings.BYTEPING_RATE_LIMITS[self.scope]
+        store = caches[settings.BYTEPING_SHARED_CACHE]
+        now = time.time()
+        window, elapsed = divmod(now, seconds)
+        prefix = f"byteping:throttle:{self.scope}:{identity}"
+        key = f"{prefix}:{int(window)}"
+        ttl = 2 * math.ceil(seconds) + 1
+
+        store.add(key, 0, ttl)
+        try:
+            current = store.incr(key)
+        except ValueError:
+            # Evicted between add and incr
+            store.add(key, 1, ttl)
+            current = 1
+        previous = store.get(f"{prefix}:{int(window) - 1}", 0)
+        overlap = 1 - elapsed / seconds
+        if previous * overlap + current <= capacity:
+            return True
+
+        if current > capacity or not previous:
+            self.wait_seconds = seconds - elapsed
+        else:
+            # Until enough of the previous window has slid out
+            self.wait_seconds = (overlap - (capacity - current) / previous) * seconds
+        metrics.rate_limit_rejections.inc(scope=self.scope)
+        metrics.flush()
+        return False
+
+    def wait(self):
+        return getattr(self, "wait_seconds", None)
+
+
+class IPThrottle(RateLimitThrottle):
+    def get_identity(self, request):
+        # REMOTE_ADDR unless REST_FRAMEWORK["NUM_PROXIES"] says which
+        # X-Forwarded-For entry the trusted proxies added
+        return self.get_ident(request)
+
+
+class AccountThrottle(RateLimitThrottle):
+    def get_identity(self, request):
+        email = request.data.get("email") if hasattr(request.data, "get") else None
+        return str(email).strip().lower() if email else None
+
+
+class LoginIPThrottle(IPThrottle):
+    scope = "login_ip"
+
+
+class LoginAccountThrottle(AccountThrottle):
+    scope = "login_account"
+
+
+class SignupIPThrottle(IPThrottle):
+    scope = "signup_ip"
+
+
+class ForgotPasswordIPThrottle(IPThrottle):
+    scope = "forgot_password_ip"
+
+
+class ForgotPasswordAccountThrottle(AccountThrottle):
+    scope = "forgot_password_account"
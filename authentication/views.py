@@ -3,7 +3,7 @@ import uuid
 from django.conf import settings
 from django.http import HttpResponse
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
@@ -14,6 +14,13 @@ from authentication.serializers import (
     UserSerializer,
 )
 from .models import User
+from .throttling import (
+    ForgotPasswordAccountThrottle,
+    ForgotPasswordIPThrottle,
+    LoginAccountThrottle,
+    LoginIPThrottle,
+    SignupIPThrottle,
+)
 from django.core.mail import send_mail
 from django.utils.html import escape
 from django.utils.safestring import mark_safe
@@ -24,6 +31,7 @@ from decouple import config
 
 @api_view(["POST"])
 @permission_classes([AllowAny])
+@throttle_classes([SignupIPThrottle])
 def signup(request):
     serializer = SignupSerializer(data=request.data)
     if serializer.is_valid():
@@ -55,6 +63,7 @@ def signup(request):
 
 @api_view(["POST"])
 @permission_classes([AllowAny])
+@throttle_classes([LoginIPThrottle, LoginAccountThrottle])
 def login(request):
     serializer = LoginSerializer(data=request.data)
     if serializer.is_valid():
@@ -79,6 +88,7 @@ def login(request):
 
 @api_view(["POST"])
 @permission_classes([AllowAny])
+@throttle_classes([ForgotPasswordIPThrottle, ForgotPasswordAccountThrottle])
 def forgot_password(request):
     serializer = ForgotPasswordSerializer(data=request.data)
 
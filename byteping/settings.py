@@ -12,7 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from datetime import timedelta
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 import os
 
 import warnings
@@ -56,6 +56,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "django.middleware.gzip.GZipMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -107,6 +108,53 @@ DATABASES = {
     }
 }
 
+# Read replicas, as a comma-separated list of host[:port]. Reads from views marked
+# with main.routers.replica_reads go to a replica that is within
+# BYTEPING_REPLICA_MAX_LAG seconds; everything else uses "default".
+BYTEPING_READ_REPLICAS = []
+for index, replica in enumerate(config("DB_REPLICA_HOSTS", default="", cast=Csv())):
+    host, _, port = replica.partition(":")
+    alias = f"replica_{index}"
+    DATABASES[alias] = {
+        **DATABASES["default"],
+        "HOST": host,
+        "PORT": port or DATABASES["default"]["PORT"],
+        "TEST": {"MIRROR": "default"},
+    }
+    BYTEPING_READ_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ["main.routers.ReplicaRouter"]
+BYTEPING_REPLICA_MAX_LAG = config("BYTEPING_REPLICA_MAX_LAG", default=5, cast=int)
+BYTEPING_REPLICA_LAG_CHECK_SECONDS = config(
+    "BYTEPING_REPLICA_LAG_CHECK_SECONDS", default=5, cast=float
+)
+BYTEPING_READ_YOUR_WRITES_SECONDS = config(
+    "BYTEPING_READ_YOUR_WRITES_SECONDS", default=30, cast=int
+)
+
+# Cache
+# Redis is the shared tier when REDIS_URL is set; main.cache.TieredCache keeps a
+# short-lived per-process copy in front of it. Without Redis every process has
+# its own local-memory cache, which is only suitable for development.
+
+REDIS_URL = config("REDIS_URL", default="")
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+            "KEY_PREFIX": "byteping",
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "byteping",
+        }
+    }
+
 # EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
 # For production, use SMTP:
 
@@ -127,11 +175,14 @@ BACKEND_URL = config("BACKEND_URL")
 # REST Framework configuration
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "authentication.authentication.CachedJWTAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
+    # Reverse proxies in front of the app; client IPs (rate limits) ignore
+    # X-Forwarded-For unless this is set
+    "NUM_PROXIES": config("BYTEPING_NUM_PROXIES", default=0, cast=int),
 }
 
 # JWT configuration
@@ -197,3 +248,124 @@ Q_CLUSTER = {
     "save_limit": 250,
     "orm": "default",
 }
+
+# BytePing
+BYTEPING_BULK_IMPORT_LIMIT = config("BYTEPING_BULK_IMPORT_LIMIT", default=5000, cast=int)
+BYTEPING_SHARED_CACHE = "default"
+BYTEPING_CHART_DEFAULT_POINTS = config("BYTEPING_CHART_DEFAULT_POINTS", default=300, cast=int)
+BYTEPING_CHART_MAX_POINTS = config("BYTEPING_CHART_MAX_POINTS", default=2000, cast=int)
+# Fair-share dispatch of scheduled checks (see main.dispatch)
+BYTEPING_DISPATCH_QUEUE_TARGET = config(
+    "BYTEPING_DISPATCH_QUEUE_TARGET", default=Q_CLUSTER["queue_limit"], cast=int
+)
+BYTEPING_TENANT_MAX_IN_FLIGHT = config("BYTEPING_TENANT_MAX_IN_FLIGHT", default=20, cast=int)
+BYTEPING_TENANT_CHECKS_PER_MINUTE = config(
+    "BYTEPING_TENANT_CHECKS_PER_MINUTE", default=120, cast=int
+)
+BYTEPING_TENANT_SLOT_TTL = config("BYTEPING_TENANT_SLOT_TTL", default=600, cast=int)
+# Sustained overload: queue deeper than this for this many dispatcher ticks in a row
+# (see main.shedding)
+BYTEPING_OVERLOAD_QUEUE_DEPTH = config(
+    "BYTEPING_OVERLOAD_QUEUE_DEPTH", default=Q_CLUSTER["queue_limit"], cast=int
+)
+BYTEPING_OVERLOAD_TICKS = config("BYTEPING_OVERLOAD_TICKS", default=3, cast=int)
+# Streaming latency baselines and anomaly alerts (see main.anomalies)
+BYTEPING_BASELINE_ALPHA = config("BYTEPING_BASELINE_ALPHA", default=0.05, cast=float)
+BYTEPING_BASELINE_MIN_SAMPLES = config("BYTEPING_BASELINE_MIN_SAMPLES", default=30, cast=int)
+BYTEPING_BASELINE_PERSIST_EVERY = config("BYTEPING_BASELINE_PERSIST_EVERY", default=10, cast=int)
+BYTEPING_ANOMALY_Z = config("BYTEPING_ANOMALY_Z", default=4.0, cast=float)
+BYTEPING_ANOMALY_MIN_DELTA_MS = config("BYTEPING_ANOMALY_MIN_DELTA_MS", default=200, cast=int)
+BYTEPING_ANOMALY_SUSTAIN = config("BYTEPING_ANOMALY_SUSTAIN", default=3, cast=int)
+# Heartbeat monitors (see main.heartbeats)
+BYTEPING_HEARTBEAT_GRACE_SECONDS = config("BYTEPING_HEARTBEAT_GRACE_SECONDS", default=60, cast=int)
+BYTEPING_HEARTBEAT_SWEEP_BATCH = config("BYTEPING_HEARTBEAT_SWEEP_BATCH", default=5000, cast=int)
+# Seconds an unknown heartbeat token is remembered before the database is asked again
+BYTEPING_HEARTBEAT_MISS_TTL = config("BYTEPING_HEARTBEAT_MISS_TTL", default=60, cast=int)
+# Public status pages (see main.status_pages)
+BYTEPING_STATUS_PAGE_DAYS = config("BYTEPING_STATUS_PAGE_DAYS", default=90, cast=int)
+BYTEPING_STATUS_PAGE_INCIDENTS = config("BYTEPING_STATUS_PAGE_INCIDENTS", default=20, cast=int)
+BYTEPING_STATUS_PAGE_REFRESH_MINUTES = config("BYTEPING_STATUS_PAGE_REFRESH_MINUTES", default=5, cast=int)
+BYTEPING_STATUS_PAGE_MAX_AGE = config("BYTEPING_STATUS_PAGE_MAX_AGE", default=30, cast=int)
+BYTEPING_STATUS_PAGE_LOCAL_TTL = config("BYTEPING_STATUS_PAGE_LOCAL_TTL", default=5, cast=float)
+# Remote probe agents (see main.agents)
+BYTEPING_AGENT_POLL_SECONDS = config("BYTEPING_AGENT_POLL_SECONDS", default=60, cast=int)
+BYTEPING_AGENT_MAX_BATCH = config("BYTEPING_AGENT_MAX_BATCH", default=1000, cast=int)
+BYTEPING_AGENT_MAX_BATCH_BYTES = config(
+    "BYTEPING_AGENT_MAX_BATCH_BYTES", default=5 * 1024 * 1024, cast=int
+)
+# Confirmation re-checks after a failure, and backoff for services that stay down
+# or keep flapping (see main.adaptive)
+BYTEPING_CONFIRMATION_CHECKS = config("BYTEPING_CONFIRMATION_CHECKS", default=3, cast=int)
+BYTEPING_CONFIRMATION_DELAY = config("BYTEPING_CONFIRMATION_DELAY", default=30, cast=int)
+BYTEPING_BACKOFF_AFTER_CHECKS = config("BYTEPING_BACKOFF_AFTER_CHECKS", default=10, cast=int)
+BYTEPING_BACKOFF_MAX_INTERVAL = config("BYTEPING_BACKOFF_MAX_INTERVAL", default=60, cast=int)
+BYTEPING_FLAP_WINDOW_DAYS = config("BYTEPING_FLAP_WINDOW_DAYS", default=2, cast=int)
+BYTEPING_FLAP_INCIDENTS = config("BYTEPING_FLAP_INCIDENTS", default=10, cast=int)
+# Per-service probe timeouts: BYTEPING_TIMEOUT_MULTIPLIER x the recent p99 ping,
+# clamped to these bounds (seconds), plus the circuit breaker (see main.probes)
+BYTEPING_TIMEOUT_MULTIPLIER = config("BYTEPING_TIMEOUT_MULTIPLIER", default=4.0, cast=float)
+BYTEPING_CONNECT_TIMEOUT_MIN = config("BYTEPING_CONNECT_TIMEOUT_MIN", default=1.0, cast=float)
+BYTEPING_CONNECT_TIMEOUT_MAX = config("BYTEPING_CONNECT_TIMEOUT_MAX", default=10.0, cast=float)
+BYTEPING_READ_TIMEOUT_MIN = config("BYTEPING_READ_TIMEOUT_MIN", default=2.0, cast=float)
+BYTEPING_READ_TIMEOUT_MAX = config("BYTEPING_READ_TIMEOUT_MAX", default=30.0, cast=float)
+BYTEPING_TIMEOUT_MIN_SAMPLES = config("BYTEPING_TIMEOUT_MIN_SAMPLES", default=20, cast=int)
+BYTEPING_TIMEOUT_WINDOW_HOURS = config("BYTEPING_TIMEOUT_WINDOW_HOURS", default=24, cast=int)
+BYTEPING_TIMEOUT_CACHE_SECONDS = config("BYTEPING_TIMEOUT_CACHE_SECONDS", default=300, cast=int)
+BYTEPING_BREAKER_THRESHOLD = config("BYTEPING_BREAKER_THRESHOLD", default=3, cast=int)
+BYTEPING_BREAKER_TTL = config("BYTEPING_BREAKER_TTL", default=86400, cast=int)
+BYTEPING_AUTH_LOCAL_TTL = config("BYTEPING_AUTH_LOCAL_TTL", default=5, cast=float)
+BYTEPING_AUTH_SHARED_TTL = config("BYTEPING_AUTH_SHARED_TTL", default=300, cast=int)
+BYTEPING_SERVICE_LOCAL_TTL = config("BYTEPING_SERVICE_LOCAL_TTL", default=30, cast=float)
+BYTEPING_SERVICE_SHARED_TTL = config("BYTEPING_SERVICE_SHARED_TTL", default=3600, cast=int)
+# How long whether a service has an open incident is cached, see main.incidents
+BYTEPING_INCIDENT_FLAG_TTL = config("BYTEPING_INCIDENT_FLAG_TTL", default=300, cast=int)
+# Rate limits for unauthenticated endpoints: scope -> (requests, per seconds)
+BYTEPING_RATE_LIMITS = {
+    "login_ip": (30, 60),
+    "login_account": (10, 300),
+    "signup_ip": (10, 3600),
+    "forgot_password_ip": (10, 3600),
+    "forgot_password_account": (3, 3600),
+}
+# Webstatus range partitioning (MySQL), see main.partitions
+BYTEPING_WEBSTATUS_PARTITIONING = config(
+    "BYTEPING_WEBSTATUS_PARTITIONING", default=False, cast=bool
+)
+BYTEPING_WEBSTATUS_PARTITION_GRANULARITY = config(
+    "BYTEPING_WEBSTATUS_PARTITION_GRANULARITY", default="day"
+)
+BYTEPING_WEBSTATUS_PARTITIONS_AHEAD = config(
+    "BYTEPING_WEBSTATUS_PARTITIONS_AHEAD", default=7, cast=int
+)
+BYTEPING_WEBSTATUS_RETENTION_DAYS = config(
+    "BYTEPING_WEBSTATUS_RETENTION_DAYS", default=0, cast=int
+)
+# Bearer token for /metrics; without one the endpoint is only served with DEBUG
+BYTEPING_METRICS_TOKEN = config("BYTEPING_METRICS_TOKEN", default="")
+BYTEPING_METRICS_FLUSH_SECONDS = config(
+    "BYTEPING_METRICS_FLUSH_SECONDS", default=10, cast=float
+)
+# Processes that have not flushed for this long are folded into retired totals
+BYTEPING_METRICS_TTL = config("BYTEPING_METRICS_TTL", default=600, cast=int)
+
+# Opt-in per-phase task tracing, with cProfile dumps for a sample of slow runs
+BYTEPING_TASK_TRACING = config("BYTEPING_TASK_TRACING", default=False, cast=bool)
+BYTEPING_SLOW_TASK_SECONDS = config("BYTEPING_SLOW_TASK_SECONDS", default=5.0, cast=float)
+BYTEPING_PROFILE_SAMPLE_RATE = config(
+    "BYTEPING_PROFILE_SAMPLE_RATE", default=0.0, cast=float
+)
+BYTEPING_PROFILE_DIR = config("BYTEPING_PROFILE_DIR", default=str(BASE_DIR / "profiles"))
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "plain": {"format": "%(message)s"},
+    },
+    "handlers": {
+        "console": {"class": "logging.StreamHandler", "formatter": "plain"},
+    },
+    "loggers": {
+        "byteping": {"handlers": ["console"], "level": "INFO", "propagate": False},
+    },
+}
@@ -0,0 +1,133 @@
+"""
+Adaptive check frequency
+
+After a service goes down, a short burst of confirmation checks runs every
+BYTEPING_CONFIRMATION_DELAY seconds (bounded by BYTEPING_CONFIRMATION_CHECKS per
+incident), and the alert waits for the first confirmation. Services that stay
+down, or keep flapping, have their dispatch interval stretched up to
+BYTEPING_BACKOFF_MAX_INTERVAL minutes until they recover. Each Webstatus row
+records which kind of check produced it.
+"""
+
+from django.conf import settings
+from django.utils import timezone
+from django_q.models import Schedule
+
+from .models import Incident, WebService
+
+SCHEDULED = "scheduled"
+CONFIRMATION = "confirmation"
+BACKOFF = "backoff"
+
+
+def confirmation_schedule_name(webservice_id):
+    return f"byteping_confirm_{webservice_id}"
+
+
+def should_alert(check_type, incident, confirmations_left):
+    """
+    Whether a failed check sends the alert email
+
+    With confirmations on, the check that opens an incident stays quiet and the
+    first confirmation check alerts instead; later confirmations do not repeat it.
+    """
+    if not settings.BYTEPING_CONFIRMATION_CHECKS:
+        return True
+    if check_type == CONFIRMATION:
+        return confirmations_left == settings.BYTEPING_CONFIRMATION_CHECKS
+    return incident != "opened"
+
+
+def schedule_confirmation(webservice_id, remaining):
+    """
+    Run one confirmation check after BYTEPING_CONFIRMATION_DELAY seconds
+    `remaining` counts this check and any that may follow it. django-q's
+    scheduler polls about every 30 seconds, which bounds the delay.
+    """
+    Schedule.objects.filter(name=confirmation_schedule_name(webservice_id)).delete()
+    Schedule.objects.create(
+        name=confirmation_schedule_name(webservice_id),
+        func="main.tasks.monitor_webservice",
+        args=repr((webservice_id,)),
+        kwargs=repr({"check_type": CONFIRMATION, "confirmations_left": remaining}),
+        schedule_type=Schedule.ONCE,
+        repeats=-1,
+        next_run=timezone.now()
+        + timezone.timedelta(seconds=settings.BYTEPING_CONFIRMATION_DELAY),
+    )
+
+
+def backoff_interval(base, failed_checks, flapping):
+    """
+    Interval in minutes for a service that has failed `failed_checks` checks in a
+    row, doubling every BYTEPING_BACKOFF_AFTER_CHECKS failures, capped at
+    BYTEPING_BACKOFF_MAX_INTERVAL
+    """
+    steps = failed_checks // settings.BYTEPING_BACKOFF_AFTER_CHECKS
+    if flapping:
+        steps = max(steps, 1)
+    interval = base * 2**steps
+    return max(base, min(interval, settings.BYTEPING_BACKOFF_MAX_INTERVAL))
+
+
+def is_flapping(webservice_id):
+    since = timezone.now() - timezone.timedelta(days=settings.BYTEPING_FLAP_WINDOW_DAYS)
+    return (
+        Incident.objects.filter(
+            webservice_id=webservice_id, started_at__gte=since
+        ).count()
+        >= settings.BYTEPING_FLAP_INCIDENTS
+    )
+
+
+def set_interval(webservice, minutes):
+    """
+    Make the dispatcher plan the service's checks `minutes` apart, tagging them
+    as backoff checks while that is longer than the configured interval
+    """
+    backoff = minutes if minutes > webservice.monitor_interval else None
+    WebService.objects.filter(id=webservice.id).exclude(
+        backoff_interval=backoff
+    ).update(backoff_interval=backoff)
+
+
+def follow_up(webservice, check_type, confirmations_left, status_ok, incident):
+    """
+    Schedule confirmations and adjust the check interval after a check
+
+    Only failures, recoveries and checks already backed off run queries here;
+    a healthy service on its normal schedule costs nothing.
+    """
+    if status_ok:
+        if incident == "closed":
+            Schedule.objects.filter(
+                name=confirmation_schedule_name(webservice.id)
+            ).delete()
+        if incident == "closed" or check_type == BACKOFF:
+            flapping = is_flapping(webservice.id)
+            set_interval(
+                webservice, backoff_interval(webservice.monitor_interval, 0, flapping)
+            )
+        return
+
+    if incident == "opened" and check_type != CONFIRMATION:
+        if settings.BYTEPING_CONFIRMATION_CHECKS:
+            schedule_confirmation(webservice.id, settings.BYTEPING_CONFIRMATION_CHECKS)
+        return
+
+    if check_type == CONFIRMATION:
+        if confirmations_left and confirmations_left > 1:
+            schedule_confirmation(webservice.id, confirmations_left - 1)
+        return
+
+    failed_checks = (
+        Incident.objects.filter(webservice_id=webservice.id, ended_at__isnull=True)
+        .values_list("check_count", flat=True)
+        .first()
+        or 0
+    )
+    if failed_checks >= settings.BYTEPING_BACKOFF_AFTER_CHECKS:
+        set_interval(
+            webservice,
+            backoff_interval(webservice.monitor_interval, failed_checks, False),
+        )
@@ -0,0 +1,171 @@
+"""
+Remote probe agents
+
+An agent authenticates with "Authorization: Agent <token>", pulls the checks
+assigned to it and pushes results back in batches. Each batch carries an
+idempotency key; a batch is applied at most once per agent, so an agent can
+retry a delivery it is unsure about without duplicating Webstatus rows.
+"""
+
+import hashlib
+import secrets
+
+from django.contrib.auth.models import AnonymousUser
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django_q.tasks import async_task
+from rest_framework import exceptions, serializers
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+from rest_framework.permissions import BasePermission
+
+from .adaptive import SCHEDULED, should_alert
+from .anomalies import observe_latency
+from .cache import get_service_config
+from .heartbeats import HTTP
+from .incidents import record_check
+from .models import IngestBatch, ProbeAgent, Webstatus
+from .serializers import WebstatusSerializer
+from .sketches import record_latencies
+
+
+def hash_token(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def create_agent(name):
+    """
+    Create an agent and return it with its plain token (not stored anywhere)
+    """
+    token = secrets.token_urlsafe(32)
+    agent = ProbeAgent.objects.create(name=name, token_hash=hash_token(token))
+    return agent, token
+
+
+class ProbeAgentAuthentication(BaseAuthentication):
+    keyword = b"agent"
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword:
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed("Invalid agent token header.")
+        try:
+            agent = ProbeAgent.objects.get(
+                token_hash=hash_token(auth[1].decode()), is_active=True
+            )
+        except (ProbeAgent.DoesNotExist, UnicodeDecodeError):
+            raise exceptions.AuthenticationFailed("Invalid agent token.")
+        return AnonymousUser(), agent
+
+    def authenticate_header(self, request):
+        return "Agent"
+
+
+class IsProbeAgent(BasePermission):
+    def has_permission(self, request, view):
+        return isinstance(request.auth, ProbeAgent)
+
+
+class AgentResultSerializer(WebstatusSerializer):
+    """
+    One result pushed by an agent, validated with the Webstatus field rules
+    """
+
+    webservice_id = serializers.IntegerField()
+
+    class Meta(WebstatusSerializer.Meta):
+        fields = ("webservice_id", "ping", "status", "status_code", "date_and_time")
+
+
+def assigned_checks(agent):
+    return list(
+        agent.webservices.filter(is_active=True, monitor_type=HTTP)
+        .order_by("id")
+        .values(
+            "id",
+            "webservice_url",
+            "expect_status_code",
+            "monitor_interval",
+        )
+    )
+
+
+def ingest(agent, idempotency_key, results):
+    """
+    Validate and bulk-write one batch, or return the outcome of its first delivery
+
+    Returns (response body, replayed). Rows for services not assigned to the
+    agent or failing validation are rejected individually.
+    """
+    previous = IngestBatch.objects.filter(
+        agent=agent, idempotency_key=idempotency_key
+    ).first()
+    if previous is not None:
+        return {"accepted": previous.accepted, "rejected": previous.rejected}, True
+
+    assigned = set(
+        agent.webservices.filter(monitor_type=HTTP).values_list("id", flat=True)
+    )
+    rows, errors = [], []
+    for index, result in enumerate(results):
+        serializer = AgentResultSerializer(data=result)
+        if not serializer.is_valid():
+            errors.append({"row": index, "error": serializer.errors})
+        elif serializer.validated_data["webservice_id"] not in assigned:
+            errors.append({"row": index, "error": "WebService not assigned to agent."})
+        else:
+            rows.append(Webstatus(**serializer.validated_data))
+
+    try:
+        with transaction.atomic():
+            IngestBatch.objects.create(
+                agent=agent,
+                idempotency_key=idempotency_key,
+                accepted=len(rows),
+                rejected=len(errors),
+            )
+            Webstatus.objects.bulk_create(rows, batch_size=500)
+    except IntegrityError:
+        # A concurrent delivery of the same batch won
+        previous = IngestBatch.objects.get(agent=agent, idempotency_key=idempotency_key)
+        return {"accepted": previous.accepted, "rejected": previous.rejected}, True
+
+    fold_results(rows)
+    ProbeAgent.objects.filter(id=agent.id).update(last_seen_at=timezone.now())
+    return {"accepted": len(rows), "rejected": len(errors), "errors": errors}, False
+
+
+def fold_results(rows):
+    """
+    Keep incidents, latency baselines and sketches current for ingested rows
+
+    Alerts follow the local confirmation policy, with the agent's next failed
+    result for a service standing in for the confirmation check: the result
+    that opens an incident stays quiet. Alerts are queued, at most one per
+    service and batch, so a batch is not held up by SMTP.
+    """
+    alerted = set()
+    for row in sorted(rows, key=lambda row: row.date_and_time):
+        incident = record_check(
+            row.webservice_id, row.date_and_time, row.status, row.status_code
+        )
+        anomaly = None
+        if row.status:
+            anomaly, baseline = observe_latency(row.webservice_id, row.ping)
+        down_alert = not row.status and should_alert(SCHEDULED, incident, None)
+        if row.webservice_id in alerted or not (down_alert or anomaly == "started"):
+            continue
+        webservice = get_service_config(row.webservice_id)
+        if webservice is None or not webservice.email_alert:
+            continue
+        alerted.add(row.webservice_id)
+        if down_alert:
+            async_task("main.tasks.send_alert_email", webservice, row)
+        else:
+            async_task("main.tasks.send_latency_alert_email", webservice, row, baseline)
+    record_latencies(
+        (row.webservice_id, row.date_and_time, row.ping)
+        for row in rows
+        if row.status_code
+    )
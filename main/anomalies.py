@@ -0,0 +1,116 @@
+"""
+Streaming latency baselines and sustained-anomaly detection
+
+Each service keeps an exponentially weighted mean and variance of the pings of
+its successful checks, updated in O(1) per check. A ping is anomalous when it
+is more than BYTEPING_ANOMALY_Z standard deviations and at least
+BYTEPING_ANOMALY_MIN_DELTA_MS above the mean. Anomalous pings do not move the
+baseline, so a service that slows down cannot teach it that slow is normal.
+BYTEPING_ANOMALY_SUSTAIN anomalous pings in a row flag the service, and the
+first normal ping clears the flag.
+
+The state is five numbers. It lives in the shared cache and is written to
+LatencyBaseline every BYTEPING_BASELINE_PERSIST_EVERY samples and whenever the
+flag changes, so a restart loses at most a few samples.
+"""
+
+import math
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError
+
+from . import metrics
+from .models import LatencyBaseline
+
+FIELDS = ("mean", "variance", "samples", "streak", "flagged")
+# Long enough for a quiet service to be reloaded from the database now and then
+STATE_TTL = 7 * 86400
+
+
+def state_key(webservice_id):
+    return f"byteping:baseline:{webservice_id}"
+
+
+def load_state(webservice_id):
+    shared = caches[settings.BYTEPING_SHARED_CACHE]
+    state = shared.get(state_key(webservice_id))
+    if state is None:
+        row = (
+            LatencyBaseline.objects.filter(webservice_id=webservice_id)
+            .values_list(*FIELDS)
+            .first()
+        )
+        state = row or (0.0, 0.0, 0, 0, False)
+    return dict(zip(FIELDS, state))
+
+
+def persist(webservice_id, state):
+    if LatencyBaseline.objects.filter(webservice_id=webservice_id).update(**state):
+        return
+    try:
+        LatencyBaseline.objects.create(webservice_id=webservice_id, **state)
+    except IntegrityError:
+        # Created concurrently by another worker
+        LatencyBaseline.objects.filter(webservice_id=webservice_id).update(**state)
+
+
+def is_anomalous(state, ping):
+    if state["samples"] < settings.BYTEPING_BASELINE_MIN_SAMPLES:
+        return False
+    threshold = max(
+        settings.BYTEPING_ANOMALY_Z * math.sqrt(state["variance"]),
+        settings.BYTEPING_ANOMALY_MIN_DELTA_MS,
+    )
+    return ping - state["mean"] > threshold
+
+
+def update_baseline(state, ping):
+    """
+    Fold one ping into the EWMA mean and variance
+    Early samples get weight 1/n, so the baseline starts as a plain average.
+    """
+    alpha = max(settings.BYTEPING_BASELINE_ALPHA, 1 / (state["samples"] + 1))
+    diff = ping - state["mean"]
+    increment = alpha * diff
+    state["mean"] += increment
+    state["variance"] = (1 - alpha) * (state["variance"] + diff * increment)
+    state["samples"] += 1
+
+
+def observe_latency(webservice_id, ping):
+    """
+    Record a successful check's ping against the service's baseline
+
+    Returns ("started" or "ended", baseline mean) when the service's anomaly
+    flag changes, otherwise (None, baseline mean).
+    """
+    state = load_state(webservice_id)
+    event = None
+    anomalous = is_anomalous(state, ping)
+    if anomalous:
+        state["streak"] += 1
+        if (
+            not state["flagged"]
+            and state["streak"] >= settings.BYTEPING_ANOMALY_SUSTAIN
+        ):
+            state["flagged"] = True
+            event = "started"
+            metrics.latency_anomalies.inc()
+            print(f"BytePing: Latency anomaly for service {webservice_id}")
+    else:
+        update_baseline(state, ping)
+        state["streak"] = 0
+        if state["flagged"]:
+            state["flagged"] = False
+            event = "ended"
+
+    caches[settings.BYTEPING_SHARED_CACHE].set(
+        state_key(webservice_id), tuple(state[field] for field in FIELDS), STATE_TTL
+    )
+    if event or (
+        not anomalous
+        and state["samples"] % settings.BYTEPING_BASELINE_PERSIST_EVERY == 0
+    ):
+        persist(webservice_id, state)
+    return event, state["mean"]
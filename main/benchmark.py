@@ -0,0 +1,246 @@
+import math
+import os
+import random
+import ssl
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.db import connection
+from django.db.models import Count, Q
+
+from .models import WebService, Webstatus
+
+
+class TargetFarm:
+    """
+    A set of local HTTP(S) servers with configurable latency, errors and bad sockets
+
+    Every request independently draws its behaviour: it may hang (never answer),
+    trickle its body slowly, answer 500, or answer 200 after `latency_ms` +/- jitter.
+    """
+
+    def __init__(
+        self,
+        servers=4,
+        latency_ms=50,
+        jitter_ms=10,
+        error_rate=0.0,
+        body_bytes=1024,
+        slow_rate=0.0,
+        hang_rate=0.0,
+        hang_seconds=60,
+        certfile=None,
+        keyfile=None,
+    ):
+        self.servers = servers
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.body = b"x" * body_bytes
+        self.slow_rate = slow_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.certfile = certfile
+        self.keyfile = keyfile
+        self.scheme = "https" if certfile else "http"
+        self._httpds = []
+        self._stopping = threading.Event()
+
+    def _handler(self):
+        farm = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                roll = random.random()
+                if roll < farm.hang_rate:
+                    farm._stopping.wait(farm.hang_seconds)
+                    return
+                delay = max(0, random.gauss(farm.latency_ms, farm.jitter_ms)) / 1000
+                time.sleep(delay)
+
+                code = 500 if random.random() < farm.error_rate else 200
+                self.send_response(code)
+                self.send_header("Content-Type", "text/plain")
+                self.send_header("Content-Length", str(len(farm.body)))
+                self.end_headers()
+
+                if roll < farm.hang_rate + farm.slow_rate:
+                    # Trickle the body out so the client sits in a slow read
+                    for offset in range(0, len(farm.body), 64):
+                        self.wfile.write(farm.body[offset : offset + 64])
+                        self.wfile.flush()
+                        time.sleep(0.05)
+                else:
+                    self.wfile.write(farm.body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        handler = self._handler()
+        for _ in range(self.servers):
+            httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+            httpd.daemon_threads = True
+            if self.certfile:
+                context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+                context.load_cert_chain(self.certfile, self.keyfile)
+                httpd.socket = context.wrap_socket(httpd.socket, server_side=True)
+            threading.Thread(target=httpd.serve_forever, daemon=True).start()
+            self._httpds.append(httpd)
+        return self
+
+    def stop(self):
+        self._stopping.set()
+        for httpd in self._httpds:
+            httpd.shutdown()
+            httpd.server_close()
+
+    @property
+    def urls(self):
+        return [
+            f"{self.scheme}://127.0.0.1:{httpd.server_address[1]}/"
+            for httpd in self._httpds
+        ]
+
+
+def percentiles(values, points=(50, 90, 99)):
+    """
+    Nearest-rank percentiles of a list of numbers, rounded to 0.01
+    """
+    if not values:
+        return {f"p{point}": None for point in points} | {"max": None}
+    ordered = sorted(values)
+    result = {
+        f"p{point}": round(
+            ordered[max(0, math.ceil(len(ordered) * point / 100) - 1)], 2
+        )
+        for point in points
+    }
+    result["max"] = round(ordered[-1], 2)
+    return result
+
+
+def outcome_counts(service_ids):
+    """
+    Up, down (unexpected status) and error (no response) checks written for
+    the services, from their Webstatus rows
+    """
+    return Webstatus.objects.filter(webservice_id__in=service_ids).aggregate(
+        up=Count("id", filter=Q(status=True)),
+        down=Count("id", filter=Q(status=False, status_code__gt=0)),
+        error=Count("id", filter=Q(status=False, status_code=0)),
+    )
+
+
+def run_benchmark(
+    farm, services=100, interval=5.0, duration=30.0, concurrency=8, keep=False
+):
+    """
+    Drive main.tasks.monitor_webservice against a running TargetFarm
+
+    Creates `services` synthetic WebService rows for a throwaway user, plans one
+    check per service every `interval` seconds (evenly staggered) for `duration`
+    seconds and runs them on a pool of `concurrency` threads, standing in for
+    django-q workers. Returns a JSON-serializable report.
+    """
+    from authentication.models import User
+    from .tasks import monitor_webservice
+
+    email = f"bench-{uuid.uuid4().hex[:12]}@byteping.invalid"
+    user = User.objects.create_user(username=email, email=email)
+    urls = farm.urls
+    # bulk_create skips post_save, so no real schedules are created for these rows
+    WebService.objects.bulk_create(
+        [
+            WebService(
+                user=user,
+                webservice_name=f"bench-{index}",
+                webservice_url=urls[index % len(urls)],
+                email_alert=False,
+            )
+            for index in range(services)
+        ]
+    )
+    service_ids = list(
+        WebService.objects.filter(user=user).order_by("id").values_list("id", flat=True)
+    )
+
+    lock = threading.Lock()
+    durations, lags = [], []
+
+    def check(webservice_id, planned):
+        started = time.monotonic()
+        try:
+            monitor_webservice(webservice_id)
+        finally:
+            connection.close()
+        finished = time.monotonic()
+        with lock:
+            lags.append((started - planned) * 1000)
+            durations.append((finished - started) * 1000)
+
+    plan = sorted(
+        (offset * interval / services + round_index * interval, webservice_id)
+        for offset, webservice_id in enumerate(service_ids)
+        for round_index in range(max(1, int(duration / interval)))
+    )
+
+    previous_bundle = os.environ.get("REQUESTS_CA_BUNDLE")
+    if farm.certfile:
+        # The farm's self-signed certificate doubles as the CA bundle
+        os.environ["REQUESTS_CA_BUNDLE"] = farm.certfile
+    begin = time.monotonic()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for offset, webservice_id in plan:
+                planned = begin + offset
+                wait = planned - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+                pool.submit(check, webservice_id, planned)
+        elapsed = time.monotonic() - begin
+        outcomes = outcome_counts(service_ids)
+    finally:
+        if previous_bundle is None:
+            os.environ.pop("REQUESTS_CA_BUNDLE", None)
+        else:
+            os.environ["REQUESTS_CA_BUNDLE"] = previous_bundle
+        if not keep:
+            user.delete()
+
+    checks = len(durations)
+    inserts = sum(outcomes.values())
+    # Checks that returned without writing a row, e.g. shed as duplicates
+    outcomes["no_row"] = checks - inserts
+    return {
+        "config": {
+            "services": services,
+            "interval_s": interval,
+            "duration_s": duration,
+            "concurrency": concurrency,
+            "target_servers": farm.servers,
+            "scheme": farm.scheme,
+            "latency_ms": farm.latency_ms,
+            "jitter_ms": farm.jitter_ms,
+            "error_rate": farm.error_rate,
+            "body_bytes": len(farm.body),
+            "slow_rate": farm.slow_rate,
+            "hang_rate": farm.hang_rate,
+        },
+        "elapsed_s": round(elapsed, 3),
+        "checks": checks,
+        "planned_checks": len(plan),
+        "throughput_cps": round(checks / elapsed, 2) if elapsed else None,
+        "check_duration_ms": percentiles(durations),
+        "scheduling_lag_ms": percentiles(lags),
+        "outcomes": outcomes,
+        "webstatus_inserts": inserts,
+        "db_write_rate_per_s": round(inserts / elapsed, 2) if elapsed else None,
+    }
@@ -0,0 +1,140 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import models
+
+
+class Missing:
+    """
+    Cached in place of a loader result of None
+    """
+
+
+class TieredCache:
+    """
+    A per-process TTL map in front of the shared Django cache
+
+    Reads try local memory, then the shared cache, then the loader, filling the
+    tiers on the way back. invalidate() clears the shared entry and this
+    process's copy; other processes drop theirs within `local_ttl` seconds, which
+    bounds how stale a value can get after a write.
+    """
+
+    def __init__(self, prefix, local_ttl, shared_ttl, max_entries=10000, miss_ttl=0):
+        self.prefix = prefix
+        self.local_ttl = local_ttl
+        self.shared_ttl = shared_ttl
+        # Seconds to remember that the loader found nothing; 0 caches no misses
+        self.miss_ttl = miss_ttl
+        self.max_entries = max_entries
+        self._local = {}
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[settings.BYTEPING_SHARED_CACHE]
+
+    def _shared_key(self, key):
+        return f"{self.prefix}:{key}"
+
+    def get(self, key, loader):
+        """
+        Return the cached value for `key`, calling loader() on a miss
+        A loader result of None is returned, and cached for miss_ttl seconds.
+        """
+        now = time.monotonic()
+        entry = self._local.get(key)
+        if entry is not None and entry[0] > now:
+            return None if isinstance(entry[1], Missing) else entry[1]
+
+        value = self.shared.get(self._shared_key(key))
+        if value is None:
+            value = loader()
+            if value is None:
+                if not self.miss_ttl:
+                    return None
+                value = Missing()
+                self.shared.set(self._shared_key(key), value, self.miss_ttl)
+            else:
+                self.shared.set(self._shared_key(key), value, self.shared_ttl)
+
+        local_ttl = self.local_ttl
+        if isinstance(value, Missing):
+            local_ttl = min(local_ttl, self.miss_ttl)
+        with self._lock:
+            if len(self._local) >= self.max_entries:
+                # Oldest insertion first; entries are short-lived anyway
+                self._local.pop(next(iter(self._local)))
+            self._local[key] = (now + local_ttl, value)
+        return None if isinstance(value, Missing) else value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._local.pop(key, None)
+        self.shared.delete(self._shared_key(key))
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
+
+
+class ServiceConfig:
+    """
+    The fields a check needs from a WebService, without a model instance
+    """
+
+    __slots__ = (
+        "id",
+        "user_id",
+        "user_email",
+        "webservice_name",
+        "webservice_url",
+        "expect_status_code",
+        "email_alert",
+        "monitor_interval",
+        "monitor_type",
+    )
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields[name])
+
+
+service_cache = TieredCache(
+    "byteping:service",
+    local_ttl=settings.BYTEPING_SERVICE_LOCAL_TTL,
+    shared_ttl=settings.BYTEPING_SERVICE_SHARED_TTL,
+)
+
+
+def load_service_config(webservice_id):
+    from .models import WebService
+
+    row = (
+        WebService.objects.filter(id=webservice_id, is_active=True)
+        .values(
+            "id",
+            "user_id",
+            "webservice_name",
+            "webservice_url",
+            "expect_status_code",
+            "email_alert",
+            "monitor_interval",
+            "monitor_type",
+            user_email=models.F("user__email"),
+        )
+        .first()
+    )
+    return ServiceConfig(**row) if row else None
+
+
+def get_service_config(webservice_id):
+    """
+    Config of an active service from the tiered cache, or None if missing/inactive
+    Invalidated by the WebService and User signals in main.signals.
+    """
+    return service_cache.get(
+        str(webservice_id), lambda: load_service_config(webservice_id)
+    )
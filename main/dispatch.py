@@ -0,0 +1,199 @@
+"""
+Fair-share dispatch of scheduled checks across users
+
+Instead of one django-q schedule per service, a single dispatcher runs every
+minute, finds services whose next_check_at has passed and enqueues their checks.
+Due checks are taken round-robin across users (deficit round-robin with a unit
+cost and equal quanta), so one user's thousands of services cannot push
+everyone else's checks to the back of the queue. Each user is also held to
+BYTEPING_TENANT_MAX_IN_FLIGHT queued or running checks and
+BYTEPING_TENANT_CHECKS_PER_MINUTE dispatched checks per tick, and the whole
+tick to whatever keeps the broker queue under BYTEPING_DISPATCH_QUEUE_TARGET.
+"""
+
+from collections import deque
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from django_q.brokers import get_broker
+from django_q.tasks import async_task
+
+from . import metrics
+from .adaptive import BACKOFF, SCHEDULED
+from .models import WebService
+from .shedding import is_overloaded, record_queue_depth, shed
+
+
+def in_flight_key(user_id):
+    return f"byteping:inflight:{user_id}"
+
+
+def in_flight(user_id):
+    return max(0, caches[settings.BYTEPING_SHARED_CACHE].get(in_flight_key(user_id), 0))
+
+
+def acquire_slots(user_id, count):
+    """
+    Take `count` in-flight slots for a user
+
+    The counter expires BYTEPING_TENANT_SLOT_TTL seconds after it was created
+    (incr does not extend it), so slots of tasks that died without releasing
+    them are freed within that time. Checks still running when it expires
+    release into nothing, and release_slot never takes a new counter below
+    zero, so the limit is never exceeded by more than what was in flight then.
+    """
+    shared = caches[settings.BYTEPING_SHARED_CACHE]
+    key = in_flight_key(user_id)
+    shared.add(key, 0, settings.BYTEPING_TENANT_SLOT_TTL)
+    try:
+        shared.incr(key, count)
+    except ValueError:
+        # Expired between add and incr
+        shared.add(key, count, settings.BYTEPING_TENANT_SLOT_TTL)
+
+
+def release_slot(user_id, count=1):
+    shared = caches[settings.BYTEPING_SHARED_CACHE]
+    try:
+        if shared.decr(in_flight_key(user_id), count) < 0:
+            # The counter expired and was recreated while the check was running
+            shared.incr(in_flight_key(user_id), count)
+    except ValueError:
+        # The counter expired while the check was running
+        pass
+
+
+def fair_share(queues, allowances, budget):
+    """
+    Pick up to `budget` items from per-user queues, one per user per round
+
+    `queues` maps a user to their due checks, oldest first, and `allowances`
+    caps how many each user may take this round.
+    """
+    picked = []
+    taken = {user: 0 for user in queues}
+    rotation = deque(
+        user for user, queue in queues.items() if queue and allowances.get(user, 0)
+    )
+    while rotation and len(picked) < budget:
+        user = rotation.popleft()
+        picked.append(queues[user][taken[user]])
+        taken[user] += 1
+        if taken[user] < len(queues[user]) and taken[user] < allowances[user]:
+            rotation.append(user)
+    return picked
+
+
+def dispatch_checks():
+    """
+    Enqueue due checks fairly across users and plan each service's next check
+    Scheduled every minute by initialize_all_monitoring.
+    """
+    now = timezone.now()
+    depth = get_broker().queue_size() or 0
+    record_queue_depth(depth)
+    budget = max(0, settings.BYTEPING_DISPATCH_QUEUE_TARGET - depth)
+    due = WebService.objects.filter(
+        is_active=True, probe_agent__isnull=True, next_check_at__lte=now
+    )
+    if is_overloaded():
+        # Backoff checks wait; their next_check_at stays put until load drops
+        backoff = due.filter(backoff_interval__isnull=False).count()
+        if backoff:
+            shed("overload_backoff", backoff)
+        due = due.filter(backoff_interval__isnull=True)
+    due_per_user = dict(
+        due.order_by()
+        .values("user_id")
+        .annotate(due=Count("id"))
+        .values_list("user_id", "due")
+    )
+
+    allowances, limits = {}, {}
+    for user_id, count in due_per_user.items():
+        concurrency_left = max(
+            0, settings.BYTEPING_TENANT_MAX_IN_FLIGHT - in_flight(user_id)
+        )
+        rate_left = settings.BYTEPING_TENANT_CHECKS_PER_MINUTE
+        allowances[user_id] = min(concurrency_left, rate_left, count)
+        limits[user_id] = "concurrency" if concurrency_left < rate_left else "rate"
+
+    # Every user's oldest due checks in one query, numbered per user so no user
+    # is read past the largest allowance
+    queues = {user_id: [] for user_id in due_per_user}
+    largest = min(max(allowances.values(), default=0), budget)
+    if largest:
+        rows = (
+            due.annotate(
+                position=Window(
+                    RowNumber(),
+                    partition_by=F("user_id"),
+                    order_by=[F("next_check_at").asc(), F("id").asc()],
+                )
+            )
+            .filter(position__lte=largest)
+            .order_by("user_id", "position")
+            .values(
+                "id", "user_id", "monitor_interval", "backoff_interval", "next_check_at"
+            )
+        )
+        for service in rows:
+            queue = queues[service["user_id"]]
+            if len(queue) < min(allowances[service["user_id"]], budget):
+                queue.append(service)
+
+    picked = fair_share(queues, allowances, budget)
+
+    taken = {}
+    for service in picked:
+        taken[service["user_id"]] = taken.get(service["user_id"], 0) + 1
+    # Take the slots before enqueueing so a fast check cannot release first
+    for user_id, count in taken.items():
+        acquire_slots(user_id, count)
+
+    next_runs = {}
+    enqueued = {}
+    try:
+        for service in picked:
+            user_id = service["user_id"]
+            lag = (now - service["next_check_at"]).total_seconds()
+            metrics.dispatch_lag.observe(lag)
+            interval = service["backoff_interval"] or service["monitor_interval"]
+            async_task(
+                "main.tasks.monitor_webservice",
+                service["id"],
+                check_type=BACKOFF if service["backoff_interval"] else SCHEDULED,
+                user_id=user_id,
+                planned_at=service["next_check_at"],
+                superseded_at=now + timezone.timedelta(minutes=interval),
+            )
+            enqueued[user_id] = enqueued.get(user_id, 0) + 1
+            next_runs.setdefault(interval, []).append(service["id"])
+    finally:
+        # Slots of checks that never made it onto the queue
+        for user_id, count in taken.items():
+            if count > enqueued.get(user_id, 0):
+                release_slot(user_id, count - enqueued.get(user_id, 0))
+
+    for interval, ids in next_runs.items():
+        WebService.objects.filter(id__in=ids).update(
+            next_check_at=now + timezone.timedelta(minutes=interval)
+        )
+
+    for user_id, count in due_per_user.items():
+        deferred = count - taken.get(user_id, 0)
+        if deferred:
+            reason = (
+                limits[user_id]
+                if taken.get(user_id, 0) >= allowances[user_id]
+                else "capacity"
+            )
+            metrics.checks_deferred.inc(deferred, reason=reason)
+
+    deferred = sum(due_per_user.values()) - len(picked)
+    return (
+        f"Dispatched {len(picked)} checks for {len(taken)} users, {deferred} deferred"
+    )
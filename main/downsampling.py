@@ -0,0 +1,125 @@
+"""
+Downsample Webstatus history into a fixed number of chart points
+
+The range is cut into equal-width time buckets. The database groups checks by
+the coarsest calendar unit (second, minute, hour or day) no wider than a bucket
+and returns per-group counts and ping sums, mins and maxes, which are then
+folded into the buckets, so the rows read depend on the range and the number of
+points rather than on how many checks the range holds. A group counts towards
+the bucket holding its start, which moves checks by less than one unit near
+bucket edges. Keeping each bucket's min and max ping preserves spikes that
+averaging alone would flatten.
+"""
+
+from django.db.models import Count, Max, Min, Q, Sum
+from django.db.models.functions import Trunc
+
+from .models import Webstatus
+
+# Truncation units, widest first
+GRAINS = (("day", 86400), ("hour", 3600), ("minute", 60), ("second", 1))
+
+# Checks that got no response store the time until the error, not a latency
+RESPONDED = Q(status_code__gt=0)
+
+
+class Bucket:
+    __slots__ = ("checks", "up", "pings", "ping_sum", "ping_min", "ping_max")
+
+    def __init__(self):
+        self.checks = 0
+        self.up = 0
+        self.pings = 0
+        self.ping_sum = 0
+        self.ping_min = None
+        self.ping_max = None
+
+    def add(self, checks, up, pings, ping_sum, ping_min, ping_max):
+        self.checks += checks
+        self.up += up
+        if pings:
+            self.pings += pings
+            self.ping_sum += ping_sum
+            if self.ping_min is None or ping_min < self.ping_min:
+                self.ping_min = ping_min
+            if self.ping_max is None or ping_max > self.ping_max:
+                self.ping_max = ping_max
+
+
+def grain(width):
+    """
+    Widest truncation unit no wider than `width` seconds
+    """
+    for kind, seconds in GRAINS:
+        if seconds <= width:
+            return kind
+    return GRAINS[-1][0]
+
+
+def downsample(groups, start, end, points):
+    """
+    Fold (group start, checks, up, pings, ping sum, ping min, ping max) rows
+    into `points` buckets over [start, end)
+
+    Returns parallel arrays with one entry per non-empty bucket: the bucket start
+    in epoch milliseconds, min/max/average ping and the fraction of checks up.
+    """
+    width = (end - start).total_seconds() / points
+    buckets = {}
+    for group_start, *totals in groups:
+        # The first group may start before the range it was cut from
+        index = max(0, int((group_start - start).total_seconds() // width))
+        if index < points:
+            bucket = buckets.get(index)
+            if bucket is None:
+                bucket = buckets[index] = Bucket()
+            bucket.add(*totals)
+
+    origin = start.timestamp() * 1000
+    series = {
+        "timestamp": [],
+        "ping_min": [],
+        "ping_max": [],
+        "ping_avg": [],
+        "uptime": [],
+        "checks": [],
+    }
+    for index in sorted(buckets):
+        bucket = buckets[index]
+        series["timestamp"].append(int(origin + index * width * 1000))
+        series["ping_min"].append(bucket.ping_min)
+        series["ping_max"].append(bucket.ping_max)
+        series["ping_avg"].append(
+            round(bucket.ping_sum / bucket.pings, 2) if bucket.pings else None
+        )
+        series["uptime"].append(round(bucket.up / bucket.checks, 4))
+        series["checks"].append(bucket.checks)
+    return {"bucket_seconds": width, "series": series}
+
+
+def chart_series(webservice_id, start, end, points):
+    """
+    Downsampled ping and uptime series for one service
+    """
+    kind = grain((end - start).total_seconds() / points)
+    groups = (
+        Webstatus.objects.filter(
+            webservice_id=webservice_id,
+            date_and_time__gte=start,
+            date_and_time__lt=end,
+        )
+        .values(group_start=Trunc("date_and_time", kind))
+        .annotate(
+            checks=Count("id"),
+            up=Count("id", filter=Q(status=True)),
+            pings=Count("id", filter=RESPONDED),
+            ping_sum=Sum("ping", filter=RESPONDED),
+            ping_min=Min("ping", filter=RESPONDED),
+            ping_max=Max("ping", filter=RESPONDED),
+        )
+        .order_by()
+        .values_list(
+            "group_start", "checks", "up", "pings", "ping_sum", "ping_min", "ping_max"
+        )
+    )
+    return downsample(groups, start, end, points)
@@ -0,0 +1,94 @@
+import csv
+import json
+from datetime import datetime, timezone as dt_timezone
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Webstatus
+
+EXPORT_FIELDS = ("id", "webservice_id", "date_and_time", "ping", "status", "status_code")
+EXPORT_CHUNK_SIZE = 5000
+
+
+def parse_time_bound(value):
+    """
+    Parse an ISO date or datetime query value into an aware datetime (None if empty)
+    """
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid date or datetime: {value}")
+        parsed = datetime(day.year, day.month, day.day)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, dt_timezone.utc)
+    return parsed
+
+
+def iter_webstatus(service_ids, start=None, end=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield Webstatus rows as tuples of EXPORT_FIELDS in id order
+
+    Rows are fetched in keyset-paginated chunks (id > last seen id), so only one
+    chunk is ever held in memory. The MySQL backend buffers whole result sets
+    client-side even with .iterator(), which is why this does not rely on cursors.
+    """
+    queryset = Webstatus.objects.filter(webservice_id__in=list(service_ids))
+    if start is not None:
+        queryset = queryset.filter(date_and_time__gte=start)
+    if end is not None:
+        queryset = queryset.filter(date_and_time__lt=end)
+
+    last_id = 0
+    while True:
+        chunk = list(
+            queryset.filter(id__gt=last_id)
+            .order_by("id")
+            .values_list(*EXPORT_FIELDS)[:chunk_size]
+        )
+        if not chunk:
+            return
+        yield from chunk
+        if len(chunk) < chunk_size:
+            return
+        last_id = chunk[-1][0]
+
+
+def render_ndjson(rows):
+    """
+    Render row tuples as newline-delimited JSON, one object per line
+    """
+    for row in rows:
+        record = dict(zip(EXPORT_FIELDS, row))
+        record["date_and_time"] = record["date_and_time"].isoformat()
+        yield json.dumps(record, separators=(",", ":")) + "\n"
+
+
+class Echo:
+    """
+    File-like object whose write() returns the value, for streaming csv.writer output
+    """
+
+    def write(self, value):
+        return value
+
+
+def render_csv(rows):
+    """
+    Render row tuples as CSV with a header line
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow(
+            (row[0], row[1], row[2].isoformat(), row[3], int(row[4]), row[5])
+        )
+
+
+RENDERERS = {
+    "ndjson": (render_ndjson, "application/x-ndjson"),
+    "csv": (render_csv, "text/csv"),
+}
@@ -0,0 +1,176 @@
+"""
+Heartbeat (push) monitors for cron jobs and workers
+
+A heartbeat monitor expects its job to call /api/heartbeat/<token>/ at least
+every monitor_interval minutes. A ping only stores its time in the shared
+cache. The first ping of each interval also writes through: one "up" Webstatus
+row and a new heartbeat_deadline, so the database sees a monitor about once per
+interval however often it pings.
+
+The sweeper reads the indexed heartbeat_deadline column in deadline order and
+only touches monitors whose deadline has passed. A cached ping newer than the
+stored deadline just moves it forward; otherwise the heartbeat is missed and
+recorded like a failed check. Pings and the sweeper must see the same
+BYTEPING_SHARED_CACHE.
+"""
+
+import secrets
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from django_q.tasks import async_task
+
+from . import metrics
+from .cache import TieredCache, get_service_config
+from .incidents import record_check
+from .models import WebService, Webstatus
+
+HTTP = "http"
+HEARTBEAT = "heartbeat"
+
+token_cache = TieredCache(
+    "byteping:heartbeat_token",
+    local_ttl=settings.BYTEPING_SERVICE_LOCAL_TTL,
+    shared_ttl=settings.BYTEPING_SERVICE_SHARED_TTL,
+    # Unknown and revoked tokens would otherwise reach the database every ping
+    miss_ttl=settings.BYTEPING_HEARTBEAT_MISS_TTL,
+)
+
+
+def new_token():
+    return secrets.token_urlsafe(24)
+
+
+def ping_url(token):
+    return f"{settings.BACKEND_URL.rstrip('/')}/api/heartbeat/{token}/"
+
+
+def last_seen_key(webservice_id):
+    return f"byteping:heartbeat:seen:{webservice_id}"
+
+
+def written_key(webservice_id):
+    return f"byteping:heartbeat:written:{webservice_id}"
+
+
+def deadline_after(moment, interval):
+    return moment + timezone.timedelta(
+        minutes=interval, seconds=settings.BYTEPING_HEARTBEAT_GRACE_SECONDS
+    )
+
+
+def load_token(token):
+    return (
+        WebService.objects.filter(heartbeat_token=token)
+        .values_list("id", flat=True)
+        .first()
+    )
+
+
+def record_ping(token):
+    """
+    Note a ping for the monitor with this token
+    Returns False for unknown tokens and inactive or non-heartbeat monitors.
+    """
+    webservice_id = token_cache.get(token, lambda: load_token(token))
+    if webservice_id is None:
+        return False
+    webservice = get_service_config(webservice_id)
+    if webservice is None or webservice.monitor_type != HEARTBEAT:
+        return False
+
+    now = timezone.now()
+    interval = webservice.monitor_interval * 60
+    shared = caches[settings.BYTEPING_SHARED_CACHE]
+    shared.set(last_seen_key(webservice_id), now, 2 * interval)
+    metrics.heartbeat_pings.inc()
+    if shared.add(written_key(webservice_id), True, interval):
+        write_through(webservice, now)
+    metrics.flush()
+    return True
+
+
+def write_through(webservice, now):
+    """
+    Store a ping: one up row, the next deadline and any incident it ends
+    """
+    Webstatus.objects.create(
+        webservice_id=webservice.id,
+        ping=0,
+        status=True,
+        status_code=200,
+        date_and_time=now,
+        check_type=HEARTBEAT,
+    )
+    WebService.objects.filter(id=webservice.id).update(
+        heartbeat_deadline=deadline_after(now, webservice.monitor_interval)
+    )
+    record_check(webservice.id, now, True, 200)
+
+
+def sweep_heartbeats():
+    """
+    Record missed heartbeats for monitors past their deadline
+    Scheduled every minute by initialize_all_monitoring. Alerts are queued, so
+    a slow SMTP server does not hold up the sweep.
+    """
+    now = timezone.now()
+    shared = caches[settings.BYTEPING_SHARED_CACHE]
+    due = list(
+        WebService.objects.filter(heartbeat_deadline__lte=now)
+        .order_by("heartbeat_deadline")
+        .values_list("id", "monitor_interval")[
+            : settings.BYTEPING_HEARTBEAT_SWEEP_BATCH
+        ]
+    )
+
+    missed = []
+    for webservice_id, interval in due:
+        seen = shared.get(last_seen_key(webservice_id))
+        if seen is not None and deadline_after(seen, interval) > now:
+            # Pinged since the last write-through
+            WebService.objects.filter(id=webservice_id).update(
+                heartbeat_deadline=deadline_after(seen, interval)
+            )
+        else:
+            missed.append((webservice_id, interval))
+    if not missed:
+        return f"Swept {len(due)} heartbeats, none missed"
+
+    rows = [
+        Webstatus(
+            webservice_id=webservice_id,
+            ping=0,
+            status=False,
+            status_code=0,
+            date_and_time=now,
+            check_type=HEARTBEAT,
+        )
+        for webservice_id, _ in missed
+    ]
+    Webstatus.objects.bulk_create(rows)
+    # Missed again if still silent one interval from now
+    next_deadlines = {}
+    for webservice_id, interval in missed:
+        next_deadlines.setdefault(interval, []).append(webservice_id)
+    for interval, ids in next_deadlines.items():
+        WebService.objects.filter(id__in=ids).update(
+            heartbeat_deadline=now + timezone.timedelta(minutes=interval)
+        )
+    # The next ping writes through at once and closes the incident
+    shared.delete_many([written_key(webservice_id) for webservice_id, _ in missed])
+    metrics.heartbeats_missed.inc(len(missed))
+
+    for row in rows:
+        if record_check(row.webservice_id, now, False, 0) == "opened":
+            webservice = get_service_config(row.webservice_id)
+            if webservice is not None and webservice.email_alert:
+                async_task(
+                    "main.tasks.send_alert_email",
+                    webservice,
+                    row,
+                    error=f"No heartbeat in the last {webservice.monitor_interval} minutes",
+                )
+    print(f"BytePing: {len(missed)} heartbeats missed")
+    return f"Swept {len(due)} heartbeats, {len(missed)} missed"
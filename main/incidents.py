@@ -0,0 +1,154 @@
+"""
+Incidents: consecutive failed checks collapsed into one row
+
+An incident opens on the first failed check and closes on the first check that
+succeeds afterwards. Downtime counts, totals and the outage timeline then read
+one row per incident instead of every Webstatus row.
+"""
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Case, DurationField, ExpressionWrapper, F, Value, When
+from django_q.tasks import async_task
+
+from .models import Incident, WebService
+
+
+def severity(status_code):
+    """
+    Rank used for worst_status_code: no response at all (0) is worst
+    """
+    return 1000 if status_code == 0 else status_code
+
+
+def worse_status_code(current, status_code):
+    return status_code if severity(status_code) > severity(current) else current
+
+
+def open_flag_key(webservice_id):
+    return f"byteping:incident:open:{webservice_id}"
+
+
+def forget_open_flag(webservice_id):
+    """
+    Drop the cached open flag after writing a service's incidents elsewhere
+    """
+    caches[settings.BYTEPING_SHARED_CACHE].delete(open_flag_key(webservice_id))
+
+
+def record_check(webservice_id, checked_at, status_ok, status_code):
+    """
+    Fold one check into the service's incidents
+
+    Returns "opened" or "closed" when the check changes the service's state,
+    otherwise None. Whether an incident is open is cached for
+    BYTEPING_INCIDENT_FLAG_TTL seconds, so a healthy service costs a query here
+    at most once per TTL; a stale flag, e.g. from a per-process cache, is
+    corrected within that time. Failed checks always ask the database, so a
+    stale flag cannot open a second incident, and hold a lock on the service
+    row, so two failures arriving together cannot both open one.
+    """
+    ttl = settings.BYTEPING_INCIDENT_FLAG_TTL
+    shared = caches[settings.BYTEPING_SHARED_CACHE]
+    key = open_flag_key(webservice_id)
+    is_open = shared.get(key)
+    open_incidents = Incident.objects.filter(
+        webservice_id=webservice_id, ended_at__isnull=True
+    )
+
+    if status_ok:
+        if is_open is False:
+            return None
+        closed = open_incidents.update(
+            ended_at=checked_at,
+            duration=ExpressionWrapper(
+                Value(checked_at) - F("started_at"), output_field=DurationField()
+            ),
+        )
+        shared.set(key, False, ttl)
+        if not closed:
+            return None
+        async_task("main.status_pages.refresh_for_service", webservice_id)
+        return "closed"
+
+    if status_code == 0:
+        worst = Value(0)
+    else:
+        worst = Case(
+            When(worst_status_code=0, then=Value(0)),
+            When(worst_status_code__lt=status_code, then=Value(status_code)),
+            default=F("worst_status_code"),
+        )
+    with transaction.atomic():
+        # Serializes failures of one service; MySQL has no partial unique index
+        # to enforce one open incident per service
+        list(
+            WebService.objects.select_for_update().filter(id=webservice_id).values("id")
+        )
+        if open_incidents.update(
+            check_count=F("check_count") + 1, worst_status_code=worst
+        ):
+            opened = False
+        else:
+            Incident.objects.create(
+                webservice_id=webservice_id,
+                started_at=checked_at,
+                worst_status_code=status_code,
+                check_count=1,
+            )
+            opened = True
+    shared.set(key, True, ttl)
+    if not opened:
+        return None
+    async_task("main.status_pages.refresh_for_service", webservice_id)
+    return "opened"
+
+
+def collapse(rows):
+    """
+    Run-length collapse (date_and_time, status, status_code) rows in time order
+    into unsaved Incident fields, the last one open if history ends down
+    """
+    current = None
+    for checked_at, status_ok, status_code in rows:
+        if not status_ok:
+            if current is None:
+                current = {
+                    "started_at": checked_at,
+                    "ended_at": None,
+                    "duration": None,
+                    "worst_status_code": status_code,
+                    "check_count": 1,
+                }
+            else:
+                current["check_count"] += 1
+                current["worst_status_code"] = worse_status_code(
+                    current["worst_status_code"], status_code
+                )
+        elif current is not None:
+            current["ended_at"] = checked_at
+            current["duration"] = checked_at - current["started_at"]
+            yield current
+            current = None
+    if current is not None:
+        yield current
+
+
+def summarize(incidents, now):
+    """
+    Downtime count, total downtime in seconds and the most recent incident start
+    Open incidents count as down until `now`.
+    """
+    total = 0.0
+    last = None
+    for incident in incidents:
+        ended_at = incident.ended_at or now
+        total += (ended_at - incident.started_at).total_seconds()
+        if last is None or incident.started_at > last:
+            last = incident.started_at
+    return {
+        "downtime_count": len(incidents),
+        "downtime_seconds": round(total, 3),
+        "last_downtime": last,
+    }
@@ -0,0 +1,118 @@
+import cProfile
+import json
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger("byteping.tasks")
+
+
+class TaskTrace:
+    """
+    Per-phase wall time and DB query counts for one task run
+    """
+
+    def __init__(self, task, fields):
+        self.task = task
+        self.fields = fields
+        self.phases = {}
+        self.queries = 0
+        self.started = time.perf_counter()
+
+    def count_query(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        queries = self.queries
+        try:
+            yield
+        finally:
+            phase = self.phases.setdefault(name, {"ms": 0.0, "queries": 0})
+            phase["ms"] += (time.perf_counter() - started) * 1000
+            phase["queries"] += self.queries - queries
+
+    def annotate(self, **fields):
+        self.fields.update(fields)
+
+    def finish(self, profiler=None):
+        duration = time.perf_counter() - self.started
+        record = {
+            "event": "task",
+            "task": self.task,
+            "duration_ms": round(duration * 1000, 2),
+            "queries": self.queries,
+            "phases": {
+                name: {"ms": round(phase["ms"], 2), "queries": phase["queries"]}
+                for name, phase in self.phases.items()
+            },
+            **self.fields,
+        }
+        if profiler is not None and duration >= settings.BYTEPING_SLOW_TASK_SECONDS:
+            record["profile"] = dump_profile(profiler, self.task)
+        logger.info(json.dumps(record, default=str))
+
+
+class NullTrace:
+    """
+    Stand-in used when tracing is off, so call sites need no conditionals
+    """
+
+    @contextmanager
+    def phase(self, name):
+        yield
+
+    def annotate(self, **fields):
+        pass
+
+
+NULL_TRACE = NullTrace()
+
+
+def dump_profile(profiler, task):
+    """
+    Write a cProfile dump for a slow task and return its path
+    """
+    os.makedirs(settings.BYTEPING_PROFILE_DIR, exist_ok=True)
+    path = os.path.join(
+        settings.BYTEPING_PROFILE_DIR,
+        f"{task.rsplit('.', 1)[-1]}-{int(time.time() * 1000)}-{os.getpid()}.prof",
+    )
+    profiler.dump_stats(path)
+    return path
+
+
+@contextmanager
+def trace_task(task, **fields):
+    """
+    Trace a django-q task when BYTEPING_TASK_TRACING is on
+
+    Logs one JSON line per run to the "byteping.tasks" logger. A sample of runs
+    (BYTEPING_PROFILE_SAMPLE_RATE) is profiled, and the profile is kept only if
+    the run took longer than BYTEPING_SLOW_TASK_SECONDS.
+    """
+    if not settings.BYTEPING_TASK_TRACING:
+        yield NULL_TRACE
+        return
+
+    trace = TaskTrace(task, fields)
+    profiler = None
+    if random.random() < settings.BYTEPING_PROFILE_SAMPLE_RATE:
+        profiler = cProfile.Profile()
+
+    with connection.execute_wrapper(trace.count_query):
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield trace
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            trace.finish(profiler)
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from main.export import iter_webstatus
+from main.incidents import collapse, forget_open_flag
+from main.models import Incident, WebService
+
+
+class Command(BaseCommand):
+    help = "Compress existing Webstatus history into Incident rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "services", nargs="*", type=int, help="WebService ids (default: all)"
+        )
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Replace incidents that already exist for the services",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        services = WebService.objects.order_by("id")
+        if options["services"]:
+            services = services.filter(id__in=options["services"])
+        service_ids = list(services.values_list("id", flat=True))
+
+        existing = set(
+            Incident.objects.filter(webservice_id__in=service_ids).values_list(
+                "webservice_id", flat=True
+            )
+        )
+        if existing and not options["rebuild"]:
+            raise CommandError(
+                f"{len(existing)} service(s) already have incidents, pass --rebuild to replace them."
+            )
+
+        total = 0
+        for service_id in service_ids:
+            # id order is insertion order, which is check order for Webstatus
+            rows = (
+                (checked_at, status_ok, status_code)
+                for _, _, checked_at, _, status_ok, status_code in iter_webstatus(
+                    [service_id]
+                )
+            )
+            incidents = [
+                Incident(webservice_id=service_id, **fields) for fields in collapse(rows)
+            ]
+            with transaction.atomic():
+                Incident.objects.filter(webservice_id=service_id).delete()
+                Incident.objects.bulk_create(incidents, batch_size=options["batch_size"])
+            # The monitor path caches whether an incident is open
+            forget_open_flag(service_id)
+            total += len(incidents)
+            self.stdout.write(f"Service {service_id}: {len(incidents)} incident(s)")
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Backfilled {total} incident(s) for {len(service_ids)} service(s)")
+        )
@@ -0,0 +1,72 @@
+import json
+import sys
+from contextlib import redirect_stdout
+
+from django.core.management.base import BaseCommand
+from main.benchmark import TargetFarm, run_benchmark
+
+
+class Command(BaseCommand):
+    help = "Benchmark the monitoring path against a local synthetic target farm"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--services", type=int, default=100)
+        parser.add_argument(
+            "--interval", type=float, default=5.0, help="Seconds between checks of one service"
+        )
+        parser.add_argument("--duration", type=float, default=30.0)
+        parser.add_argument(
+            "--concurrency", type=int, default=8, help="Parallel checks (stand-in for workers)"
+        )
+        parser.add_argument("--servers", type=int, default=4)
+        parser.add_argument("--latency-ms", type=float, default=50)
+        parser.add_argument("--jitter-ms", type=float, default=10)
+        parser.add_argument("--error-rate", type=float, default=0.0)
+        parser.add_argument("--body-bytes", type=int, default=1024)
+        parser.add_argument("--slow-rate", type=float, default=0.0)
+        parser.add_argument("--hang-rate", type=float, default=0.0)
+        parser.add_argument(
+            "--certfile", help="Serve HTTPS with this certificate (also used as CA bundle)"
+        )
+        parser.add_argument("--keyfile")
+        parser.add_argument(
+            "--keep", action="store_true", help="Keep the synthetic user, services and rows"
+        )
+        parser.add_argument("--output", help="Write the JSON report to this file")
+
+    def handle(self, *args, **options):
+        farm = TargetFarm(
+            servers=options["servers"],
+            latency_ms=options["latency_ms"],
+            jitter_ms=options["jitter_ms"],
+            error_rate=options["error_rate"],
+            body_bytes=options["body_bytes"],
+            slow_rate=options["slow_rate"],
+            hang_rate=options["hang_rate"],
+            certfile=options["certfile"],
+            keyfile=options["keyfile"],
+        ).start()
+
+        self.stderr.write(
+            f"BytePing: benchmarking {options['services']} services for "
+            f"{options['duration']}s against {farm.scheme} targets"
+        )
+        # Check and signal prints go to stderr so stdout carries only the report
+        try:
+            with redirect_stdout(sys.stderr):
+                report = run_benchmark(
+                    farm,
+                    services=options["services"],
+                    interval=options["interval"],
+                    duration=options["duration"],
+                    concurrency=options["concurrency"],
+                    keep=options["keep"],
+                )
+        finally:
+            farm.stop()
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as out:
+                out.write(output + "\n")
+        self.stdout.write(output)
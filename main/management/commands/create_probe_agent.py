@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+from main.agents import create_agent
+from main.models import WebService
+from main.tasks import reconcile_monitoring
+
+
+class Command(BaseCommand):
+    help = "Register a remote probe agent and print its token"
+
+    def add_arguments(self, parser):
+        parser.add_argument("name", help="Unique agent name, e.g. eu-west-1")
+        parser.add_argument(
+            "--assign",
+            nargs="+",
+            type=int,
+            default=[],
+            metavar="SERVICE_ID",
+            help="WebService ids the agent will check instead of the local workers",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            agent, token = create_agent(options["name"])
+        except IntegrityError:
+            raise CommandError(f"An agent named {options['name']} already exists.")
+
+        if options["assign"]:
+            assigned = WebService.objects.filter(id__in=options["assign"]).update(
+                probe_agent=agent
+            )
+            # Take the services out of local dispatch
+            reconcile_monitoring(options["assign"])
+            self.stdout.write(f"Assigned {assigned} service(s) to {agent.name}")
+
+        self.stdout.write(self.style.SUCCESS(f"Agent {agent.name} created"))
+        self.stdout.write(f"Token (shown once): {token}")
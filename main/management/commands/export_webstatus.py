@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from main.export import EXPORT_CHUNK_SIZE, RENDERERS, iter_webstatus, parse_time_bound
+
+
+class Command(BaseCommand):
+    help = "Stream webstatus history for one or more services as NDJSON or CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "services", nargs="+", type=int, help="WebService ids to export"
+        )
+        parser.add_argument("--start", help="Inclusive start (ISO date or datetime)")
+        parser.add_argument("--end", help="Exclusive end (ISO date or datetime)")
+        parser.add_argument(
+            "--format", dest="output", choices=sorted(RENDERERS), default="ndjson"
+        )
+        parser.add_argument("--output-file", help="Write to this file instead of stdout")
+        parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            start = parse_time_bound(options["start"])
+            end = parse_time_bound(options["end"])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        render, _ = RENDERERS[options["output"]]
+        rows = iter_webstatus(
+            options["services"], start, end, chunk_size=options["chunk_size"]
+        )
+
+        if options["output_file"]:
+            with open(options["output_file"], "w", newline="") as out:
+                out.writelines(render(rows))
+        else:
+            for line in render(rows):
+                self.stdout.write(line, ending="")
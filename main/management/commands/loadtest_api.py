@@ -0,0 +1,107 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from main.benchmark import percentiles
+
+ENDPOINTS = (
+    "api/auth/user/",
+    "api/auth/profile/",
+    "api/webservice/all/",
+    "api/webservice/{id}/",
+    "api/webservice/{id}/webstatus/",
+)
+
+
+class Command(BaseCommand):
+    help = "Drive the REST API at fixed concurrency and report latency percentiles per endpoint"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://localhost:8000")
+        parser.add_argument("--email", required=True, help="Account to log in as")
+        parser.add_argument("--password", required=True)
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument(
+            "--requests", type=int, default=200, help="Requests per endpoint"
+        )
+        parser.add_argument(
+            "--endpoint",
+            action="append",
+            dest="endpoints",
+            help="Endpoint path to hit, '{id}' is replaced by a service id (repeatable)",
+        )
+        parser.add_argument("--output", help="Write the JSON report to this file")
+
+    def handle(self, *args, **options):
+        base_url = options["base_url"].rstrip("/")
+        session = requests.Session()
+
+        login = session.post(
+            f"{base_url}/api/auth/login/",
+            json={"email": options["email"], "password": options["password"]},
+        )
+        if login.status_code != 200:
+            raise CommandError(f"Login failed with {login.status_code}: {login.text}")
+        headers = {"Authorization": f"Bearer {login.json()['token']['access']}"}
+
+        services = session.get(f"{base_url}/api/webservice/all/", headers=headers).json()
+        service_ids = [service["id"] for service in services.get("webservices", [])]
+
+        report = {
+            "base_url": base_url,
+            "concurrency": options["concurrency"],
+            "requests_per_endpoint": options["requests"],
+            "endpoints": {},
+        }
+        for endpoint in options["endpoints"] or ENDPOINTS:
+            if "{id}" in endpoint and not service_ids:
+                self.stderr.write(f"Skipping {endpoint}: account has no services")
+                continue
+            report["endpoints"][endpoint] = self.drive(
+                base_url, endpoint, service_ids, headers, options
+            )
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as out:
+                out.write(output + "\n")
+        self.stdout.write(output)
+
+    def drive(self, base_url, endpoint, service_ids, headers, options):
+        """
+        Issue `requests` GETs against one endpoint on `concurrency` threads
+        """
+        local = threading.local()
+        lock = threading.Lock()
+        latencies, statuses = [], {}
+
+        def fetch(index):
+            if not hasattr(local, "session"):
+                local.session = requests.Session()
+            path = endpoint
+            if service_ids:
+                path = endpoint.format(id=service_ids[index % len(service_ids)])
+            started = time.monotonic()
+            try:
+                code = local.session.get(f"{base_url}/{path}", headers=headers).status_code
+            except requests.exceptions.RequestException:
+                code = 0
+            elapsed = (time.monotonic() - started) * 1000
+            with lock:
+                latencies.append(elapsed)
+                statuses[code] = statuses.get(code, 0) + 1
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+            list(pool.map(fetch, range(options["requests"])))
+        elapsed = time.monotonic() - started
+
+        return {
+            "requests": len(latencies),
+            "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+            "latency_ms": percentiles(latencies),
+            "status_codes": {str(code): count for code, count in sorted(statuses.items())},
+        }
@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from main import partitions
+
+
+class Command(BaseCommand):
+    help = "Convert Webstatus to range partitions, pre-create future ones and drop expired ones (MySQL)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--convert",
+            action="store_true",
+            help="Rebuild the table as range-partitioned (copies the table)",
+        )
+        parser.add_argument(
+            "--granularity",
+            choices=partitions.GRANULARITIES,
+            default=settings.BYTEPING_WEBSTATUS_PARTITION_GRANULARITY,
+        )
+        parser.add_argument(
+            "--ahead",
+            type=int,
+            default=settings.BYTEPING_WEBSTATUS_PARTITIONS_AHEAD,
+            help="Periods (days or months) to pre-create",
+        )
+        parser.add_argument(
+            "--retention-days",
+            type=int,
+            default=settings.BYTEPING_WEBSTATUS_RETENTION_DAYS,
+            help="Drop partitions entirely older than this (0 keeps everything)",
+        )
+        parser.add_argument(
+            "--status", action="store_true", help="List partitions and exit"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            if options["status"]:
+                for name, rows in partitions.existing_partitions():
+                    self.stdout.write(f"{name}\t~{rows} rows")
+                return
+
+            if options["convert"]:
+                count = partitions.convert(options["granularity"], options["ahead"])
+                self.stdout.write(
+                    self.style.SUCCESS(f"BytePing: Partitioned webstatus into {count} partitions")
+                )
+            else:
+                count = partitions.precreate(options["ahead"])
+                self.stdout.write(f"BytePing: Pre-created {count} partitions")
+
+            if options["retention_days"]:
+                cutoff = timezone.now().date() - timezone.timedelta(
+                    days=options["retention_days"]
+                )
+                dropped = partitions.drop_older_than(cutoff)
+                self.stdout.write(
+                    f"BytePing: Dropped {len(dropped)} expired partitions {' '.join(dropped)}"
+                )
+        except partitions.PartitionError as e:
+            raise CommandError(str(e))
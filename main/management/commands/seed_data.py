@@ -0,0 +1,137 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from authentication.models import User
+from main.adaptive import SCHEDULED
+from main.models import WebService, Webstatus
+
+
+class Command(BaseCommand):
+    help = "Seed users, services and webstatus history in bulk for load and query testing"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10)
+        parser.add_argument("--services-per-user", type=int, default=10)
+        parser.add_argument("--checks-per-service", type=int, default=1000)
+        parser.add_argument("--batch-size", type=int, default=10000)
+        parser.add_argument(
+            "--password", default="byteping-seed", help="Password for every seeded user"
+        )
+        parser.add_argument("--prefix", default="seed", help="Seeded user email prefix")
+        parser.add_argument("--seed", type=int, default=None, help="Random seed")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        started = time.monotonic()
+
+        # Hash once; every seeded account shares the password
+        password = make_password(options["password"])
+        emails = [
+            f"{options['prefix']}-{index}@byteping.invalid" for index in range(options["users"])
+        ]
+        User.objects.bulk_create(
+            [
+                User(
+                    username=email,
+                    email=email,
+                    password=password,
+                    is_email_verified=True,
+                    email_verification_token=None,
+                )
+                for email in emails
+            ],
+            ignore_conflicts=True,
+        )
+        user_ids = list(User.objects.filter(email__in=emails).values_list("id", flat=True))
+
+        WebService.objects.bulk_create(
+            [
+                WebService(
+                    user_id=user_id,
+                    webservice_name=f"{options['prefix']} service {user_id}-{index}",
+                    webservice_url=f"https://{options['prefix']}-{user_id}-{index}.example.com/",
+                    monitor_interval=rng.choice((10, 15, 30, 60)),
+                )
+                for user_id in user_ids
+                for index in range(options["services_per_user"])
+            ],
+            batch_size=options["batch_size"],
+        )
+        services = list(
+            WebService.objects.filter(user_id__in=user_ids).values_list(
+                "id", "monitor_interval"
+            )
+        )
+        self.stdout.write(f"Seeded {len(user_ids)} users and {len(services)} services")
+
+        rows = self.insert_webstatus(services, options, rng)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"BytePing: seeded {rows} webstatus rows in {elapsed:.1f}s "
+                f"({rows / elapsed:.0f} rows/s)"
+            )
+        )
+
+    def insert_webstatus(self, services, options, rng):
+        """
+        Insert synthetic check history with executemany, bypassing model instances
+        """
+        table = connection.ops.quote_name(Webstatus._meta.db_table)
+        columns = (
+            "webservice_id",
+            "ping",
+            "status",
+            "status_code",
+            "date_and_time",
+            "check_type",
+            "created_at",
+            "updated_at",
+        )
+        sql = "INSERT INTO {} ({}) VALUES ({})".format(
+            table,
+            ", ".join(connection.ops.quote_name(column) for column in columns),
+            ", ".join(["%s"] * len(columns)),
+        )
+
+        now = timezone.now()
+        batch, total = [], 0
+        for webservice_id, interval in services:
+            base_ping = rng.lognormvariate(4.5, 0.6)
+            outage_left = 0
+            start = now - timedelta(minutes=interval * options["checks_per_service"])
+            for index in range(options["checks_per_service"]):
+                checked_at = start + timedelta(minutes=interval * index)
+                if outage_left == 0 and rng.random() < 0.002:
+                    outage_left = rng.randint(1, 12)
+                if outage_left:
+                    outage_left -= 1
+                    status_code = rng.choice((0, 500, 502, 503))
+                    ping = rng.randint(5, 30000) if status_code == 0 else int(base_ping)
+                    row = (webservice_id, ping, False, status_code)
+                else:
+                    ping = max(1, int(rng.gauss(base_ping, base_ping / 5)))
+                    row = (webservice_id, ping, True, 200)
+                # Raw cursors skip field adaptation, so do what DateTimeField would
+                checked_at = connection.ops.adapt_datetimefield_value(checked_at)
+                batch.append(row + (checked_at, SCHEDULED, checked_at, checked_at))
+
+                if len(batch) >= options["batch_size"]:
+                    total += self.flush(sql, batch)
+        return total + self.flush(sql, batch)
+
+    def flush(self, sql, batch):
+        if not batch:
+            return 0
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(sql, batch)
+        count = len(batch)
+        batch.clear()
+        return count
@@ -0,0 +1,58 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from authentication.models import User
+from main.sla import parse_month, user_reports
+
+
+class Command(BaseCommand):
+    help = "Write one monthly SLA report per user"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--month", help="YYYY-MM (default: last full month)")
+        parser.add_argument(
+            "--user", nargs="+", default=None, help="Only these user emails"
+        )
+        parser.add_argument(
+            "--output-dir", default=".", help="Directory for the JSON reports"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            start, end = parse_month(options["month"])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        user_ids = None
+        if options["user"]:
+            user_ids = list(
+                User.objects.filter(email__in=options["user"]).values_list(
+                    "id", flat=True
+                )
+            )
+            if not user_ids:
+                raise CommandError("No matching users.")
+
+        started = time.perf_counter()
+        reports = user_reports(start, end, user_ids)
+        elapsed = time.perf_counter() - started
+
+        os.makedirs(options["output_dir"], exist_ok=True)
+        month = start.strftime("%Y-%m")
+        for user_id, report in reports.items():
+            path = os.path.join(
+                options["output_dir"], f"sla-{month}-user-{user_id}.json"
+            )
+            with open(path, "w") as out:
+                json.dump(report, out, cls=DjangoJSONEncoder, indent=2)
+
+        services = sum(report["summary"]["services"] for report in reports.values())
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Wrote {len(reports)} reports covering {services} services "
+                f"for {month} in {elapsed:.2f}s"
+            )
+        )
@@ -0,0 +1,438 @@
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Min
+from django.utils import timezone
+from django_q.brokers import get_broker
+from django_q.brokers.orm import ORM
+from django_q.conf import Conf
+from django_q.models import OrmQ
+
+from .models import WebService
+
+# Latency buckets in seconds, shared by the probe and SMTP histograms
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+CACHE_KEY_PREFIX = "byteping:metrics"
+
+
+class Metric:
+    """
+    An in-process metric family keyed by label values
+
+    Updates only take a lock and touch a dict, so they are cheap enough to run on
+    every check. Values are cumulative for the life of the process.
+    """
+
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(label, "")) for label in self.labelnames)
+
+    def snapshot(self):
+        with self._lock:
+            return {key: self._copy(value) for key, value in self._values.items()}
+
+    def _copy(self, value):
+        return value
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Histogram(Metric):
+    """
+    Cumulative-bucket histogram; each value is [bucket counts..., sum, count]
+    """
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def _copy(self, value):
+        return list(value)
+
+
+REGISTRY = []
+
+check_duration = Histogram(
+    "byteping_check_duration_seconds",
+    "Duration of a monitoring check, by result (up, down, error)",
+    ["result"],
+)
+webstatus_inserts = Counter(
+    "byteping_webstatus_inserts_total", "Webstatus rows written by the monitoring path"
+)
+smtp_send_duration = Histogram(
+    "byteping_smtp_send_duration_seconds",
+    "Time spent sending alert emails, by result (sent, failed)",
+    ["result"],
+)
+smtp_failures = Counter(
+    "byteping_smtp_failures_total", "Alert emails that failed to send"
+)
+rate_limit_rejections = Counter(
+    "byteping_rate_limit_rejections_total",
+    "Requests rejected by authentication rate limits, by bucket scope",
+    ["scope"],
+)
+replica_fallbacks = Counter(
+    "byteping_replica_fallbacks_total",
+    "Replica-eligible reads sent to the primary, by reason",
+    ["reason"],
+)
+breaker_trips = Counter(
+    "byteping_circuit_breaker_trips_total",
+    "Services whose circuit breaker opened after repeated connect failures or timeouts",
+)
+breaker_probes = Counter(
+    "byteping_circuit_breaker_probes_total",
+    "Connect-only probes sent to services with an open circuit breaker",
+)
+dispatch_lag = Histogram(
+    "byteping_dispatch_lag_seconds",
+    "How late checks were dispatched relative to their planned time",
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600),
+)
+checks_deferred = Counter(
+    "byteping_checks_deferred_total",
+    "Due checks left for a later dispatch tick, by limiting reason "
+    "(concurrency, rate, capacity)",
+    ["reason"],
+)
+checks_shed = Counter(
+    "byteping_checks_shed_total",
+    "Checks or check work dropped by the monitoring path, by reason (duplicate, "
+    "superseded, overload_backoff, overload_sketch)",
+    ["reason"],
+)
+check_start_lag = Histogram(
+    "byteping_check_start_lag_seconds",
+    "Time from a dispatched check's planned run to the moment a worker starts it",
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600),
+)
+heartbeat_pings = Counter(
+    "byteping_heartbeat_pings_total", "Pings received by heartbeat monitors"
+)
+heartbeats_missed = Counter(
+    "byteping_heartbeats_missed_total",
+    "Heartbeat monitors found past their deadline without a ping",
+)
+latency_anomalies = Counter(
+    "byteping_latency_anomalies_total",
+    "Services flagged for a sustained rise in latency over their baseline",
+)
+
+STATE_KEY = f"{CACHE_KEY_PREFIX}:state"
+LOCK_KEY = f"{CACHE_KEY_PREFIX}:lock"
+
+_last_flush = 0.0
+_process_key = None
+_process_pid = None
+
+
+@contextmanager
+def state_lock(wait=5):
+    """
+    Hold the cache-wide lock guarding STATE_KEY, giving up after `wait` seconds
+
+    Yields whether the lock was taken.
+    """
+    deadline = time.monotonic() + wait
+    while not cache.add(LOCK_KEY, os.getpid(), 30):
+        if time.monotonic() >= deadline:
+            yield False
+            return
+        time.sleep(0.05)
+    try:
+        yield True
+    finally:
+        cache.delete(LOCK_KEY)
+
+
+def load_state():
+    """
+    Registered process keys and the totals folded in from retired processes
+    """
+    return cache.get(STATE_KEY) or {"processes": [], "retired": {}}
+
+
+def process_key():
+    """
+    Cache key for this process's snapshot, registered in the state on first use
+
+    Keys are random rather than pids, which repeat across hosts and restarts.
+    """
+    global _process_key, _process_pid
+    if _process_pid != os.getpid():
+        key = f"{CACHE_KEY_PREFIX}:process:{uuid.uuid4().hex}"
+        with state_lock() as locked:
+            if not locked:
+                raise RuntimeError("metrics state is locked")
+            state = load_state()
+            state["processes"].append(key)
+            cache.set(STATE_KEY, state, None)
+        _process_key, _process_pid = key, os.getpid()
+    return _process_key
+
+
+def flush(force=False):
+    """
+    Publish this process's metrics to the shared cache, at most every
+    BYTEPING_METRICS_FLUSH_SECONDS unless forced
+
+    django-q runs checks in worker processes, so the /metrics view merges the
+    snapshots every process has published. Needs a cache shared between
+    processes (not local memory) to see worker metrics from the web process.
+    """
+    global _last_flush
+    now = time.monotonic()
+    if not force and now - _last_flush < settings.BYTEPING_METRICS_FLUSH_SECONDS:
+        return
+    _last_flush = now
+
+    try:
+        cache.set(
+            process_key(),
+            {
+                "flushed_at": time.time(),
+                "metrics": {metric.name: metric.snapshot() for metric in REGISTRY},
+            },
+            None,
+        )
+    except Exception as e:
+        print(f"BytePing: Could not publish metrics - {e}")
+
+
+def merge(merged, metrics):
+    for name, values in metrics.items():
+        family = merged.setdefault(name, {})
+        for key, value in values.items():
+            if key not in family:
+                family[key] = value
+            elif isinstance(value, list):
+                family[key] = [a + b for a, b in zip(family[key], value)]
+            else:
+                family[key] += value
+    return merged
+
+
+def retire_processes():
+    """
+    Fold the totals of processes that stopped publishing into the state
+
+    django-q recycles workers, and dropping a dead worker's counts would make
+    the merged counters go backwards, which Prometheus reads as a reset. A
+    process is retired once its last flush is older than BYTEPING_METRICS_TTL.
+    """
+    with state_lock(wait=0) as locked:
+        if not locked:
+            return
+        state = load_state()
+        snapshots = cache.get_many(state["processes"])
+        cutoff = time.time() - settings.BYTEPING_METRICS_TTL
+        retired = [
+            key
+            for key in state["processes"]
+            if key not in snapshots or snapshots[key]["flushed_at"] < cutoff
+        ]
+        if not retired:
+            return
+        for key in retired:
+            if key in snapshots:
+                merge(state["retired"], snapshots[key]["metrics"])
+        state["processes"] = [key for key in state["processes"] if key not in retired]
+        cache.set(STATE_KEY, state, None)
+    # Left readable for a while, for scrapes that loaded the previous state
+    for key in retired:
+        cache.touch(key, settings.BYTEPING_METRICS_FLUSH_SECONDS * 6)
+
+
+def collect():
+    """
+    Merge the published snapshots of every process (including this one) with
+    the totals of retired ones
+    """
+    flush(force=True)
+    retire_processes()
+    state = load_state()
+    # This process still counts if the state was lost, e.g. to a cache flush
+    keys = set(state["processes"]) | {process_key()}
+    merged = merge({metric.name: {} for metric in REGISTRY}, state["retired"])
+    for snapshot in cache.get_many(keys).values():
+        merge(merged, snapshot["metrics"])
+    return merged
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in labels
+    )
+    return "{" + pairs + "}"
+
+
+def render(gauges=()):
+    """
+    Render all metrics in the Prometheus text exposition format
+
+    `gauges` is an iterable of (name, documentation, [(labels, value), ...]) for
+    values computed at scrape time.
+    """
+    merged = collect()
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        for key, value in sorted(merged.get(metric.name, {}).items()):
+            labels = list(zip(metric.labelnames, key))
+            if metric.type == "histogram":
+                for bound, count in zip(metric.buckets, value):
+                    lines.append(
+                        f"{metric.name}_bucket{format_labels(labels + [('le', bound)])} {count}"
+                    )
+                lines.append(
+                    f"{metric.name}_bucket{format_labels(labels + [('le', '+Inf')])} {value[-1]}"
+                )
+                lines.append(f"{metric.name}_sum{format_labels(labels)} {value[-2]}")
+                lines.append(f"{metric.name}_count{format_labels(labels)} {value[-1]}")
+            else:
+                lines.append(f"{metric.name}{format_labels(labels)} {value}")
+
+    for name, documentation, samples in gauges:
+        lines.append(f"# HELP {name} {documentation}")
+        lines.append(f"# TYPE {name} gauge")
+        for labels, value in samples:
+            lines.append(f"{name}{format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def scrape_gauges():
+    """
+    Queue and scheduler health, read from django-q at scrape time
+    """
+    now = timezone.now()
+    broker = get_broker()
+    gauges = [
+        (
+            "byteping_queue_depth",
+            "Tasks waiting in the django-q queue",
+            [((), broker.queue_size() or 0)],
+        ),
+        (
+            "byteping_queue_in_flight",
+            "Tasks pulled from the queue and awaiting acknowledgement",
+            [((), broker.lock_size() or 0)],
+        ),
+    ]
+
+    if isinstance(broker, ORM):
+        oldest = (
+            OrmQ.objects.using(Conf.ORM)
+            .filter(key=broker.list_key)
+            .order_by("id")
+            .first()
+        )
+        age = (now - oldest.task()["started"]).total_seconds() if oldest else 0
+        gauges.append(
+            (
+                "byteping_queue_oldest_task_age_seconds",
+                "Age of the oldest queued task",
+                [((), round(age, 3))],
+            )
+        )
+
+    from .routers import replica_lags
+
+    lags = replica_lags()
+    if lags:
+        gauges.append(
+            (
+                "byteping_replica_lag_seconds",
+                "Replication lag per read replica (-1 when replication is broken)",
+                [
+                    ((("alias", alias),), -1 if lag is None else lag)
+                    for alias, lag in sorted(lags.items())
+                ],
+            )
+        )
+
+    overdue = WebService.objects.filter(is_active=True, next_check_at__lt=now)
+    oldest_due = overdue.aggregate(oldest=Min("next_check_at"))["oldest"]
+    gauges.append(
+        (
+            "byteping_scheduling_lag_seconds",
+            "How far the most overdue scheduled check is behind its planned time",
+            [((), round((now - oldest_due).total_seconds(), 3) if oldest_due else 0)],
+        )
+    )
+    per_user = list(
+        overdue.order_by()
+        .values("user_id")
+        .annotate(oldest=Min("next_check_at"), count=Count("id"))
+        .values_list("user_id", "oldest", "count")
+    )
+    gauges.append(
+        (
+            "byteping_schedules_overdue",
+            "Scheduled checks past their planned time",
+            [((), sum(count for _, _, count in per_user))],
+        )
+    )
+    # Spread across users rather than one series per user, which would leak
+    # user ids and grow with the user count
+    lags = sorted(round((now - oldest).total_seconds(), 3) for _, oldest, _ in per_user)
+    gauges.append(
+        (
+            "byteping_tenants_overdue",
+            "Users with checks past their planned time",
+            [((), len(per_user))],
+        )
+    )
+    if lags:
+        gauges.append(
+            (
+                "byteping_tenant_scheduling_lag_seconds",
+                "How far users' most overdue checks are behind, as quantiles over users",
+                [
+                    ((("quantile", q),), lags[round(q * (len(lags) - 1))])
+                    for q in (0.5, 0.9, 1.0)
+                ],
+            )
+        )
+    return gauges
@@ -0,0 +1,28 @@
+# Generated by Django 4.2 on 2026-10-19 13:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0002_rename_datendtime_webstatus_date_and_time'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='webservice',
+            name='email_alert',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name='webstatus',
+            name='webservice',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='main.webservice'),
+        ),
+        migrations.AddIndex(
+            model_name='webstatus',
+            index=models.Index(fields=['webservice', 'date_and_time'], name='main_websta_webserv_0a8aa6_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2 on 2026-10-19 13:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0003_webstatus_partition_ready'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LatencySketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket_start', models.DateTimeField()),
+                ('count', models.IntegerField(default=0)),
+                ('sketch', models.JSONField(default=dict)),
+                ('webservice', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main.webservice')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='latencysketch',
+            constraint=models.UniqueConstraint(fields=('webservice', 'bucket_start'), name='unique_latency_sketch'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2 on 2026-10-19 13:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0004_latency_sketch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Incident',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField()),
+                ('ended_at', models.DateTimeField(blank=True, null=True)),
+                ('duration', models.DurationField(blank=True, null=True)),
+                ('worst_status_code', models.IntegerField()),
+                ('check_count', models.IntegerField(default=1)),
+                ('webservice', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main.webservice')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='incident',
+            index=models.Index(fields=['webservice', 'started_at'], name='main_incide_webserv_60e0cd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='incident',
+            index=models.Index(fields=['webservice', 'ended_at'], name='main_incide_webserv_0cb037_idx'),
+        ),
+    ]
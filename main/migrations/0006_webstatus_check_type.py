@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-19 13:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_incident'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='webstatus',
+            name='check_type',
+            field=models.CharField(choices=[('scheduled', 'Scheduled'), ('confirmation', 'Confirmation'), ('backoff', 'Backoff')], default='scheduled', max_length=12),
+        ),
+    ]
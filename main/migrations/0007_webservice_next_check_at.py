@@ -0,0 +1,44 @@
+# Generated by Django 4.2 on 2026-10-19 13:39
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def schedule_active_services(apps, schema_editor):
+    """
+    Hand active services to the dispatcher and drop their per-service schedules
+    """
+    WebService = apps.get_model("main", "WebService")
+    Schedule = apps.get_model("django_q", "Schedule")
+    WebService.objects.filter(is_active=True).update(next_check_at=timezone.now())
+    Schedule.objects.filter(name__startswith="byteping_monitor_").delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_webstatus_check_type'),
+        ('django_q', '0014_schedule_cluster'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='webservice',
+            name='backoff_interval',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='webservice',
+            name='next_check_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='webservice',
+            index=models.Index(fields=['is_active', 'next_check_at'], name='main_webser_is_acti_3ea04f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='webservice',
+            index=models.Index(fields=['user', 'next_check_at'], name='main_webser_user_id_39bdbd_idx'),
+        ),
+        migrations.RunPython(schedule_active_services, migrations.RunPython.noop),
+    ]
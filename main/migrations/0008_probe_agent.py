@@ -0,0 +1,45 @@
+# Generated by Django 4.2 on 2026-10-19 13:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_webservice_next_check_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProbeAgent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('token_hash', models.CharField(max_length=64, unique=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('last_seen_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='IngestBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('idempotency_key', models.CharField(max_length=64)),
+                ('accepted', models.IntegerField(default=0)),
+                ('rejected', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('agent', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main.probeagent')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='webservice',
+            name='probe_agent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='webservices', to='main.probeagent'),
+        ),
+        migrations.AddConstraint(
+            model_name='ingestbatch',
+            constraint=models.UniqueConstraint(fields=('agent', 'idempotency_key'), name='unique_ingest_batch'),
+        ),
+    ]
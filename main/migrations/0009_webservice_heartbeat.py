@@ -0,0 +1,37 @@
+# Generated by Django 4.2 on 2026-10-19 13:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_probe_agent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='webservice',
+            name='heartbeat_deadline',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='webservice',
+            name='heartbeat_token',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='webservice',
+            name='monitor_type',
+            field=models.CharField(choices=[('http', 'HTTP'), ('heartbeat', 'Heartbeat')], default='http', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='webstatus',
+            name='check_type',
+            field=models.CharField(choices=[('scheduled', 'Scheduled'), ('confirmation', 'Confirmation'), ('backoff', 'Backoff'), ('heartbeat', 'Heartbeat')], default='scheduled', max_length=12),
+        ),
+        migrations.AddIndex(
+            model_name='webservice',
+            index=models.Index(fields=['heartbeat_deadline'], name='main_webser_heartbe_961e25_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2 on 2026-10-19 13:53
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('main', '0009_webservice_heartbeat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatusPage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slug', models.SlugField(unique=True)),
+                ('title', models.CharField(max_length=100)),
+                ('snapshot', models.JSONField(blank=True, null=True)),
+                ('etag', models.CharField(blank=True, max_length=64)),
+                ('built_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('webservices', models.ManyToManyField(related_name='status_pages', to='main.webservice')),
+            ],
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2 on 2026-10-19 13:56
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_status_page'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='webservice',
+            name='sla_target',
+            field=models.FloatField(default=99.9, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(100)]),
+        ),
+    ]
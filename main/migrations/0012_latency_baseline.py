@@ -0,0 +1,26 @@
+# Generated by Django 4.2 on 2026-10-19 13:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0011_webservice_sla_target'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LatencyBaseline',
+            fields=[
+                ('webservice', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='latency_baseline', serialize=False, to='main.webservice')),
+                ('mean', models.FloatField(default=0)),
+                ('variance', models.FloatField(default=0)),
+                ('samples', models.IntegerField(default=0)),
+                ('streak', models.IntegerField(default=0)),
+                ('flagged', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
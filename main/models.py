@@ -1,10 +1,26 @@
 from django.db import models
 from django.conf import settings
-from django.core.validators import MinValueValidator
+from django.core.validators import MaxValueValidator, MinValueValidator
 
 # Create your models here.
 
 
+class ProbeAgent(models.Model):
+    """
+    A remote probe runner that pulls its assigned checks over the agent API
+    Only a SHA-256 of the token is stored; the token is shown once on creation.
+    """
+
+    name = models.CharField(max_length=100, unique=True)
+    token_hash = models.CharField(max_length=64, unique=True)
+    is_active = models.BooleanField(default=True)
+    last_seen_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+
 class WebService(models.Model):
     id = models.AutoField(primary_key=True)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
@@ -16,22 +32,185 @@ class WebService(models.Model):
         default=10, validators=[MinValueValidator(10)]
     )
     expect_status_code = models.IntegerField(default=200)
+    # Availability promised in SLA reports, in percent (see main.sla)
+    sla_target = models.FloatField(
+        default=99.9, validators=[MinValueValidator(0), MaxValueValidator(100)]
+    )
+    # "http" services are checked by BytePing, "heartbeat" ones ping BytePing
+    # (see main.heartbeats)
+    monitor_type = models.CharField(
+        max_length=10,
+        choices=[("http", "HTTP"), ("heartbeat", "Heartbeat")],
+        default="http",
+    )
+    # Secret part of a heartbeat monitor's ping URL
+    heartbeat_token = models.CharField(
+        max_length=64, unique=True, null=True, blank=True
+    )
+    # A heartbeat monitor with no ping recorded by then has missed one
+    heartbeat_deadline = models.DateTimeField(null=True, blank=True)
+    # Planned time of the next scheduled check, null while not monitored
+    # (see main.dispatch)
+    next_check_at = models.DateTimeField(null=True, blank=True)
+    # Stretched interval in minutes while main.adaptive backs the service off
+    backoff_interval = models.IntegerField(null=True, blank=True)
+    # Checked by this remote agent instead of the django-q cluster
+    probe_agent = models.ForeignKey(
+        ProbeAgent,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="webservices",
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["is_active", "next_check_at"]),
+            models.Index(fields=["user", "next_check_at"]),
+            models.Index(fields=["heartbeat_deadline"]),
+        ]
+
     def __str__(self):
         return self.webservice_name
 
 
 class Webstatus(models.Model):
     id = models.AutoField(primary_key=True)
-    webservice = models.ForeignKey(WebService, on_delete=models.CASCADE)
+    # No DB-level constraint: MySQL cannot range-partition a table with foreign
+    # keys (see main.partitions). Django still cascades deletes itself.
+    webservice = models.ForeignKey(
+        WebService, on_delete=models.CASCADE, db_constraint=False
+    )
     ping = models.IntegerField(null=False, blank=False)
     status = models.BooleanField(null=False, blank=False)
     status_code = models.IntegerField(null=False, blank=False)
     date_and_time = models.DateTimeField(null=False, blank=False)
+    check_type = models.CharField(
+        max_length=12,
+        choices=[
+            ("scheduled", "Scheduled"),
+            ("confirmation", "Confirmation"),
+            ("backoff", "Backoff"),
+            ("heartbeat", "Heartbeat"),
+        ],
+        default="scheduled",
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [models.Index(fields=["webservice", "date_and_time"])]
+
     def __str__(self):
         return f"{self.webservice.webservice_name} - status: {'up' if self.status else 'down'} at {self.date_and_time}"
+
+
+class LatencySketch(models.Model):
+    """
+    Hourly DDSketch of a service's pings (see main.sketches)
+    """
+
+    webservice = models.ForeignKey(WebService, on_delete=models.CASCADE)
+    bucket_start = models.DateTimeField()
+    count = models.IntegerField(default=0)
+    sketch = models.JSONField(default=dict)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["webservice", "bucket_start"], name="unique_latency_sketch"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.webservice_id} latency from {self.bucket_start}"
+
+
+class Incident(models.Model):
+    """
+    A run of consecutive failed checks, open (ended_at is null) until recovery
+    """
+
+    webservice = models.ForeignKey(WebService, on_delete=models.CASCADE)
+    started_at = models.DateTimeField()
+    ended_at = models.DateTimeField(null=True, blank=True)
+    duration = models.DurationField(null=True, blank=True)
+    worst_status_code = models.IntegerField()
+    check_count = models.IntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["webservice", "started_at"]),
+            models.Index(fields=["webservice", "ended_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.webservice_id} down from {self.started_at}"
+
+
+class IngestBatch(models.Model):
+    """
+    A result batch an agent has delivered, so retries of it are not re-applied
+    """
+
+    agent = models.ForeignKey(ProbeAgent, on_delete=models.CASCADE)
+    idempotency_key = models.CharField(max_length=64)
+    accepted = models.IntegerField(default=0)
+    rejected = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["agent", "idempotency_key"], name="unique_ingest_batch"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.agent_id} batch {self.idempotency_key}"
+
+
+class StatusPage(models.Model):
+    """
+    A public page for some of a user's services
+    Its payload is precomputed into `snapshot` by main.status_pages, so serving
+    it never touches checks or incidents.
+    """
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    slug = models.SlugField(max_length=50, unique=True)
+    title = models.CharField(max_length=100)
+    webservices = models.ManyToManyField(WebService, related_name="status_pages")
+    snapshot = models.JSONField(null=True, blank=True)
+    etag = models.CharField(max_length=64, blank=True)
+    built_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.title
+
+
+class LatencyBaseline(models.Model):
+    """
+    Persisted streaming latency baseline of a service (see main.anomalies)
+    """
+
+    webservice = models.OneToOneField(
+        WebService,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="latency_baseline",
+    )
+    mean = models.FloatField(default=0)
+    variance = models.FloatField(default=0)
+    samples = models.IntegerField(default=0)
+    # Anomalous pings in a row, and whether they have lasted long enough to flag
+    streak = models.IntegerField(default=0)
+    flagged = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.webservice_id} baseline {self.mean:.0f}ms"
@@ -0,0 +1,56 @@
+import csv
+import gzip
+import io
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+
+
+def read_csv_rows(text):
+    """
+    Parse CSV text with a header row into a list of dicts, dropping empty cells
+    """
+    reader = csv.DictReader(io.StringIO(text))
+    return [
+        {key.strip(): value.strip() for key, value in row.items() if key and value}
+        for row in reader
+    ]
+
+
+class CSVParser(BaseParser):
+    """
+    Parse a text/csv request body into a list of row dicts
+    """
+
+    media_type = "text/csv"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", "utf-8")
+        try:
+            return read_csv_rows(stream.read().decode(encoding))
+        except (UnicodeDecodeError, csv.Error) as e:
+            raise ParseError(f"CSV parse error - {e}")
+
+
+class GzipJSONParser(JSONParser):
+    """
+    JSON parser that also accepts a gzip-compressed body (Content-Encoding: gzip)
+    The decompressed size is capped at BYTEPING_AGENT_MAX_BATCH_BYTES.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        request = parser_context.get("request")
+        if request is None or request.META.get("HTTP_CONTENT_ENCODING") != "gzip":
+            return super().parse(stream, media_type, parser_context)
+
+        limit = settings.BYTEPING_AGENT_MAX_BATCH_BYTES
+        try:
+            body = gzip.GzipFile(fileobj=stream).read(limit + 1)
+        except (OSError, EOFError) as e:
+            raise ParseError(f"Gzip decode error - {e}")
+        if len(body) > limit:
+            raise ParseError(f"Decompressed body exceeds {limit} bytes.")
+        return super().parse(io.BytesIO(body), media_type, parser_context)
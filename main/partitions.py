@@ -0,0 +1,191 @@
+"""
+Range partitioning of the Webstatus table by date_and_time (MySQL only)
+
+Partitions are named p<YYYYMMDD> (daily) or p<YYYYMM> (monthly) after the first
+day they hold, plus a catch-all pmax. Retention drops whole partitions, which
+is a metadata operation instead of a row-by-row DELETE, and queries filtering
+on date_and_time only read the partitions in their range.
+"""
+
+from datetime import datetime, timedelta
+
+from django.db import connection
+from django.utils import timezone
+
+from .models import Webstatus
+
+TABLE = Webstatus._meta.db_table
+GRANULARITIES = ("day", "month")
+
+
+class PartitionError(Exception):
+    pass
+
+
+def require_mysql():
+    if connection.vendor != "mysql":
+        raise PartitionError("Webstatus partitioning is only supported on MySQL.")
+
+
+def partition_name(start, granularity):
+    return f"p{start:%Y%m%d}" if granularity == "day" else f"p{start:%Y%m}"
+
+
+def period_start(day, granularity):
+    return day if granularity == "day" else day.replace(day=1)
+
+
+def next_period(start, granularity):
+    if granularity == "day":
+        return start + timedelta(days=1)
+    return (start.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def horizon(granularity, ahead):
+    """
+    Start of the period `ahead` days (or months) from today (UTC)
+    """
+    end = period_start(timezone.now().date(), granularity)
+    for _ in range(ahead):
+        end = next_period(end, granularity)
+    return end
+
+
+def partition_start(name):
+    """
+    First day held by a named partition (None for pmax)
+    """
+    digits = name[1:]
+    if len(digits) == 8:
+        return datetime.strptime(digits, "%Y%m%d").date()
+    if len(digits) == 6:
+        return datetime.strptime(digits, "%Y%m").date()
+    return None
+
+
+def existing_partitions():
+    """
+    (name, rows) of each partition in order, empty if the table is not partitioned
+    """
+    require_mysql()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT PARTITION_NAME, TABLE_ROWS FROM information_schema.PARTITIONS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+              AND PARTITION_NAME IS NOT NULL
+            ORDER BY PARTITION_ORDINAL_POSITION
+            """,
+            [TABLE],
+        )
+        return cursor.fetchall()
+
+
+def detect_granularity(partitions):
+    for name, _ in partitions:
+        if name != "pmax":
+            return "day" if len(name) == 9 else "month"
+    return None
+
+
+def partition_clauses(start, end, granularity):
+    """
+    PARTITION definitions for every period from `start` up to and including `end`
+    """
+    clauses = []
+    current = period_start(start, granularity)
+    while current <= end:
+        upper = next_period(current, granularity)
+        clauses.append(
+            f"PARTITION {partition_name(current, granularity)} "
+            f"VALUES LESS THAN ('{upper:%Y-%m-%d}')"
+        )
+        current = upper
+    return clauses
+
+
+def convert(granularity, ahead):
+    """
+    Rebuild Webstatus as a range-partitioned table
+
+    MySQL requires the partitioning column in every unique key, so the primary
+    key becomes (id, date_and_time); id keeps AUTO_INCREMENT. This copies the
+    table, so run it in a maintenance window.
+    """
+    require_mysql()
+    if granularity not in GRANULARITIES:
+        raise PartitionError(f"granularity must be one of {GRANULARITIES}")
+    if existing_partitions():
+        raise PartitionError(f"{TABLE} is already partitioned.")
+
+    oldest = Webstatus.objects.order_by("date_and_time").values_list(
+        "date_and_time", flat=True
+    ).first()
+    start = oldest.date() if oldest else timezone.now().date()
+    clauses = partition_clauses(start, horizon(granularity, ahead), granularity)
+    clauses.append("PARTITION pmax VALUES LESS THAN (MAXVALUE)")
+
+    quoted = connection.ops.quote_name(TABLE)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"ALTER TABLE {quoted} DROP PRIMARY KEY, ADD PRIMARY KEY (`id`, `date_and_time`)"
+        )
+        cursor.execute(
+            f"ALTER TABLE {quoted} PARTITION BY RANGE COLUMNS(`date_and_time`) "
+            f"({', '.join(clauses)})"
+        )
+    return len(clauses)
+
+
+def precreate(ahead):
+    """
+    Split pmax so partitions exist `ahead` days (or months) into the future
+    """
+    require_mysql()
+    partitions = existing_partitions()
+    granularity = detect_granularity(partitions)
+    if granularity is None:
+        raise PartitionError(f"{TABLE} is not partitioned, run --convert first.")
+
+    last = max(partition_start(name) for name, _ in partitions if name != "pmax")
+    clauses = partition_clauses(
+        next_period(last, granularity), horizon(granularity, ahead), granularity
+    )
+    if not clauses:
+        return 0
+    clauses.append("PARTITION pmax VALUES LESS THAN (MAXVALUE)")
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"ALTER TABLE {connection.ops.quote_name(TABLE)} "
+            f"REORGANIZE PARTITION pmax INTO ({', '.join(clauses)})"
+        )
+    return len(clauses) - 1
+
+
+def drop_older_than(cutoff):
+    """
+    Drop every partition whose whole range is before `cutoff` (a date)
+    Returns the dropped partition names.
+    """
+    require_mysql()
+    partitions = existing_partitions()
+    granularity = detect_granularity(partitions)
+    if granularity is None:
+        raise PartitionError(f"{TABLE} is not partitioned, run --convert first.")
+
+    expired = [
+        name
+        for name, _ in partitions
+        if name != "pmax"
+        and next_period(partition_start(name), granularity) <= cutoff
+    ]
+    # MySQL needs at least one partition left besides pmax
+    if expired and len(expired) >= len(partitions) - 1:
+        expired = expired[:-1]
+    if expired:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"ALTER TABLE {connection.ops.quote_name(TABLE)} "
+                f"DROP PARTITION {', '.join(expired)}"
+            )
+    return expired
@@ -0,0 +1,132 @@
+"""
+HTTP probing with per-service timeouts and a circuit breaker
+
+Timeouts follow each service's own latency: a multiple of its recent p99 ping,
+clamped between the configured floor and ceiling, so a dead host gives up a
+worker for seconds rather than the flat 30 it used to. Hosts that fail to
+connect or time out BYTEPING_BREAKER_THRESHOLD times in a row trip the breaker;
+while it is open they get a bare TCP connect first, and the request only runs
+once that connect succeeds, with the timeout floors so a host that accepts
+connections but never answers cannot hold a worker for the full timeouts.
+"""
+
+import socket
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from . import metrics
+from .cache import TieredCache
+from .sketches import merged_sketch
+
+timeout_cache = TieredCache(
+    "byteping:timeouts",
+    local_ttl=settings.BYTEPING_TIMEOUT_CACHE_SECONDS,
+    shared_ttl=settings.BYTEPING_TIMEOUT_CACHE_SECONDS,
+)
+
+
+def clamp(value, low, high):
+    return max(low, min(value, high))
+
+
+def load_timeouts(webservice_id):
+    since = timezone.now() - timezone.timedelta(
+        hours=settings.BYTEPING_TIMEOUT_WINDOW_HOURS
+    )
+    sketch = merged_sketch([webservice_id], start=since)
+    if sketch.count < settings.BYTEPING_TIMEOUT_MIN_SAMPLES:
+        return (
+            settings.BYTEPING_CONNECT_TIMEOUT_MAX,
+            settings.BYTEPING_READ_TIMEOUT_MAX,
+        )
+
+    budget = sketch.quantile(0.99) * settings.BYTEPING_TIMEOUT_MULTIPLIER / 1000
+    connect = clamp(
+        budget,
+        settings.BYTEPING_CONNECT_TIMEOUT_MIN,
+        settings.BYTEPING_CONNECT_TIMEOUT_MAX,
+    )
+    read = clamp(
+        budget, settings.BYTEPING_READ_TIMEOUT_MIN, settings.BYTEPING_READ_TIMEOUT_MAX
+    )
+    return (round(connect, 3), round(read, 3))
+
+
+def probe_timeouts(webservice_id):
+    """
+    (connect, read) timeouts in seconds for a service
+    Uses the ceilings until the service has BYTEPING_TIMEOUT_MIN_SAMPLES pings
+    in the last BYTEPING_TIMEOUT_WINDOW_HOURS.
+    """
+    return timeout_cache.get(str(webservice_id), lambda: load_timeouts(webservice_id))
+
+
+def breaker_key(webservice_id):
+    return f"byteping:breaker:{webservice_id}"
+
+
+def breaker_failures(webservice_id):
+    return caches[settings.BYTEPING_SHARED_CACHE].get(breaker_key(webservice_id), 0)
+
+
+def record_hard_failure(webservice_id, failures):
+    failures += 1
+    caches[settings.BYTEPING_SHARED_CACHE].set(
+        breaker_key(webservice_id), failures, settings.BYTEPING_BREAKER_TTL
+    )
+    if failures == settings.BYTEPING_BREAKER_THRESHOLD:
+        metrics.breaker_trips.inc()
+        print(f"BytePing: Circuit open for service {webservice_id}")
+
+
+def connect_only(url, timeout):
+    """
+    Open and close a TCP connection to the URL's host, raising ConnectionError
+    """
+    parts = urlsplit(url)
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    try:
+        socket.create_connection((parts.hostname, port), timeout=timeout).close()
+    except OSError as e:
+        raise requests.exceptions.ConnectionError(
+            f"Circuit open, connect to {parts.hostname}:{port} failed: {e}"
+        )
+
+
+def probe(webservice, trace):
+    """
+    GET the service URL with its adaptive timeouts, through the circuit breaker
+    Raises requests exceptions like requests.get does.
+    """
+    timeouts = probe_timeouts(webservice.id)
+    failures = breaker_failures(webservice.id)
+    trace.annotate(timeouts=timeouts)
+
+    if failures >= settings.BYTEPING_BREAKER_THRESHOLD:
+        trace.annotate(breaker="open")
+        metrics.breaker_probes.inc()
+        try:
+            connect_only(webservice.webservice_url, timeouts[0])
+        except requests.exceptions.ConnectionError:
+            record_hard_failure(webservice.id, failures)
+            raise
+        timeouts = (
+            settings.BYTEPING_CONNECT_TIMEOUT_MIN,
+            settings.BYTEPING_READ_TIMEOUT_MIN,
+        )
+
+    try:
+        response = requests.get(
+            webservice.webservice_url, timeout=timeouts, allow_redirects=True
+        )
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+        record_hard_failure(webservice.id, failures)
+        raise
+
+    if failures:
+        caches[settings.BYTEPING_SHARED_CACHE].delete(breaker_key(webservice.id))
+    return response
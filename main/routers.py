@@ -0,0 +1,142 @@
+import contextvars
+import random
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+
+from . import metrics
+from .cache import TieredCache
+
+# Alias reads are routed to for the current request; None means the primary
+_read_alias = contextvars.ContextVar("byteping_read_alias", default=None)
+
+lag_cache = TieredCache(
+    "byteping:db:lag",
+    local_ttl=settings.BYTEPING_REPLICA_LAG_CHECK_SECONDS,
+    shared_ttl=settings.BYTEPING_REPLICA_LAG_CHECK_SECONDS,
+)
+
+
+class ReplicaRouter:
+    """
+    Send writes to the primary and reads to a replica only inside views marked
+    with @replica_reads; everything else (tasks, auth, writes) stays on default
+    """
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"
+
+
+def measure_replica_lag(alias):
+    """
+    Seconds the replica is behind its source, or None if replication is broken
+    """
+    connection = connections[alias]
+    if connection.vendor != "mysql":
+        return 0
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute("SHOW REPLICA STATUS")
+            column = "Seconds_Behind_Source"
+        except Exception:
+            # MySQL before 8.0.22 / MariaDB
+            cursor.execute("SHOW SLAVE STATUS")
+            column = "Seconds_Behind_Master"
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        columns = [description[0] for description in cursor.description]
+        return dict(zip(columns, row)).get(column)
+
+
+def load_replica_lags():
+    lags = {}
+    for alias in settings.BYTEPING_READ_REPLICAS:
+        try:
+            lags[alias] = measure_replica_lag(alias)
+        except Exception as e:
+            print(f"BytePing: Could not check lag of replica {alias} - {e}")
+            lags[alias] = None
+    return lags
+
+
+def replica_lags():
+    """
+    Lag per replica alias, measured at most every BYTEPING_REPLICA_LAG_CHECK_SECONDS
+    """
+    if not settings.BYTEPING_READ_REPLICAS:
+        return {}
+    return lag_cache.get("all", load_replica_lags)
+
+
+def pin_primary(user_id):
+    """
+    Route this user's reads to the primary for a while after they change data
+    """
+    if settings.BYTEPING_READ_REPLICAS:
+        caches[settings.BYTEPING_SHARED_CACHE].set(
+            f"byteping:db:pinned:{user_id}", True, settings.BYTEPING_READ_YOUR_WRITES_SECONDS
+        )
+
+
+def choose_read_alias(user_id):
+    """
+    A healthy replica for this user's reads, or None for the primary
+    """
+    if not settings.BYTEPING_READ_REPLICAS:
+        return None
+    if caches[settings.BYTEPING_SHARED_CACHE].get(f"byteping:db:pinned:{user_id}"):
+        metrics.replica_fallbacks.inc(reason="read_your_writes")
+        return None
+
+    healthy = [
+        alias
+        for alias, lag in replica_lags().items()
+        if lag is not None and lag <= settings.BYTEPING_REPLICA_MAX_LAG
+    ]
+    if not healthy:
+        metrics.replica_fallbacks.inc(reason="lagging")
+        return None
+    return random.choice(healthy)
+
+
+def routed(iterable, alias):
+    token = _read_alias.set(alias)
+    try:
+        yield from iterable
+    finally:
+        _read_alias.reset(token)
+
+
+def replica_reads(view):
+    """
+    Let a read-only view's queries go to a read replica
+
+    Place below @api_view so request.user is already authenticated. Streaming
+    responses keep the same routing while their content is generated.
+    """
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        alias = choose_read_alias(request.user.id)
+        token = _read_alias.set(alias)
+        try:
+            response = view(request, *args, **kwargs)
+        finally:
+            _read_alias.reset(token)
+        if alias and getattr(response, "streaming", False):
+            response.streaming_content = routed(response.streaming_content, alias)
+        return response
+
+    return wrapper
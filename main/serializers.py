@@ -1,4 +1,6 @@
-from .models import WebService, Webstatus
+from django.utils import timezone
+from .heartbeats import HEARTBEAT, HTTP, new_token, ping_url
+from .models import Incident, StatusPage, WebService, Webstatus
 from rest_framework import serializers
 
 
@@ -13,11 +15,36 @@ class WebServiceSerializer(serializers.ModelSerializer):
             "email_alert",
             "monitor_interval",
             "expect_status_code",
+            "sla_target",
+            "monitor_type",
+            "heartbeat_token",
             "created_at",
             "updated_at",
         )
+        read_only_fields = ("heartbeat_token",)
+        extra_kwargs = {"webservice_url": {"required": False}}
 
     def validate(self, attrs):
+        monitor_type = attrs.get(
+            "monitor_type", self.instance.monitor_type if self.instance else HTTP
+        )
+        if monitor_type == HEARTBEAT:
+            if "webservice_url" in attrs:
+                raise serializers.ValidationError(
+                    {"webservice_url": "Heartbeat monitors use their ping URL."}
+                )
+            if not (self.instance and self.instance.heartbeat_token):
+                # The ping URL doubles as the monitor's URL
+                attrs["heartbeat_token"] = new_token()
+                attrs["webservice_url"] = ping_url(attrs["heartbeat_token"])
+        elif self.instance and self.instance.monitor_type == HEARTBEAT:
+            # The old ping URL is not something an HTTP check can probe
+            if not attrs.get("webservice_url"):
+                raise serializers.ValidationError(
+                    {"webservice_url": "A URL is required for HTTP monitors."}
+                )
+            attrs["heartbeat_token"] = None
+
         if self.instance:
             if not attrs:
                 raise serializers.ValidationError("No data provided to update.")
@@ -29,6 +56,27 @@ class WebServiceSerializer(serializers.ModelSerializer):
         return attrs
 
 
+class StatusPageSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = StatusPage
+        fields = (
+            "id",
+            "slug",
+            "title",
+            "webservices",
+            "built_at",
+            "created_at",
+            "updated_at",
+        )
+        read_only_fields = ("built_at",)
+
+    def validate_webservices(self, webservices):
+        user = self.context["request"].user
+        if any(webservice.user_id != user.id for webservice in webservices):
+            raise serializers.ValidationError("WebService not found for this user.")
+        return webservices
+
+
 class WebstatusSerializer(serializers.ModelSerializer):
     class Meta:
         model = Webstatus
@@ -39,6 +87,7 @@ class WebstatusSerializer(serializers.ModelSerializer):
             "status",
             "status_code",
             "date_and_time",
+            "check_type",
             "created_at",
             "updated_at",
             "webservice_id",
@@ -52,3 +101,74 @@ class WebstatusSerializer(serializers.ModelSerializer):
         if not ping and not status and not status_code and not webservice_id:
             raise serializers.ValidationError("web status information not provided")
         return attrs
+
+
+class IncidentSerializer(serializers.ModelSerializer):
+    duration = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Incident
+        fields = (
+            "id",
+            "started_at",
+            "ended_at",
+            "duration",
+            "worst_status_code",
+            "check_count",
+        )
+
+    def get_duration(self, obj):
+        return obj.duration.total_seconds() if obj.duration is not None else None
+
+
+def format_datetime(value):
+    """
+    ISO 8601 the way DRF's DateTimeField renders it (UTC as a trailing Z)
+    """
+    value = timezone.localtime(value).isoformat()
+    if value.endswith("+00:00"):
+        value = value[:-6] + "Z"
+    return value
+
+
+def webstatus_rows(queryset):
+    """
+    Read-only fast path for WebstatusSerializer(many=True).data
+
+    Pulls plain tuples with values_list and builds the same dicts, skipping the
+    per-row model instance and field machinery.
+    """
+    fields = WebstatusSerializer.Meta.fields
+    datetime_fields = [
+        index
+        for index, name in enumerate(fields)
+        if name in ("date_and_time", "created_at", "updated_at")
+    ]
+    rows = []
+    for values in queryset.values_list(*fields):
+        values = list(values)
+        for index in datetime_fields:
+            values[index] = format_datetime(values[index])
+        rows.append(dict(zip(fields, values)))
+    return rows
+
+
+def webstatus_columns(queryset):
+    """
+    Compact columnar form: parallel arrays of epoch-millisecond timestamps,
+    pings, statuses and status codes
+    """
+    timestamps, pings, statuses, codes = [], [], [], []
+    for checked_at, ping, status, status_code in queryset.values_list(
+        "date_and_time", "ping", "status", "status_code"
+    ):
+        timestamps.append(int(checked_at.timestamp() * 1000))
+        pings.append(ping)
+        statuses.append(status)
+        codes.append(status_code)
+    return {
+        "timestamp": timestamps,
+        "ping": pings,
+        "status": statuses,
+        "status_code": codes,
+    }
@@ -0,0 +1,68 @@
+"""
+Overload detection and load shedding for the monitoring path
+
+Every dispatched check carries the time it was planned for and the time the
+next check of the same service is planned for. A check that starts after that
+second time has been superseded and is dropped instead of reporting a stale
+result, and a check django-q re-delivers after its `retry` timeout is dropped
+as a duplicate. When the broker queue stays deeper than
+BYTEPING_OVERLOAD_QUEUE_DEPTH for BYTEPING_OVERLOAD_TICKS dispatcher ticks in a
+row, low-priority work (backoff checks and latency sketch updates) is shed so
+up/down detection keeps its capacity. Every dropped item is counted in
+byteping_checks_shed_total.
+"""
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from . import metrics
+from .adaptive import BACKOFF
+
+OVERLOAD_KEY = "byteping:overload:ticks"
+# How long a handled planned time is remembered; well past django-q's retry
+PLANNED_TTL = 3600
+
+
+def record_queue_depth(depth):
+    """
+    Track how many dispatcher ticks in a row saw an overloaded queue
+    """
+    shared = caches[settings.BYTEPING_SHARED_CACHE]
+    if depth > settings.BYTEPING_OVERLOAD_QUEUE_DEPTH:
+        ticks = (shared.get(OVERLOAD_KEY) or 0) + 1
+    else:
+        ticks = 0
+    # Expires if the dispatcher stops, so a dead dispatcher does not pin overload
+    shared.set(OVERLOAD_KEY, ticks, 300)
+    return ticks
+
+
+def is_overloaded():
+    ticks = caches[settings.BYTEPING_SHARED_CACHE].get(OVERLOAD_KEY) or 0
+    return ticks >= settings.BYTEPING_OVERLOAD_TICKS
+
+
+def shed(reason, count=1):
+    metrics.checks_shed.inc(count, reason=reason)
+
+
+def shed_reason(webservice_id, check_type, planned_at, superseded_at):
+    """
+    Why this check should be dropped, or None to run it
+    """
+    now = timezone.now()
+    if planned_at is not None:
+        metrics.check_start_lag.observe((now - planned_at).total_seconds())
+        shared = caches[settings.BYTEPING_SHARED_CACHE]
+        key = f"byteping:planned:{webservice_id}"
+        last = shared.get(key)
+        if last is not None and planned_at <= last:
+            return "duplicate"
+        shared.set(key, planned_at, PLANNED_TTL)
+
+    if superseded_at is not None and now >= superseded_at:
+        return "superseded"
+    if check_type == BACKOFF and is_overloaded():
+        return "overload_backoff"
+    return None
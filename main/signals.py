@@ -1,7 +1,12 @@
+from django.conf import settings
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django_q.tasks import async_task
+from .adaptive import confirmation_schedule_name
+from .cache import service_cache
+from .incidents import forget_open_flag
 from .models import WebService
+from .routers import pin_primary
 from django_q.models import Schedule
 
 
@@ -10,6 +15,8 @@ def webservice_saved(sender, instance, created, **kwargs):
     """
     Automatically update monitoring when WebService is saved
     """
+    service_cache.invalidate(str(instance.id))
+    pin_primary(instance.user_id)
     async_task("main.tasks.schedule_webservice_monitoring", instance.id)
     if created:
         print(f"BytePing: New service '{instance.webservice_name}' added to monitoring")
@@ -23,8 +30,25 @@ def webservice_deleted(sender, instance, **kwargs):
     Remove monitoring schedule when WebService is deleted
     """
 
-    task_name = f"byteping_monitor_{instance.id}"
-    Schedule.objects.filter(name=task_name).delete()
+    service_cache.invalidate(str(instance.id))
+    pin_primary(instance.user_id)
+    Schedule.objects.filter(name=confirmation_schedule_name(instance.id)).delete()
+    forget_open_flag(instance.id)
     print(
         f"BytePing: Removed monitoring for deleted service '{instance.webservice_name}'"
     )
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def webservice_owner_saved(sender, instance, created, update_fields, **kwargs):
+    """
+    Alert emails use the owner's address from the cached config, so drop it
+    Saves that cannot change the address, such as last_login updates at each
+    login, are skipped.
+    """
+    if created or (update_fields is not None and "email" not in update_fields):
+        return
+    for webservice_id in WebService.objects.filter(user=instance).values_list(
+        "id", flat=True
+    ):
+        service_cache.invalidate(str(webservice_id))
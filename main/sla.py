@@ -0,0 +1,287 @@
+"""
+Vectorized SLA reports
+
+Reports are computed for many services at once from columnar NumPy arrays, one
+slot per service, instead of looping over each service's Webstatus rows:
+
+- check counts come from one GROUP BY over Webstatus,
+- downtime, MTTR and MTBF from the Incident rollup, clipped to the period,
+- latency percentiles from the hourly LatencySketch rollups, merged per
+  service with one sort and a cumulative sum.
+
+A month for 1,000 services reads about a thousand aggregate rows, the
+incidents and the sketches, whatever the number of checks behind them.
+"""
+
+from datetime import datetime
+
+import numpy as np
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import Incident, LatencySketch, WebService, Webstatus
+from .sketches import DEFAULT_ACCURACY, DEFAULT_QUANTILES
+
+# Sketch bin standing for zero-millisecond pings, below any real bin
+ZERO_BIN = -(2**31)
+
+
+def parse_month(value=None):
+    """
+    [start, end) of a "YYYY-MM" month, or of the last full month by default
+    """
+    if value:
+        try:
+            first = datetime.strptime(value, "%Y-%m").date()
+        except ValueError:
+            raise ValueError(f"Invalid month: {value}, expected YYYY-MM")
+    else:
+        this_month = timezone.localdate().replace(day=1)
+        first = (this_month - timezone.timedelta(days=1)).replace(day=1)
+    following = (first + timezone.timedelta(days=32)).replace(day=1)
+    return (
+        timezone.make_aware(datetime.combine(first, datetime.min.time())),
+        timezone.make_aware(datetime.combine(following, datetime.min.time())),
+    )
+
+
+def epoch(moment):
+    return moment.timestamp()
+
+
+def check_counts(ids, start, end):
+    """
+    Checks and successful checks per service, aligned with the sorted `ids`
+    """
+    rows = (
+        Webstatus.objects.filter(
+            webservice_id__in=ids.tolist(),
+            date_and_time__gte=start,
+            date_and_time__lt=end,
+        )
+        .values("webservice_id")
+        .annotate(checks=Count("id"), up=Count("id", filter=Q(status=True)))
+        .order_by()
+        .values_list("webservice_id", "checks", "up")
+    )
+    data = np.array(list(rows), dtype=np.int64).reshape(-1, 3)
+    checks = np.zeros(len(ids), dtype=np.int64)
+    up = np.zeros(len(ids), dtype=np.int64)
+    slots = np.searchsorted(ids, data[:, 0])
+    checks[slots] = data[:, 1]
+    up[slots] = data[:, 2]
+    return checks, up
+
+
+def incident_stats(ids, start, end):
+    """
+    Downtime seconds and incident count per service inside [start, end)
+    Open incidents count as down until `end`.
+    """
+    rows = list(
+        Incident.objects.filter(webservice_id__in=ids.tolist(), started_at__lt=end)
+        .filter(Q(ended_at__gt=start) | Q(ended_at__isnull=True))
+        .values_list("webservice_id", "started_at", "ended_at")
+    )
+    service = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    started = np.fromiter(
+        (epoch(row[1]) for row in rows), dtype=np.float64, count=len(rows)
+    )
+    ended = np.fromiter(
+        (epoch(row[2]) if row[2] else np.nan for row in rows),
+        dtype=np.float64,
+        count=len(rows),
+    )
+    ended = np.where(np.isnan(ended), epoch(end), ended)
+    durations = np.clip(ended, None, epoch(end)) - np.clip(started, epoch(start), None)
+
+    slots = np.searchsorted(ids, service)
+    downtime = np.bincount(slots, weights=durations, minlength=len(ids))
+    incidents = np.bincount(slots, minlength=len(ids))
+    return downtime, incidents
+
+
+def latency_quantiles(ids, start, end, quantiles=DEFAULT_QUANTILES):
+    """
+    Ping quantiles per service (rows) and quantile (columns), NaN without pings
+
+    Every service's hourly sketches are merged at once: bins are sorted by
+    (service, bin), a running count is kept over all of them, and each
+    service's quantile is the first bin whose running count passes the
+    service's offset plus rank, found with one searchsorted per quantile.
+    """
+    owners, keys, counts = [], [], []
+    sketches = LatencySketch.objects.filter(
+        webservice_id__in=ids.tolist(), bucket_start__gte=start, bucket_start__lt=end
+    ).values_list("webservice_id", "sketch")
+    for webservice_id, sketch in sketches.iterator(chunk_size=2000):
+        bins = sketch.get("bins", {})
+        owners.extend([webservice_id] * len(bins))
+        keys.extend(int(key) for key in bins)
+        counts.extend(bins.values())
+        if sketch.get("zero"):
+            owners.append(webservice_id)
+            keys.append(ZERO_BIN)
+            counts.append(sketch["zero"])
+
+    result = np.full((len(ids), len(quantiles)), np.nan)
+    if not counts:
+        return result
+    slots = np.searchsorted(ids, np.array(owners, dtype=np.int64))
+    keys = np.array(keys, dtype=np.int64)
+    counts = np.array(counts, dtype=np.int64)
+
+    # One combined key per (service, bin); unique sorts and sums duplicates
+    combined = slots * (2**33) + (keys - ZERO_BIN)
+    unique, inverse = np.unique(combined, return_inverse=True)
+    merged = np.bincount(inverse, weights=counts)
+    unique_slots = unique // (2**33)
+    unique_keys = unique % (2**33) + ZERO_BIN
+
+    running = np.cumsum(merged)
+    totals = np.bincount(unique_slots, weights=merged, minlength=len(ids))
+    offsets = np.concatenate(([0], np.cumsum(totals)[:-1]))
+    gamma = (1 + DEFAULT_ACCURACY) / (1 - DEFAULT_ACCURACY)
+    values = np.where(
+        unique_keys == ZERO_BIN,
+        0.0,
+        2 * gamma ** unique_keys.astype(np.float64) / (gamma + 1),
+    )
+
+    has_pings = totals > 0
+    for column, q in enumerate(quantiles):
+        targets = offsets + q * (totals - 1)
+        index = np.searchsorted(running, targets[has_pings], side="right")
+        result[has_pings, column] = values[np.minimum(index, len(values) - 1)]
+    return result
+
+
+def sla_table(services, start, end, quantiles=DEFAULT_QUANTILES):
+    """
+    Per-service SLA columns for `services` (dicts from report_services), each a
+    NumPy array in service id order
+    """
+    services = sorted(services, key=lambda service: service["id"])
+    ids = np.array([service["id"] for service in services], dtype=np.int64)
+    end = min(end, timezone.now())
+
+    # Services created during the period are measured from their creation
+    monitored_from = np.array(
+        [max(epoch(start), epoch(service["created_at"])) for service in services]
+    )
+    monitored = np.clip(epoch(end) - monitored_from, 0, None)
+    targets = np.array([service["sla_target"] for service in services], dtype=float)
+
+    checks, up = check_counts(ids, start, end)
+    downtime, incidents = incident_stats(ids, start, end)
+    percentiles = latency_quantiles(ids, start, end, quantiles)
+
+    # Without checks in the period there is nothing to measure availability by
+    has_data = (monitored > 0) & (checks > 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        availability = np.where(has_data, 100 * (1 - downtime / monitored), np.nan)
+        check_uptime = np.where(checks > 0, 100 * up / checks, np.nan)
+        mttr = np.where(incidents > 0, downtime / incidents, np.nan)
+        mtbf = np.where(incidents > 0, (monitored - downtime) / incidents, np.nan)
+    allowed = monitored * (100 - targets) / 100
+
+    return {
+        "ids": ids,
+        "services": services,
+        "checks": checks,
+        "check_uptime": check_uptime,
+        "availability": availability,
+        "downtime": downtime,
+        "incidents": incidents,
+        "mttr": mttr,
+        "mtbf": mtbf,
+        "sla_target": targets,
+        "has_data": has_data,
+        "sla_met": has_data & (availability >= targets),
+        "error_budget_left": allowed - downtime,
+        "percentiles": percentiles,
+        "quantiles": quantiles,
+    }
+
+
+def number(value, digits=3):
+    """
+    JSON-friendly float: rounded, None for NaN
+    """
+    return None if np.isnan(value) else round(float(value), digits)
+
+
+def render_report(table, rows, start, end):
+    """
+    One report dict for the services at positions `rows` of `table`
+    """
+    services = []
+    for row in rows:
+        service = table["services"][row]
+        services.append(
+            {
+                "id": service["id"],
+                "name": service["webservice_name"],
+                "sla_target": float(table["sla_target"][row]),
+                # None when the service had no checks in the period
+                "sla_met": (
+                    bool(table["sla_met"][row]) if table["has_data"][row] else None
+                ),
+                "availability": number(table["availability"][row], 4),
+                "check_uptime": number(table["check_uptime"][row], 4),
+                "checks": int(table["checks"][row]),
+                "incidents": int(table["incidents"][row]),
+                "downtime_seconds": number(table["downtime"][row]),
+                "error_budget_left_seconds": number(table["error_budget_left"][row]),
+                "mttr_seconds": number(table["mttr"][row]),
+                "mtbf_seconds": number(table["mtbf"][row]),
+                "latency": {
+                    f"p{round(q * 100)}": number(table["percentiles"][row, column], 1)
+                    for column, q in enumerate(table["quantiles"])
+                },
+            }
+        )
+    measured = table["has_data"][rows]
+    met = int(table["sla_met"][rows].sum())
+    availability = table["availability"][rows]
+    return {
+        "period": {"start": start, "end": end},
+        "summary": {
+            "services": len(services),
+            "sla_met": met,
+            "sla_missed": int(measured.sum()) - met,
+            "no_data": int(len(services) - measured.sum()),
+            # Mean over the services with data; None if none had any
+            "availability": (
+                number(np.nanmean(availability), 4) if measured.any() else None
+            ),
+            "downtime_seconds": number(table["downtime"][rows].sum()),
+            "incidents": int(table["incidents"][rows].sum()),
+        },
+        "services": services,
+    }
+
+
+def report_services(queryset):
+    return list(
+        queryset.values("id", "user_id", "webservice_name", "created_at", "sla_target")
+    )
+
+
+def user_reports(start, end, user_ids=None):
+    """
+    {user_id: report} for every user with services, computed in one pass
+    """
+    # Services created after the period have nothing to report
+    queryset = WebService.objects.filter(created_at__lt=end)
+    if user_ids is not None:
+        queryset = queryset.filter(user_id__in=user_ids)
+    table = sla_table(report_services(queryset), start, end)
+
+    rows_by_user = {}
+    for row, service in enumerate(table["services"]):
+        rows_by_user.setdefault(service["user_id"], []).append(row)
+    return {
+        user_id: render_report(table, rows, start, end)
+        for user_id, rows in rows_by_user.items()
+    }
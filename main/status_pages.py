@@ -0,0 +1,245 @@
+"""
+Public status pages served from precomputed snapshots
+
+A page's payload (current status, daily uptime bars and recent incidents) is
+built into StatusPage.snapshot when one of its services opens or closes an
+incident, and every BYTEPING_STATUS_PAGE_REFRESH_MINUTES so today's bar moves.
+A rebuild only re-aggregates yesterday and today; older days are final and
+copied from the previous snapshot. Visitors are served the stored JSON body
+from the tiered cache, so a popular page costs no queries however many people
+are watching it.
+"""
+
+import hashlib
+import json
+from datetime import datetime, time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django_q.tasks import async_task
+
+from .cache import TieredCache
+from .models import Incident, StatusPage, Webstatus
+
+snapshot_cache = TieredCache(
+    "byteping:status_page",
+    local_ttl=settings.BYTEPING_STATUS_PAGE_LOCAL_TTL,
+    shared_ttl=86400,
+)
+
+
+def pending_key(page_id):
+    return f"byteping:status_page:pending:{page_id}"
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def daily_counts(service_ids, since):
+    """
+    {(webservice_id, ISO date): (up, checks)} for checks at or after `since`
+    """
+    rows = (
+        Webstatus.objects.filter(
+            webservice_id__in=service_ids, date_and_time__gte=since
+        )
+        .values("webservice_id", day=TruncDate("date_and_time"))
+        .annotate(checks=Count("id"), up=Count("id", filter=Q(status=True)))
+        .order_by()
+    )
+    return {
+        (row["webservice_id"], row["day"].isoformat()): (row["up"], row["checks"])
+        for row in rows
+    }
+
+
+def uptime(up, checks):
+    return round(100 * up / checks, 3) if checks else None
+
+
+def build_payload(page, services, now):
+    """
+    Snapshot payload for `page`, reusing final days from its previous snapshot
+    """
+    today = timezone.localdate(now)
+    days = [
+        today - timezone.timedelta(days=offset)
+        for offset in range(settings.BYTEPING_STATUS_PAGE_DAYS - 1, -1, -1)
+    ]
+    yesterday = today - timezone.timedelta(days=1)
+    ids = [service["id"] for service in services]
+
+    previous = {}
+    if page.snapshot and page.built_at:
+        previous = {
+            service["id"]: {
+                day["date"]: (day["up"], day["checks"]) for day in service["days"]
+            }
+            for service in page.snapshot["services"]
+        }
+    # Days before yesterday were complete when the previous snapshot was built
+    incremental = (
+        page.built_at is not None
+        and timezone.localdate(page.built_at) >= yesterday
+        and all(service_id in previous for service_id in ids)
+    )
+    counts = daily_counts(ids, day_start(yesterday if incremental else days[0]))
+
+    down = set(
+        Incident.objects.filter(
+            webservice_id__in=ids, ended_at__isnull=True
+        ).values_list("webservice_id", flat=True)
+    )
+
+    payload_services = []
+    for service in services:
+        bars = []
+        total_up = total_checks = 0
+        for day in days:
+            key = day.isoformat()
+            if incremental and day < yesterday:
+                up, checks = previous[service["id"]].get(key, (0, 0))
+            else:
+                up, checks = counts.get((service["id"], key), (0, 0))
+            total_up += up
+            total_checks += checks
+            bars.append(
+                {"date": key, "up": up, "checks": checks, "uptime": uptime(up, checks)}
+            )
+        if not service["is_active"]:
+            state = "paused"
+        elif service["id"] in down:
+            state = "down"
+        else:
+            state = "up"
+        payload_services.append(
+            {
+                "id": service["id"],
+                "name": service["webservice_name"],
+                "status": state,
+                "uptime": uptime(total_up, total_checks),
+                "days": bars,
+            }
+        )
+
+    active = [service for service in payload_services if service["status"] != "paused"]
+    down_count = sum(1 for service in active if service["status"] == "down")
+    if not down_count:
+        overall = "operational"
+    elif down_count < len(active):
+        overall = "partial_outage"
+    else:
+        overall = "major_outage"
+
+    incidents = (
+        Incident.objects.filter(
+            webservice_id__in=ids, started_at__gte=day_start(days[0])
+        )
+        .order_by("-started_at")
+        .values("webservice__webservice_name", "started_at", "ended_at", "duration")[
+            : settings.BYTEPING_STATUS_PAGE_INCIDENTS
+        ]
+    )
+    return {
+        "title": page.title,
+        "slug": page.slug,
+        "status": overall,
+        "generated_at": now,
+        "services": payload_services,
+        "incidents": [
+            {
+                "service": incident["webservice__webservice_name"],
+                "started_at": incident["started_at"],
+                "ended_at": incident["ended_at"],
+                "duration": (
+                    incident["duration"].total_seconds()
+                    if incident["duration"] is not None
+                    else None
+                ),
+            }
+            for incident in incidents
+        ],
+    }
+
+
+def rebuild_snapshot(page_id):
+    """
+    Rebuild and store one page's snapshot
+    """
+    caches[settings.BYTEPING_SHARED_CACHE].delete(pending_key(page_id))
+    page = StatusPage.objects.filter(id=page_id).first()
+    if page is None:
+        return f"StatusPage {page_id} not found"
+
+    now = timezone.now()
+    services = list(
+        page.webservices.order_by("id").values("id", "webservice_name", "is_active")
+    )
+    payload = build_payload(page, services, now)
+    body = json.dumps(payload, cls=DjangoJSONEncoder)
+    # Left out of the ETag so an unchanged page revalidates across rebuilds
+    content = {key: value for key, value in payload.items() if key != "generated_at"}
+    digest = hashlib.sha1(json.dumps(content, cls=DjangoJSONEncoder).encode())
+    etag = f'"sp-{digest.hexdigest()[:20]}"'
+    StatusPage.objects.filter(id=page_id).update(
+        snapshot=json.loads(body), etag=etag, built_at=now
+    )
+    snapshot_cache.invalidate(page.slug)
+    return f"Rebuilt status page {page.slug}"
+
+
+def refresh_for_service(webservice_id):
+    """
+    Queue a rebuild of every page showing the service
+    Rebuilds already queued are not queued again, so an outage across many
+    services on one page rebuilds it once.
+    """
+    shared = caches[settings.BYTEPING_SHARED_CACHE]
+    page_ids = StatusPage.objects.filter(webservices=webservice_id).values_list(
+        "id", flat=True
+    )
+    for page_id in page_ids:
+        if shared.add(pending_key(page_id), True, 300):
+            async_task("main.status_pages.rebuild_snapshot", page_id)
+
+
+def refresh_stale_pages():
+    """
+    Rebuild pages whose snapshot is older than BYTEPING_STATUS_PAGE_REFRESH_MINUTES
+    Scheduled by initialize_all_monitoring.
+    """
+    stale_before = timezone.now() - timezone.timedelta(
+        minutes=settings.BYTEPING_STATUS_PAGE_REFRESH_MINUTES
+    )
+    page_ids = list(
+        StatusPage.objects.filter(
+            Q(built_at__isnull=True) | Q(built_at__lt=stale_before)
+        ).values_list("id", flat=True)
+    )
+    for page_id in page_ids:
+        rebuild_snapshot(page_id)
+    return f"Refreshed {len(page_ids)} status pages"
+
+
+def load_snapshot(slug):
+    page = (
+        StatusPage.objects.filter(slug=slug, built_at__isnull=False)
+        .values("snapshot", "etag", "built_at")
+        .first()
+    )
+    if page is None:
+        return None
+    body = json.dumps(page["snapshot"], cls=DjangoJSONEncoder)
+    return body, page["etag"], page["built_at"]
+
+
+def get_snapshot(slug):
+    """
+    (JSON body, ETag, built_at) of a page, or None if it does not exist yet
+    """
+    return snapshot_cache.get(slug, lambda: load_snapshot(slug))
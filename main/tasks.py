@@ -4,59 +4,178 @@ from django.core.mail import send_mail
 from django.conf import settings
 from django.utils import timezone
 from django_q.tasks import schedule
+from .adaptive import SCHEDULED, follow_up, should_alert
+from .anomalies import observe_latency
+from .cache import get_service_config
+from .dispatch import release_slot
+from .heartbeats import HEARTBEAT, HTTP, deadline_after
 from .models import WebService, Webstatus
 from django_q.models import Schedule
-
-
-def monitor_webservice(webservice_id):
+from . import metrics
+from .instrumentation import trace_task
+from .probes import probe
+from .incidents import record_check
+from .shedding import is_overloaded, shed, shed_reason
+from .sketches import record_latency
+
+
+def monitor_webservice(
+    webservice_id,
+    check_type=SCHEDULED,
+    confirmations_left=None,
+    user_id=None,
+    planned_at=None,
+    superseded_at=None,
+):
     """
     Monitor a single web service and save the status
+    check_type and confirmations_left are set by main.adaptive schedules; the
+    dispatcher sets user_id, whose in-flight slot the check releases, and the
+    planned and superseded times main.shedding drops late checks by
     """
     try:
-        webservice = WebService.objects.get(id=webservice_id, is_active=True)
-    except WebService.DoesNotExist:
-        return f"WebService {webservice_id} not found or inactive"
-
-    start_time = time.time()
-
-    try:
-        response = requests.get(
-            webservice.webservice_url, timeout=30, allow_redirects=True
-        )
-
-        ping_time = int((time.time() - start_time) * 1000)
-        status_ok = response.status_code == webservice.expect_status_code
+        reason = shed_reason(webservice_id, check_type, planned_at, superseded_at)
+        if reason:
+            shed(reason)
+            return f"WebService {webservice_id} check shed: {reason}"
+        return check_webservice(webservice_id, check_type, confirmations_left)
+    finally:
+        if user_id is not None:
+            release_slot(user_id)
 
-        webstatus = Webstatus.objects.create(
-            webservice=webservice,
-            ping=ping_time,
-            status=status_ok,
-            status_code=response.status_code,
-            date_and_time=timezone.now(),
-        )
 
-        if not status_ok and webservice.email_alert:
-            send_alert_email(webservice, webstatus)
-
-        return (
-            f"BytePing: {webservice.webservice_name} - {'UP' if status_ok else 'DOWN'}"
-        )
-
-    except requests.exceptions.RequestException as e:
-        ping_time = int((time.time() - start_time) * 1000)
+def check_webservice(webservice_id, check_type, confirmations_left):
+    """
+    Probe a web service once and record the result
+    """
+    with trace_task(
+        "main.tasks.monitor_webservice",
+        webservice_id=webservice_id,
+        check_type=check_type,
+    ) as trace:
+        with trace.phase("lookup"):
+            webservice = get_service_config(webservice_id)
+        if webservice is None:
+            return f"WebService {webservice_id} not found or inactive"
+
+        start_time = time.time()
+
+        try:
+            with trace.phase("http"):
+                response = probe(webservice, trace)
+
+            ping_time = int((time.time() - start_time) * 1000)
+            status_ok = response.status_code == webservice.expect_status_code
+            metrics.check_duration.observe(
+                time.time() - start_time, result="up" if status_ok else "down"
+            )
 
-        webstatus = Webstatus.objects.create(
-            webservice=webservice,
-            ping=ping_time,
-            status=False,
-            status_code=0,
-            date_and_time=timezone.now(),
+            with trace.phase("insert"):
+                webstatus = Webstatus.objects.create(
+                    webservice_id=webservice.id,
+                    ping=ping_time,
+                    status=status_ok,
+                    status_code=response.status_code,
+                    date_and_time=timezone.now(),
+                    check_type=check_type,
+                )
+                incident = record_check(
+                    webservice.id,
+                    webstatus.date_and_time,
+                    status_ok,
+                    response.status_code,
+                )
+            metrics.webstatus_inserts.inc()
+            trace.annotate(result="up" if status_ok else "down", incident=incident)
+
+            # Connection errors have no meaningful latency, so only responses count.
+            # Sketches are low priority and skipped under sustained overload.
+            if is_overloaded():
+                shed("overload_sketch")
+            else:
+                with trace.phase("sketch"):
+                    try:
+                        record_latency(
+                            webservice.id, webstatus.date_and_time, ping_time
+                        )
+                    except Exception as e:
+                        print(f"BytePing: Could not record latency - {e}")
+
+            anomaly = None
+            if status_ok:
+                with trace.phase("baseline"):
+                    anomaly, baseline = observe_latency(webservice.id, ping_time)
+                trace.annotate(anomaly=anomaly)
+
+            with trace.phase("adapt"):
+                follow_up(
+                    webservice, check_type, confirmations_left, status_ok, incident
+                )
+
+            if (
+                not status_ok
+                and webservice.email_alert
+                and should_alert(check_type, incident, confirmations_left)
+            ):
+                with trace.phase("alert"):
+                    send_alert_email(webservice, webstatus)
+            elif anomaly == "started" and webservice.email_alert:
+                with trace.phase("alert"):
+                    send_latency_alert_email(webservice, webstatus, baseline)
+
+            metrics.flush()
+            return f"BytePing: {webservice.webservice_name} - {'UP' if status_ok else 'DOWN'}"
+
+        except requests.exceptions.RequestException as e:
+            ping_time = int((time.time() - start_time) * 1000)
+            metrics.check_duration.observe(time.time() - start_time, result="error")
+
+            with trace.phase("insert"):
+                webstatus = Webstatus.objects.create(
+                    webservice_id=webservice.id,
+                    ping=ping_time,
+                    status=False,
+                    status_code=0,
+                    date_and_time=timezone.now(),
+                    check_type=check_type,
+                )
+                incident = record_check(
+                    webservice.id, webstatus.date_and_time, False, 0
+                )
+            metrics.webstatus_inserts.inc()
+            trace.annotate(result="error", incident=incident)
+
+            with trace.phase("adapt"):
+                follow_up(webservice, check_type, confirmations_left, False, incident)
+
+            if webservice.email_alert and should_alert(
+                check_type, incident, confirmations_left
+            ):
+                with trace.phase("alert"):
+                    send_alert_email(webservice, webstatus, error=str(e))
+
+            metrics.flush()
+            return f"BytePing: {webservice.webservice_name} - ERROR: {str(e)}"
+
+
+def deliver(subject, body, recipient):
+    """
+    Send one alert email, recording its SMTP time and failures
+    """
+    started = time.time()
+    try:
+        send_mail(
+            subject,
+            body,
+            f"byteping {settings.DEFAULT_FROM_EMAIL}",
+            [recipient],
+            fail_silently=False,
         )
-
-        if webservice.email_alert:
-            send_alert_email(webservice, webstatus, error=str(e))
-
-        return f"BytePing: {webservice.webservice_name} - ERROR: {str(e)}"
+        metrics.smtp_send_duration.observe(time.time() - started, result="sent")
+    except Exception as e:
+        metrics.smtp_send_duration.observe(time.time() - started, result="failed")
+        metrics.smtp_failures.inc()
+        print(f"BytePing: Failed to send email alert - {e}")
 
 
 def send_alert_email(webservice, webstatus, error=None):
@@ -99,66 +218,191 @@ Your service returned an unexpected status code. Please investigate.
 BytePing Monitoring Service
         """
 
-    try:
-        send_mail(
-            subject,
-            message,
-            f"byteping {settings.DEFAULT_FROM_EMAIL}",
-            [webservice.user.email],
-            fail_silently=False,
-        )
-    except Exception as e:
-        print(f"BytePing: Failed to send email alert - {e}")
+    deliver(subject, message, webservice.user_email)
+
+
+def send_latency_alert_email(webservice, webstatus, baseline):
+    """
+    Send BytePing email alert when a service stays much slower than usual
+    """
+    subject = f"🐢 BytePing Alert: {webservice.webservice_name} is SLOW"
+    message = f"""
+BytePing Monitoring Alert
+
+Service: {webservice.webservice_name}
+URL: {webservice.webservice_url}
+Status: UP, but SLOW
+Response Time: {webstatus.ping}ms
+Usual Response Time: {baseline:.0f}ms
+Time: {webstatus.date_and_time}
+
+Your service has been responding far slower than its usual latency for
+{settings.BYTEPING_ANOMALY_SUSTAIN} checks in a row. Please investigate.
+
+---
+BytePing Monitoring Service
+        """
+
+    deliver(subject, message, webservice.user_email)
 
 
 def schedule_webservice_monitoring(webservice_id):
     """
     Schedule monitoring for a specific web service
     """
-    try:
-        webservice = WebService.objects.get(id=webservice_id)
-        task_name = f"byteping_monitor_{webservice.id}"
-        Schedule.objects.filter(name=task_name).delete()
-
-        if webservice.is_active:
-            schedule(
-                "main.tasks.monitor_webservice",
-                webservice_id,
-                name=task_name,
-                schedule_type="I",
-                minutes=webservice.monitor_interval,
-                repeats=-1,
-            )
-            print(f"BytePing: Scheduled monitoring for {webservice.webservice_name}")
-            return f"Scheduled: {webservice.webservice_name}"
-        else:
-            print(
-                f"BytePing: Removed schedule for inactive service {webservice.webservice_name}"
-            )
-            return f"Removed: {webservice.webservice_name}"
+    with trace_task(
+        "main.tasks.schedule_webservice_monitoring", webservice_id=webservice_id
+    ) as trace:
+        try:
+            with trace.phase("lookup"):
+                webservice = WebService.objects.get(id=webservice_id)
+
+            # Saving resets any backoff and has the dispatcher check it right away,
+            # unless a probe agent checks it or it is a heartbeat monitor, which
+            # gets a full interval to ping
+            with trace.phase("schedule"):
+                now = timezone.now()
+                local = (
+                    webservice.is_active
+                    and webservice.probe_agent_id is None
+                    and webservice.monitor_type == HTTP
+                )
+                heartbeat = (
+                    webservice.is_active and webservice.monitor_type == HEARTBEAT
+                )
+                WebService.objects.filter(id=webservice_id).update(
+                    next_check_at=now if local else None,
+                    backoff_interval=None,
+                    heartbeat_deadline=(
+                        deadline_after(now, webservice.monitor_interval)
+                        if heartbeat
+                        else None
+                    ),
+                )
+
+            if webservice.is_active:
+                print(
+                    f"BytePing: Scheduled monitoring for {webservice.webservice_name}"
+                )
+                return f"Scheduled: {webservice.webservice_name}"
+            else:
+                print(
+                    f"BytePing: Removed schedule for inactive service {webservice.webservice_name}"
+                )
+                return f"Removed: {webservice.webservice_name}"
+
+        except WebService.DoesNotExist:
+            return f"WebService {webservice_id} not found"
+
+
+def reconcile_monitoring(webservice_ids):
+    """
+    Schedule monitoring for many web services in one pass
+    Active services are due right away and heartbeat monitors get a full
+    interval; inactive ones and those assigned to a probe agent drop out of dispatch
+    """
+    now = timezone.now()
+    services = WebService.objects.filter(id__in=webservice_ids)
+    local = {"is_active": True, "probe_agent__isnull": True, "monitor_type": HTTP}
+    scheduled = services.filter(**local).update(
+        next_check_at=now, backoff_interval=None, heartbeat_deadline=None
+    )
+    heartbeats = services.filter(is_active=True, monitor_type=HEARTBEAT)
+    for interval in set(heartbeats.values_list("monitor_interval", flat=True)):
+        heartbeats.filter(monitor_interval=interval).update(
+            next_check_at=None,
+            backoff_interval=None,
+            heartbeat_deadline=deadline_after(now, interval),
+        )
+    # Inactive services and those a probe agent checks
+    inactive = (
+        services.exclude(**local)
+        .exclude(is_active=True, monitor_type=HEARTBEAT)
+        .update(next_check_at=None, backoff_interval=None, heartbeat_deadline=None)
+    )
 
-    except WebService.DoesNotExist:
-        return f"WebService {webservice_id} not found"
+    print(f"BytePing: Reconciled monitoring for {scheduled} active services")
+    return f"Reconciled: {scheduled} scheduled, {inactive} inactive"
 
 
-def initialize_all_monitoring():
+def maintain_webstatus_partitions():
     """
-    Initialize monitoring for all active web services
-    Called when server starts
+    Pre-create upcoming Webstatus partitions and drop expired ones
+    Scheduled daily when BYTEPING_WEBSTATUS_PARTITIONING is on
     """
-    try:
-        active_services = WebService.objects.filter(is_active=True)
+    from . import partitions
 
-        print(
-            f"BytePing: Initializing monitoring for {active_services.count()} active services..."
+    created = partitions.precreate(settings.BYTEPING_WEBSTATUS_PARTITIONS_AHEAD)
+    dropped = []
+    if settings.BYTEPING_WEBSTATUS_RETENTION_DAYS:
+        cutoff = timezone.now().date() - timezone.timedelta(
+            days=settings.BYTEPING_WEBSTATUS_RETENTION_DAYS
         )
+        dropped = partitions.drop_older_than(cutoff)
+    print(f"BytePing: Partitions - created {created}, dropped {len(dropped)}")
+    return f"Created {created} partitions, dropped {dropped}"
 
-        for service in active_services:
-            schedule_webservice_monitoring(service.id)
 
-        print("BytePing: All monitoring tasks initialized successfully!")
-        return f"Initialized monitoring for {active_services.count()} services"
+def ensure_schedule(name, func, schedule_type, **kwargs):
+    """
+    Create a named housekeeping schedule unless it already exists
+    """
+    if not Schedule.objects.filter(name=name).exists():
+        schedule(func, name=name, schedule_type=schedule_type, repeats=-1, **kwargs)
 
-    except Exception as e:
-        print(f"BytePing: Error initializing monitoring - {e}")
-        return f"Error: {e}"
+
+def initialize_all_monitoring():
+    """
+    Initialize monitoring for all active web services
+    Called when server starts
+    """
+    with trace_task("main.tasks.initialize_all_monitoring") as trace:
+        try:
+            with trace.phase("lookup"):
+                active_ids = list(
+                    WebService.objects.filter(is_active=True).values_list(
+                        "id", flat=True
+                    )
+                )
+            trace.annotate(services=len(active_ids))
+
+            print(
+                f"BytePing: Initializing monitoring for {len(active_ids)} active services..."
+            )
+
+            with trace.phase("reconcile"):
+                reconcile_monitoring(active_ids)
+                # Per-service schedules from before the dispatcher
+                Schedule.objects.filter(name__startswith="byteping_monitor_").delete()
+                ensure_schedule(
+                    "byteping_dispatch",
+                    "main.dispatch.dispatch_checks",
+                    Schedule.MINUTES,
+                    minutes=1,
+                )
+                ensure_schedule(
+                    "byteping_heartbeats",
+                    "main.heartbeats.sweep_heartbeats",
+                    Schedule.MINUTES,
+                    minutes=1,
+                )
+                ensure_schedule(
+                    "byteping_status_pages",
+                    "main.status_pages.refresh_stale_pages",
+                    Schedule.MINUTES,
+                    minutes=settings.BYTEPING_STATUS_PAGE_REFRESH_MINUTES,
+                )
+
+            if settings.BYTEPING_WEBSTATUS_PARTITIONING:
+                ensure_schedule(
+                    "byteping_webstatus_partitions",
+                    "main.tasks.maintain_webstatus_partitions",
+                    Schedule.DAILY,
+                )
+
+            print("BytePing: All monitoring tasks initialized successfully!")
+            return f"Initialized monitoring for {len(active_ids)} services"
+
+        except Exception as e:
+            print(f"BytePing: Error initializing monitoring - {e}")
+            return f"Error: {e}"
@@ -1,3 +1,1432 @@
-from django.test import TestCase
+import ast
+import gzip
+import json
+import os
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.http import StreamingHttpResponse
+from django.test import TestCase, TransactionTestCase, override_settings
+from django_q.models import Schedule
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from authentication.authentication import user_cache
+from authentication.models import User
+from probe_agent.agent import Agent
+from . import metrics
+from .agents import create_agent
+from .anomalies import load_state, observe_latency
+from .benchmark import TargetFarm, outcome_counts, percentiles, run_benchmark
+from .cache import get_service_config, service_cache
+from .dispatch import dispatch_checks, fair_share, in_flight, release_slot
+from .export import EXPORT_FIELDS, iter_webstatus
+from .heartbeats import sweep_heartbeats, token_cache
+from .incidents import open_flag_key, record_check
+from .models import (
+    Incident,
+    LatencyBaseline,
+    ProbeAgent,
+    StatusPage,
+    WebService,
+    Webstatus,
+)
+from .shedding import is_overloaded
+from .sketches import DEFAULT_QUANTILES, DDSketch, merged_sketch, record_latency
+from .sla import parse_month, report_services, sla_table
+from .status_pages import rebuild_snapshot, refresh_for_service, snapshot_cache
+from .serializers import WebstatusSerializer, webstatus_rows
+from .probes import breaker_failures, load_timeouts, probe_timeouts, timeout_cache
+from .routers import (
+    ReplicaRouter,
+    choose_read_alias,
+    lag_cache,
+    measure_replica_lag,
+    pin_primary,
+    replica_reads,
+)
+from .tasks import (
+    monitor_webservice,
+    reconcile_monitoring,
+    schedule_webservice_monitoring,
+)
+
+
+class QueryCountTestCase(TestCase):
+    """
+    Base for endpoint tests that pin the number of queries a request may run
+    """
+
+    def setUp(self):
+        cache.clear()
+        service_cache.clear_local()
+        timeout_cache.clear_local()
+        self.user = User.objects.create_user(
+            username="owner@byteping.invalid",
+            email="owner@byteping.invalid",
+            password="byteping-test",
+        )
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}"
+        )
+
+    def create_services(self, count, checks=0):
+        """
+        Create `count` services for the user, each with `checks` Webstatus rows
+        Returns only the services created by this call, in id order.
+        """
+        last_id = (
+            WebService.objects.filter(user=self.user)
+            .order_by("-id")
+            .values_list("id", flat=True)
+            .first()
+            or 0
+        )
+        WebService.objects.bulk_create(
+            [
+                WebService(
+                    user=self.user,
+                    webservice_name=f"service {index}",
+                    webservice_url=f"https://service-{index}.example.com/",
+                )
+                for index in range(count)
+            ]
+        )
+        services = list(
+            WebService.objects.filter(user=self.user, id__gt=last_id).order_by("id")
+        )
+        now = timezone.now()
+        Webstatus.objects.bulk_create(
+            [
+                Webstatus(
+                    webservice=service,
+                    ping=100 + index,
+                    status=index % 10 != 0,
+                    status_code=200 if index % 10 else 503,
+                    date_and_time=now - timezone.timedelta(minutes=10 * index),
+                )
+                for service in services
+                for index in range(checks)
+            ]
+        )
+        return services
+
+    def assertConstantQueries(self, num, method, path, **kwargs):
+        """
+        Assert a request runs exactly `num` queries and succeeds
+        Caches are cleared first, so counts include the authentication lookup.
+        """
+        cache.clear()
+        user_cache.clear_local()
+        with self.assertNumQueries(num):
+            response = getattr(self.client, method)(path, **kwargs)
+            if hasattr(response, "streaming_content"):
+                b"".join(response.streaming_content)
+        self.assertLess(response.status_code, 400, getattr(response, "data", None))
+        return response
+
+
+class MonitorTestCase(QueryCountTestCase):
+    """
+    Base for tests around one monitored service, self.service
+    """
+
+    def setUp(self):
+        super().setUp()
+        (self.service,) = self.create_services(1)
+
+
+class WebServiceQueryCountTests(QueryCountTestCase):
+    def test_get_all_is_constant_in_services(self):
+        self.create_services(1)
+        self.assertConstantQueries(3, "get", "/api/webservice/all/")
+        self.create_services(25)
+        self.assertConstantQueries(3, "get", "/api/webservice/all/")
+
+    def test_get_all_not_modified_skips_listing(self):
+        self.create_services(5)
+        etag = self.client.get("/api/webservice/all/")["ETag"]
+        response = self.assertConstantQueries(
+            2, "get", "/api/webservice/all/", HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 304)
+
+        # Deleting a service changes the ETag; there is no Last-Modified to
+        # wrongly confirm a stale copy
+        WebService.objects.filter(user=self.user).first().delete()
+        response = self.client.get("/api/webservice/all/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Last-Modified", response)
+
+    def test_get(self):
+        (service,) = self.create_services(1)
+        self.assertConstantQueries(2, "get", f"/api/webservice/{service.id}/")
+
+    def test_add(self):
+        self.assertConstantQueries(
+            3,
+            "post",
+            "/api/webservice/add/",
+            data={
+                "webservice_name": "new",
+                "webservice_url": "https://new.example.com/",
+            },
+            format="json",
+        )
+
+    def test_update(self):
+        (service,) = self.create_services(1)
+        self.assertConstantQueries(
+            4,
+            "patch",
+            f"/api/webservice/{service.id}/update/",
+            data={"monitor_interval": 15},
+            format="json",
+        )
+
+    def test_delete_is_constant_in_history(self):
+        first, second = self.create_services(2, checks=50)
+        self.assertConstantQueries(9, "delete", f"/api/webservice/{first.id}/delete/")
+
+    def test_bulk_add_is_constant_in_rows(self):
+        for rows in (2, 40):
+            payload = [
+                {
+                    "webservice_name": f"bulk {rows}-{index}",
+                    "webservice_url": f"https://bulk-{rows}-{index}.example.com/",
+                }
+                for index in range(rows)
+            ]
+            self.assertConstantQueries(
+                6, "post", "/api/webservice/bulk/", data=payload, format="json"
+            )
+
+    @mock.patch("main.views.async_task")
+    def test_bulk_add_reports_each_row(self, enqueue):
+        (existing,) = self.create_services(1)
+        payload = [
+            {"webservice_name": "new", "webservice_url": "https://new.example.com/"},
+            {"webservice_name": "old", "webservice_url": existing.webservice_url},
+            {"webservice_name": "again", "webservice_url": "https://new.example.com/"},
+            {"webservice_name": "no url"},
+        ]
+        response = self.client.post("/api/webservice/bulk/", payload, format="json")
+        self.assertEqual(response.status_code, 201)
+        created, old, again, invalid = response.json()["results"]
+        new = WebService.objects.get(webservice_url="https://new.example.com/")
+        self.assertEqual((created["action"], created["id"]), ("created", new.id))
+        self.assertIn("mode=upsert", old["error"])
+        self.assertEqual(again["error"], "Duplicate of row 0.")
+        self.assertFalse(invalid["success"])
+        self.assertEqual(
+            WebService.objects.get(id=existing.id).webservice_name, "service 0"
+        )
+        enqueue.assert_called_once_with("main.tasks.reconcile_monitoring", [new.id])
+
+        response = self.client.post(
+            "/api/webservice/bulk/?mode=upsert", payload[1:2], format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"][0]["id"], existing.id)
+        self.assertEqual(WebService.objects.get(id=existing.id).webservice_name, "old")
+
+    @mock.patch("main.views.async_task")
+    def test_bulk_add_ids_without_returning_inserts(self, enqueue):
+        payload = [
+            {
+                "webservice_name": f"mysql {index}",
+                "webservice_url": f"https://m{index}.io/",
+            }
+            for index in range(3)
+        ]
+        with mock.patch.object(
+            type(connection.features), "can_return_rows_from_bulk_insert", False
+        ):
+            response = self.client.post("/api/webservice/bulk/", payload, format="json")
+        ids = [result["id"] for result in response.json()["results"]]
+        self.assertEqual(
+            ids,
+            [
+                WebService.objects.get(webservice_url=f"https://m{index}.io/").id
+                for index in range(3)
+            ],
+        )
+
+
+class WebstatusQueryCountTests(QueryCountTestCase):
+    def test_history_is_constant_in_rows(self):
+        (service,) = self.create_services(1, checks=1)
+        path = f"/api/webservice/{service.id}/webstatus/"
+        self.assertConstantQueries(4, "get", path)
+        Webstatus.objects.bulk_create(
+            [
+                Webstatus(
+                    webservice=service,
+                    ping=1,
+                    status=True,
+                    status_code=200,
+                    date_and_time=timezone.now(),
+                )
+                for _ in range(200)
+            ]
+        )
+        self.assertConstantQueries(4, "get", path)
+
+    def test_fast_path_matches_serializer(self):
+        (service,) = self.create_services(1, checks=3)
+        history = Webstatus.objects.filter(webservice=service).order_by(
+            "-date_and_time"
+        )
+        self.assertEqual(
+            webstatus_rows(history),
+            [dict(row) for row in WebstatusSerializer(history, many=True).data],
+        )
+        rows_etag = self.client.get(f"/api/webservice/{service.id}/webstatus/")["ETag"]
+        response = self.client.get(
+            f"/api/webservice/{service.id}/webstatus/?layout=columnar",
+            HTTP_IF_NONE_MATCH=rows_etag,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["count"], 3)
+        self.assertEqual(len(response.json()["columns"]["status_code"]), 3)
+        response = self.client.get(
+            f"/api/webservice/{service.id}/webstatus/?layout=rows%22%0D%0AX-Evil:1"
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn("ETag", response)
+
+    def test_chart_is_constant_in_rows(self):
+        (service,) = self.create_services(1, checks=50)
+        path = f"/api/webservice/{service.id}/chart/?points=10"
+        response = self.assertConstantQueries(3, "get", path)
+        series = response.json()["series"]
+        self.assertLessEqual(len(series["timestamp"]), 10)
+        self.assertEqual(sum(series["checks"]), 50)
+
+    def test_chart_ignores_pings_of_checks_without_response(self):
+        (service,) = self.create_services(1, checks=10)
+        # A timeout stores the time until the error, not a latency
+        Webstatus.objects.create(
+            webservice=service,
+            ping=30000,
+            status=False,
+            status_code=0,
+            date_and_time=timezone.now() - timezone.timedelta(minutes=1),
+        )
+        response = self.client.get(f"/api/webservice/{service.id}/chart/?points=1")
+        series = response.json()["series"]
+        self.assertEqual(series["checks"], [11])
+        self.assertEqual(series["ping_max"], [109])
+        self.assertEqual(series["ping_avg"], [104.5])
+        self.assertEqual(series["uptime"], [round(9 / 11, 4)])
+
+    def test_export_streams_in_chunks(self):
+        self.create_services(3, checks=20)
+        response = self.assertConstantQueries(
+            3, "get", "/api/webstatus/export/?output=csv"
+        )
+        self.assertEqual(response["Content-Type"], "text/csv")
+
+
+class ExportTests(QueryCountTestCase):
+    def setUp(self):
+        super().setUp()
+        self.first, self.second = self.create_services(2, checks=5)
+
+    def export(self, query):
+        response = self.client.get(f"/api/webstatus/export/?{query}")
+        if not response.streaming:
+            return response, None
+        return response, b"".join(response.streaming_content).decode()
+
+    def test_ndjson_export_is_bounded_by_service_and_time(self):
+        start = timezone.now() - timezone.timedelta(minutes=25)
+        response, body = self.export(
+            f"services={self.first.id}&start={start.isoformat().replace('+', '%2B')}"
+        )
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        records = [json.loads(line) for line in body.splitlines()]
+        expected = Webstatus.objects.filter(
+            webservice=self.first, date_and_time__gte=start
+        ).order_by("id")
+        self.assertEqual(
+            [record["id"] for record in records], [row.id for row in expected]
+        )
+        self.assertEqual(set(records[0]), set(EXPORT_FIELDS))
+
+    def test_rows_are_paged_by_id(self):
+        with self.assertNumQueries(4):
+            rows = list(iter_webstatus([self.first.id, self.second.id], chunk_size=3))
+        self.assertEqual([row[0] for row in rows], sorted(row[0] for row in rows))
+        self.assertEqual(len(rows), 10)
+
+    def test_invalid_requests_are_rejected(self):
+        self.assertEqual(self.export("output=xml")[0].status_code, 400)
+        self.assertEqual(self.export("start=yesterday")[0].status_code, 400)
+        self.assertEqual(self.export("services=999999")[0].status_code, 404)
+
+    def test_command_writes_csv(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "history.csv")
+            call_command(
+                "export_webstatus",
+                str(self.second.id),
+                "--format",
+                "csv",
+                "--output-file",
+                path,
+            )
+            with open(path) as exported:
+                lines = exported.read().splitlines()
+        self.assertEqual(lines[0], ",".join(EXPORT_FIELDS))
+        self.assertEqual(len(lines), 6)
+
+
+class SeedDataTests(TestCase):
+    def test_seeds_users_services_and_history(self):
+        call_command(
+            "seed_data",
+            users=2,
+            services_per_user=3,
+            checks_per_service=5,
+            batch_size=7,
+            seed=1,
+            stdout=StringIO(),
+        )
+        self.assertEqual(User.objects.filter(email__startswith="seed-").count(), 2)
+        self.assertEqual(WebService.objects.count(), 6)
+        self.assertEqual(Webstatus.objects.count(), 30)
+        self.assertEqual(
+            set(Webstatus.objects.values_list("check_type", flat=True)), {"scheduled"}
+        )
+
+
+class LatencySketchTests(QueryCountTestCase):
+    def test_quantiles_are_within_relative_accuracy(self):
+        values = list(range(1, 1001))
+        sketch = DDSketch()
+        for value in values:
+            sketch.add(value)
+        for quantile in DEFAULT_QUANTILES:
+            exact = values[int(quantile * (len(values) - 1))]
+            self.assertAlmostEqual(sketch.quantile(quantile), exact, delta=exact * 0.02)
+
+    def test_merged_sketch_equals_sketch_of_union(self):
+        left, right, union = DDSketch(), DDSketch(), DDSketch()
+        for value in range(1, 500):
+            (left if value % 2 else right).add(value)
+            union.add(value)
+        left.merge(right)
+        self.assertEqual(left.bins, union.bins)
+
+    def test_percentiles_endpoint_merges_services(self):
+        services = self.create_services(2)
+        now = timezone.now()
+        for service in services:
+            for ping in (100, 200, 300):
+                record_latency(service.id, now, ping)
+        response = self.client.get("/api/webstatus/latency/?quantiles=0.5")
+        self.assertEqual(response.json()["count"], 6)
+        self.assertAlmostEqual(response.json()["percentiles"]["p50"], 200, delta=4)
+
+
+class IncidentTests(MonitorTestCase):
+    def check(self, minutes, status_ok, status_code=200):
+        checked_at = timezone.now() + timezone.timedelta(minutes=minutes)
+        Webstatus.objects.create(
+            webservice=self.service,
+            ping=100,
+            status=status_ok,
+            status_code=status_code,
+            date_and_time=checked_at,
+        )
+        return record_check(self.service.id, checked_at, status_ok, status_code)
+
+    def test_failed_checks_collapse_into_one_incident(self):
+        self.assertIsNone(self.check(0, True))
+        self.assertEqual(self.check(1, False, 500), "opened")
+        self.assertIsNone(self.check(2, False, 0))
+        self.assertIsNone(self.check(3, False, 503))
+        self.assertEqual(self.check(4, True), "closed")
+        self.assertEqual(self.check(5, False, 404), "opened")
+
+        first, second = Incident.objects.order_by("started_at")
+        self.assertEqual(first.check_count, 3)
+        self.assertEqual(first.worst_status_code, 0)
+        self.assertEqual(first.duration, first.ended_at - first.started_at)
+        self.assertIsNone(second.ended_at)
+
+        live = list(
+            Incident.objects.order_by("started_at").values_list(
+                "started_at", "ended_at", "worst_status_code", "check_count"
+            )
+        )
+        call_command("backfill_incidents", "--rebuild", stdout=StringIO())
+        self.assertEqual(
+            list(
+                Incident.objects.order_by("started_at").values_list(
+                    "started_at", "ended_at", "worst_status_code", "check_count"
+                )
+            ),
+            live,
+        )
+
+    def test_stale_closed_flag_cannot_hide_an_open_incident(self):
+        self.assertEqual(self.check(0, False, 500), "opened")
+        # Another process with its own cache last saw the service healthy
+        cache.set(open_flag_key(self.service.id), False)
+        self.assertIsNone(self.check(1, False, 503))
+        self.assertEqual(Incident.objects.get().check_count, 2)
+
+        cache.set(open_flag_key(self.service.id), False)
+        self.assertIsNone(self.check(2, True))
+        # Until the flag expires; then the recovery closes the incident
+        cache.delete(open_flag_key(self.service.id))
+        self.assertEqual(self.check(3, True), "closed")
+
+    def test_failures_lock_the_service_row(self):
+        with mock.patch.object(
+            WebService.objects,
+            "select_for_update",
+            wraps=WebService.objects.select_for_update,
+        ) as lock:
+            self.check(0, True)
+            lock.assert_not_called()
+            self.assertEqual(self.check(1, False, 500), "opened")
+            self.assertIsNone(self.check(2, False, 500))
+        self.assertEqual(lock.call_count, 2)
+
+    @override_settings(BYTEPING_INCIDENT_FLAG_TTL=60)
+    def test_open_flag_expires(self):
+        with mock.patch.object(cache, "set", wraps=cache.set) as store:
+            self.check(0, True)
+        store.assert_called_once_with(open_flag_key(self.service.id), False, 60)
+
+    def test_incident_timeline_is_constant_in_checks(self):
+        for minute in range(20):
+            self.check(minute, minute % 4 != 0, 500)
+        path = f"/api/webservice/{self.service.id}/incidents/"
+        response = self.assertConstantQueries(3, "get", path)
+        self.assertEqual(response.json()["downtime_count"], 5)
+
+
+class AdaptiveCheckTests(MonitorTestCase):
+    def setUp(self):
+        super().setUp()
+        self.service.email_alert = True
+        self.service.save()
+        reconcile_monitoring([self.service.id])
+
+    @mock.patch("main.tasks.requests.get")
+    def test_failure_alerts_on_first_confirmation(self, get):
+        get.return_value = mock.Mock(status_code=500)
+        monitor_webservice(self.service.id)
+        self.assertEqual(len(mail.outbox), 0)
+        confirmation = Schedule.objects.get(name=f"byteping_confirm_{self.service.id}")
+        self.assertEqual(
+            ast.literal_eval(confirmation.kwargs),
+            {"check_type": "confirmation", "confirmations_left": 3},
+        )
+
+        monitor_webservice(
+            self.service.id, check_type="confirmation", confirmations_left=3
+        )
+        self.assertEqual(len(mail.outbox), 1)
+        monitor_webservice(
+            self.service.id, check_type="confirmation", confirmations_left=2
+        )
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(
+            list(
+                Webstatus.objects.filter(webservice=self.service)
+                .order_by("id")
+                .values_list("check_type", flat=True)
+            ),
+            ["scheduled", "confirmation", "confirmation"],
+        )
+
+        get.return_value = mock.Mock(status_code=200)
+        monitor_webservice(self.service.id)
+        self.assertFalse(
+            Schedule.objects.filter(name=f"byteping_confirm_{self.service.id}").exists()
+        )
+
+    @override_settings(
+        BYTEPING_BACKOFF_AFTER_CHECKS=2, BYTEPING_BACKOFF_MAX_INTERVAL=30
+    )
+    @mock.patch("main.tasks.requests.get")
+    def test_persistently_down_service_backs_off_within_bounds(self, get):
+        def backoff():
+            self.service.refresh_from_db()
+            return self.service.backoff_interval
+
+        get.return_value = mock.Mock(status_code=500)
+        for _ in range(2):
+            monitor_webservice(self.service.id)
+        self.assertEqual(backoff(), 20)
+        for _ in range(10):
+            monitor_webservice(self.service.id, check_type="backoff")
+        self.assertEqual(backoff(), 30)
+
+        with mock.patch("main.dispatch.async_task") as enqueue:
+            WebService.objects.filter(id=self.service.id).update(
+                next_check_at=timezone.now()
+            )
+            dispatch_checks()
+        self.assertEqual(enqueue.call_args.kwargs["check_type"], "backoff")
+        self.service.refresh_from_db()
+        self.assertGreater(
+            self.service.next_check_at,
+            timezone.now() + timezone.timedelta(minutes=29),
+        )
+
+        get.return_value = mock.Mock(status_code=200)
+        monitor_webservice(self.service.id, check_type="backoff")
+        self.assertIsNone(backoff())
+
+
+class DispatchTests(QueryCountTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other = User.objects.create_user(
+            username="other@byteping.invalid",
+            email="other@byteping.invalid",
+            password="byteping-test",
+        )
+
+    def test_fair_share_interleaves_users(self):
+        queues = {"big": list(range(100)), "small": ["a", "b"]}
+        picked = fair_share(queues, {"big": 100, "small": 2}, budget=6)
+        self.assertEqual(picked, [0, "a", 1, "b", 2, 3])
+
+    @override_settings(BYTEPING_TENANT_MAX_IN_FLIGHT=5)
+    @mock.patch("main.dispatch.async_task")
+    def test_busy_user_cannot_crowd_out_others(self, enqueue):
+        self.create_services(30)
+        WebService.objects.bulk_create(
+            [
+                WebService(
+                    user=self.other,
+                    webservice_name=f"other {index}",
+                    webservice_url=f"https://other-{index}.example.com/",
+                )
+                for index in range(3)
+            ]
+        )
+        WebService.objects.update(next_check_at=timezone.now())
+
+        dispatch_checks()
+        users = [call.kwargs["user_id"] for call in enqueue.call_args_list]
+        self.assertEqual(users.count(self.user.id), 5)
+        self.assertEqual(users.count(self.other.id), 3)
+        self.assertEqual(in_flight(self.user.id), 5)
+
+        # The busy user's slots are all taken until their checks finish
+        enqueue.reset_mock()
+        dispatch_checks()
+        self.assertEqual(enqueue.call_count, 0)
+        release_slot(self.user.id)
+        dispatch_checks()
+        self.assertEqual(enqueue.call_count, 1)
+
+    @mock.patch("main.dispatch.get_broker")
+    @mock.patch("main.dispatch.async_task")
+    def test_due_checks_are_read_in_one_query(self, enqueue, broker):
+        broker.return_value.queue_size.return_value = 0
+        for user in (self.user, self.other):
+            WebService.objects.bulk_create(
+                [
+                    WebService(
+                        user=user,
+                        webservice_name=f"service {index}",
+                        webservice_url=f"https://{user.id}-{index}.example.com/",
+                    )
+                    for index in range(3)
+                ]
+            )
+        WebService.objects.update(next_check_at=timezone.now())
+        # Due counts, due rows, and one update per interval
+        with self.assertNumQueries(3):
+            dispatch_checks()
+        self.assertEqual(enqueue.call_count, 6)
+
+    @override_settings(BYTEPING_TENANT_SLOT_TTL=60)
+    @mock.patch("main.dispatch.async_task")
+    def test_slots_are_released_when_enqueueing_fails(self, enqueue):
+        self.create_services(3)
+        WebService.objects.update(next_check_at=timezone.now())
+        enqueue.side_effect = [None, RuntimeError("broker down")]
+        with self.assertRaises(RuntimeError):
+            dispatch_checks()
+        self.assertEqual(in_flight(self.user.id), 1)
+
+        # Slots of tasks lost without releasing them last at most the TTL
+        later = time.time() + 61
+        with mock.patch("time.time", return_value=later):
+            self.assertEqual(in_flight(self.user.id), 0)
+            release_slot(self.user.id)
+            self.assertEqual(in_flight(self.user.id), 0)
+
+
+class SheddingTests(MonitorTestCase):
+    @mock.patch("main.tasks.requests.get")
+    def test_late_and_redelivered_checks_are_dropped(self, get):
+        get.return_value = mock.Mock(status_code=200)
+        now = timezone.now()
+        # Picked up only after the next check of the service was due
+        result = monitor_webservice(
+            self.service.id,
+            planned_at=now - timezone.timedelta(minutes=20),
+            superseded_at=now - timezone.timedelta(minutes=10),
+        )
+        self.assertIn("superseded", result)
+
+        later = now + timezone.timedelta(minutes=10)
+        monitor_webservice(self.service.id, planned_at=now, superseded_at=later)
+        # django-q re-delivering the same task after its retry timeout
+        result = monitor_webservice(
+            self.service.id, planned_at=now, superseded_at=later
+        )
+        self.assertIn("duplicate", result)
+        self.assertEqual(get.call_count, 1)
+
+    @override_settings(BYTEPING_OVERLOAD_QUEUE_DEPTH=0, BYTEPING_OVERLOAD_TICKS=2)
+    @mock.patch("main.dispatch.get_broker")
+    @mock.patch("main.dispatch.async_task")
+    def test_sustained_overload_sheds_backoff_checks(self, enqueue, broker):
+        broker.return_value.queue_size.return_value = 1
+        regular = self.service
+        backoff = self.create_services(1)[-1]
+        WebService.objects.filter(id=backoff.id).update(backoff_interval=40)
+        WebService.objects.update(next_check_at=timezone.now())
+
+        dispatch_checks()
+        self.assertEqual(enqueue.call_count, 2)
+
+        WebService.objects.update(next_check_at=timezone.now())
+        enqueue.reset_mock()
+        dispatch_checks()
+        self.assertEqual(
+            [call.args[1] for call in enqueue.call_args_list], [regular.id]
+        )
+        self.assertTrue(is_overloaded())
+
+
+class ProbeTests(MonitorTestCase):
+    def test_timeouts_follow_recent_latency_within_bounds(self):
+        self.assertEqual(
+            probe_timeouts(self.service.id),
+            (settings.BYTEPING_CONNECT_TIMEOUT_MAX, settings.BYTEPING_READ_TIMEOUT_MAX),
+        )
+        for _ in range(settings.BYTEPING_TIMEOUT_MIN_SAMPLES):
+            record_latency(self.service.id, timezone.now(), 1000)
+        connect, read = load_timeouts(self.service.id)
+        self.assertAlmostEqual(read, 4.0, delta=0.1)
+        self.assertEqual(connect, min(read, settings.BYTEPING_CONNECT_TIMEOUT_MAX))
+
+    @mock.patch("main.probes.socket.create_connection")
+    @mock.patch("main.tasks.requests.get")
+    def test_breaker_switches_to_connect_only_probes(self, get, connect):
+        get.side_effect = requests.exceptions.ConnectTimeout("unreachable")
+        for _ in range(settings.BYTEPING_BREAKER_THRESHOLD):
+            monitor_webservice(self.service.id)
+        self.assertEqual(get.call_count, settings.BYTEPING_BREAKER_THRESHOLD)
+
+        connect.side_effect = OSError("refused")
+        monitor_webservice(self.service.id)
+        self.assertEqual(get.call_count, settings.BYTEPING_BREAKER_THRESHOLD)
+        self.assertEqual(connect.call_count, 1)
+
+        connect.side_effect = None
+        get.side_effect = None
+        get.return_value = mock.Mock(status_code=200)
+        monitor_webservice(self.service.id)
+        # The half-open GET runs with the floors, not the service's timeouts
+        self.assertEqual(
+            get.call_args.kwargs["timeout"],
+            (settings.BYTEPING_CONNECT_TIMEOUT_MIN, settings.BYTEPING_READ_TIMEOUT_MIN),
+        )
+        self.assertEqual(breaker_failures(self.service.id), 0)
+        self.assertTrue(
+            Webstatus.objects.filter(webservice=self.service).latest("id").status
+        )
+
+
+class ProbeAgentTests(QueryCountTestCase):
+    def setUp(self):
+        super().setUp()
+        self.service, self.local = self.create_services(2)
+        self.agent, token = create_agent("eu-west")
+        WebService.objects.filter(id=self.service.id).update(probe_agent=self.agent)
+        self.agent_client = APIClient()
+        self.agent_client.credentials(HTTP_AUTHORIZATION=f"Agent {token}")
+
+    def post_results(self, key, results):
+        body = json.dumps({"idempotency_key": key, "results": results}).encode()
+        return self.agent_client.generic(
+            "POST",
+            "/api/agent/results/",
+            gzip.compress(body),
+            content_type="application/json",
+            HTTP_CONTENT_ENCODING="gzip",
+        )
+
+    def agent_results(self, *outcomes):
+        """
+        Results as the bundled agent produces them, one per (check, status code)
+        """
+        agent = Agent("http://testserver", "token", 1, 100, 10)
+        checks = self.agent_client.get("/api/agent/checks/").json()["checks"]
+        # A check the server did not assign, e.g. from a stale poll
+        checks.append({**checks[0], "id": self.local.id})
+        checks = {check["id"]: check for check in checks}
+        for service, status_code in outcomes:
+            with mock.patch("probe_agent.agent.requests.get") as get:
+                get.return_value.status_code = status_code
+                agent.run_check(checks[service.id])
+        return agent.pending
+
+    def test_agent_lists_only_its_checks(self):
+        response = self.agent_client.get("/api/agent/checks/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [check["id"] for check in response.json()["checks"]], [self.service.id]
+        )
+        self.assertIsNotNone(ProbeAgent.objects.get().last_seen_at)
+
+        # User tokens do not work on agent endpoints and vice versa
+        self.assertEqual(self.client.get("/api/agent/checks/").status_code, 401)
+        self.assertEqual(self.agent_client.get("/api/webservice/all/").status_code, 401)
+
+    @mock.patch("main.agents.async_task")
+    def test_batch_retry_with_same_key_is_applied_once(self, enqueue):
+        results = self.agent_results(
+            (self.service, 200), (self.service, 503), (self.local, 200)
+        )
+        response = self.post_results("batch-1", results)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["accepted"], 2)
+        self.assertEqual(response.json()["rejected"], 1)
+        self.assertTrue(Incident.objects.filter(webservice=self.service).exists())
+
+        response = self.post_results("batch-1", results)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()["replayed"])
+        self.assertEqual(Webstatus.objects.filter(webservice=self.service).count(), 2)
+        self.assertFalse(Webstatus.objects.filter(webservice=self.local).exists())
+
+    @mock.patch("main.agents.async_task")
+    def test_agent_keeps_failed_batches_for_retry(self, enqueue):
+        agent = Agent("http://testserver", "token", 1, 100, 10)
+        agent.pending = self.agent_results((self.service, 200), (self.service, 200))
+        sent = []
+
+        def post(url, data, headers, timeout):
+            sent.append(json.loads(gzip.decompress(data))["idempotency_key"])
+            if len(sent) == 1:
+                raise requests.exceptions.ConnectionError()
+            response = self.agent_client.generic(
+                "POST",
+                "/api/agent/results/",
+                data,
+                content_type="application/json",
+                HTTP_CONTENT_ENCODING="gzip",
+            )
+            # Django's test response has no `ok`, unlike the requests one
+            return mock.Mock(
+                ok=response.status_code < 400,
+                status_code=response.status_code,
+                json=response.json,
+            )
+
+        with mock.patch.object(agent.session, "post", side_effect=post):
+            agent.flush()
+            self.assertEqual(len(agent.outbox), 1)
+            agent.flush()
+            self.assertEqual(len(sent), 1)
+
+            agent.outbox[0]["retry_at"] = 0
+            agent.flush()
+        self.assertEqual(len(agent.outbox), 0)
+        self.assertEqual(sent[0], sent[1])
+        self.assertEqual(Webstatus.objects.filter(webservice=self.service).count(), 2)
+
+    @override_settings(BYTEPING_CONFIRMATION_CHECKS=3)
+    @mock.patch("main.tasks.send_mail")
+    @mock.patch("main.agents.async_task")
+    def test_ingest_alerts_are_confirmed_and_queued(self, enqueue, send):
+        WebService.objects.filter(id=self.service.id).update(email_alert=True)
+        results = self.agent_results((self.service, 503))
+        self.post_results("batch-1", results)
+        # The result that opens the incident stays quiet
+        enqueue.assert_not_called()
+
+        results = self.agent_results((self.service, 503), (self.service, 503))
+        self.post_results("batch-2", results)
+        self.assertEqual(
+            [call.args[0] for call in enqueue.call_args_list],
+            ["main.tasks.send_alert_email"],
+        )
+        send.assert_not_called()
+
+    @mock.patch("main.dispatch.get_broker")
+    @mock.patch("main.dispatch.async_task")
+    def test_agent_services_are_not_dispatched_locally(self, enqueue, broker):
+        broker.return_value.queue_size.return_value = 0
+        reconcile_monitoring([self.service.id, self.local.id])
+        dispatch_checks()
+        self.assertEqual(
+            [call.args[1] for call in enqueue.call_args_list], [self.local.id]
+        )
+
+
+class HeartbeatTests(QueryCountTestCase):
+    def setUp(self):
+        super().setUp()
+        token_cache.clear_local()
+        response = self.client.post(
+            "/api/webservice/add/",
+            {"webservice_name": "nightly backup", "monitor_type": "heartbeat"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.monitor = WebService.objects.get(id=response.json()["webservice"]["id"])
+        self.monitor.email_alert = True
+        self.monitor.save()
+        schedule_webservice_monitoring(self.monitor.id)
+        self.ping_path = f"/api/heartbeat/{self.monitor.heartbeat_token}/"
+
+    def test_pings_write_once_per_interval(self):
+        self.assertIn(self.monitor.heartbeat_token, self.monitor.webservice_url)
+        self.monitor.refresh_from_db()
+        self.assertIsNone(self.monitor.next_check_at)
+        self.assertIsNotNone(self.monitor.heartbeat_deadline)
+
+        self.assertEqual(self.client.post(self.ping_path).status_code, 200)
+        with self.assertNumQueries(0):
+            for _ in range(50):
+                self.client.get(self.ping_path)
+        self.assertEqual(Webstatus.objects.filter(webservice=self.monitor).count(), 1)
+        self.assertEqual(self.client.get("/api/heartbeat/unknown/").status_code, 404)
+        # Misses are remembered too
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                self.client.get("/api/heartbeat/unknown/").status_code, 404
+            )
+
+    @mock.patch("main.heartbeats.async_task")
+    def test_sweeper_records_missed_heartbeats(self, enqueue):
+        WebService.objects.filter(id=self.monitor.id).update(
+            heartbeat_deadline=timezone.now() - timezone.timedelta(seconds=1)
+        )
+        self.assertIn("1 missed", sweep_heartbeats())
+        down = Webstatus.objects.get(webservice=self.monitor)
+        self.assertEqual((down.status, down.check_type), (False, "heartbeat"))
+        # The alert is queued rather than sent inside the sweep
+        self.assertEqual(
+            [call.args[0] for call in enqueue.call_args_list],
+            ["main.tasks.send_alert_email"],
+        )
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertIn("none missed", sweep_heartbeats())
+
+        # The next ping writes through and ends the incident
+        self.client.get(self.ping_path)
+        self.assertIsNotNone(Incident.objects.get(webservice=self.monitor).ended_at)
+
+    def test_sweeper_extends_deadline_after_recent_ping(self):
+        self.client.get(self.ping_path)
+        WebService.objects.filter(id=self.monitor.id).update(
+            heartbeat_deadline=timezone.now() - timezone.timedelta(seconds=1)
+        )
+        self.assertIn("none missed", sweep_heartbeats())
+        self.monitor.refresh_from_db()
+        self.assertGreater(self.monitor.heartbeat_deadline, timezone.now())
+
+    def test_switching_monitor_type_keeps_urls_consistent(self):
+        path = f"/api/webservice/{self.monitor.id}/update/"
+        response = self.client.patch(
+            path, {"webservice_url": "https://example.com/"}, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.patch(path, {"monitor_type": "http"}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.patch(
+            path,
+            {"monitor_type": "http", "webservice_url": "https://example.com/"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.monitor.refresh_from_db()
+        self.assertEqual(self.monitor.webservice_url, "https://example.com/")
+        self.assertIsNone(self.monitor.heartbeat_token)
+        self.assertEqual(self.client.get(self.ping_path).status_code, 404)
+
+
+class StatusPageTests(QueryCountTestCase):
+    def setUp(self):
+        super().setUp()
+        snapshot_cache.clear_local()
+        self.services = self.create_services(2, checks=10)
+        self.old = Webstatus.objects.create(
+            webservice=self.services[0],
+            ping=100,
+            status=False,
+            status_code=503,
+            date_and_time=timezone.now() - timezone.timedelta(days=3),
+        )
+        response = self.client.post(
+            "/api/statuspage/add/",
+            {
+                "slug": "acme",
+                "title": "Acme status",
+                "webservices": [service.id for service in self.services],
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.page = StatusPage.objects.get(slug="acme")
+
+    def test_public_page_is_served_from_cache(self):
+        public = APIClient()
+        cache.clear()
+        snapshot_cache.clear_local()
+        with self.assertNumQueries(1):
+            response = public.get("/api/status/acme/")
+        with self.assertNumQueries(0):
+            for _ in range(20):
+                public.get("/api/status/acme/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("public", response["Cache-Control"])
+        payload = response.json()
+        self.assertEqual(payload["status"], "operational")
+        self.assertEqual(len(payload["services"][0]["days"]), 90)
+        self.assertEqual(
+            public.get(
+                "/api/status/acme/", HTTP_IF_NONE_MATCH=response["ETag"]
+            ).status_code,
+            304,
+        )
+        self.assertEqual(public.get("/api/status/missing/").status_code, 404)
+
+    @mock.patch("main.status_pages.async_task")
+    def test_incident_transitions_rebuild_once(self, enqueue):
+        etag = self.page.etag
+        for service in self.services:
+            record_check(service.id, timezone.now(), False, 503)
+            refresh_for_service(service.id)
+        self.assertEqual(enqueue.call_count, 1)
+
+        rebuild_snapshot(self.page.id)
+        response = APIClient().get("/api/status/acme/")
+        self.assertEqual(response.json()["status"], "major_outage")
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_rebuild_reuses_completed_days(self):
+        day = timezone.localdate(self.old.date_and_time).isoformat()
+        self.old.delete()
+        rebuild_snapshot(self.page.id)
+        self.page.refresh_from_db()
+        bars = {bar["date"]: bar for bar in self.page.snapshot["services"][0]["days"]}
+        self.assertEqual((bars[day]["up"], bars[day]["checks"]), (0, 1))
+
+
+class SLAReportTests(QueryCountTestCase):
+    def setUp(self):
+        super().setUp()
+        self.start, self.end = parse_month()
+        self.fast, self.slow = self.create_services(2)
+        WebService.objects.update(created_at=self.start - timezone.timedelta(days=1))
+        WebService.objects.filter(id=self.slow.id).update(sla_target=99.99)
+        for index in range(200):
+            checked_at = self.start + timezone.timedelta(hours=index)
+            record_latency(self.fast.id, checked_at, 20 + index % 30)
+            record_latency(self.slow.id, checked_at, 500 + 10 * index)
+        Webstatus.objects.bulk_create(
+            [
+                Webstatus(
+                    webservice=service,
+                    ping=100,
+                    status=True,
+                    status_code=200,
+                    date_and_time=self.start + timezone.timedelta(days=day),
+                )
+                for service in (self.fast, self.slow)
+                for day in range(5)
+            ]
+        )
+        # Two one-hour outages of the slow service
+        for day in (3, 10):
+            started = self.start + timezone.timedelta(days=day)
+            Incident.objects.create(
+                webservice=self.slow,
+                started_at=started,
+                ended_at=started + timezone.timedelta(hours=1),
+                duration=timezone.timedelta(hours=1),
+                worst_status_code=503,
+            )
+
+    def test_vectorized_metrics_match_per_service_values(self):
+        table = sla_table(
+            report_services(WebService.objects.all()), self.start, self.end
+        )
+        for row, service in enumerate((self.fast, self.slow)):
+            sketch = merged_sketch([service.id], self.start, self.end)
+            for column, q in enumerate(DEFAULT_QUANTILES):
+                self.assertAlmostEqual(
+                    table["percentiles"][row, column], sketch.quantile(q)
+                )
+
+        period = (self.end - self.start).total_seconds()
+        self.assertEqual(list(table["incidents"]), [0, 2])
+        self.assertEqual(table["downtime"][1], 7200)
+        self.assertEqual(table["mttr"][1], 3600)
+        self.assertAlmostEqual(table["mtbf"][1], (period - 7200) / 2)
+        self.assertEqual(list(table["sla_met"]), [True, False])
+
+    def test_report_endpoint_and_command(self):
+        response = self.client.get(
+            "/api/sla/report/", {"month": self.start.strftime("%Y-%m")}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["summary"]["sla_missed"], 1)
+        self.assertEqual(
+            self.client.get("/api/sla/report/", {"month": "2026-13"}).status_code,
+            400,
+        )
+
+        with tempfile.TemporaryDirectory() as directory:
+            call_command("sla_report", output_dir=directory, stdout=StringIO())
+            self.assertEqual(len(os.listdir(directory)), 1)
+
+    def test_services_without_checks_report_no_data(self):
+        (idle,) = self.create_services(1)
+        WebService.objects.filter(id=idle.id).update(
+            created_at=self.start - timezone.timedelta(days=1)
+        )
+        response = self.client.get(
+            "/api/sla/report/", {"month": self.start.strftime("%Y-%m")}
+        )
+        summary = response.json()["summary"]
+        self.assertEqual(
+            (summary["sla_met"], summary["sla_missed"], summary["no_data"]), (1, 1, 1)
+        )
+        self.assertIsNotNone(summary["availability"])
+        services = {service["id"]: service for service in response.json()["services"]}
+        self.assertIsNone(services[idle.id]["sla_met"])
+        self.assertIsNone(services[idle.id]["availability"])
+
+
+@override_settings(BYTEPING_READ_REPLICAS=["replica"], BYTEPING_REPLICA_MAX_LAG=5)
+class ReplicaRoutingTests(QueryCountTestCase):
+    def setUp(self):
+        super().setUp()
+        lag_cache.clear_local()
+
+    def test_reads_go_to_a_healthy_replica(self):
+        with mock.patch("main.routers.load_replica_lags", return_value={"replica": 1}):
+            self.assertEqual(choose_read_alias(self.user.id), "replica")
+        lag_cache.clear_local()
+        cache.clear()
+        with mock.patch("main.routers.load_replica_lags", return_value={"replica": 60}):
+            self.assertIsNone(choose_read_alias(self.user.id))
+        lag_cache.clear_local()
+        cache.clear()
+        with mock.patch(
+            "main.routers.load_replica_lags", return_value={"replica": None}
+        ):
+            self.assertIsNone(choose_read_alias(self.user.id))
+
+    @mock.patch("main.routers.load_replica_lags", return_value={"replica": 0})
+    def test_writers_read_their_writes_from_the_primary(self, lags):
+        pin_primary(self.user.id)
+        self.assertIsNone(choose_read_alias(self.user.id))
+        self.assertEqual(choose_read_alias(self.user.id + 1), "replica")
+
+    @mock.patch("main.routers.load_replica_lags", return_value={"replica": 0})
+    def test_routing_covers_the_view_and_its_streamed_body(self, lags):
+        router = ReplicaRouter()
+        seen = []
+
+        def body():
+            seen.append(router.db_for_read(Webstatus))
+            yield b""
+
+        @replica_reads
+        def view(request):
+            seen.append(router.db_for_read(Webstatus))
+            return StreamingHttpResponse(body())
+
+        response = view(mock.Mock(user=self.user))
+        self.assertIsNone(router.db_for_read(Webstatus))
+        b"".join(response.streaming_content)
+        self.assertEqual(seen, ["replica", "replica"])
+        self.assertEqual(router.db_for_write(Webstatus), "default")
+
+    def test_non_mysql_backends_report_no_lag(self):
+        self.assertEqual(measure_replica_lag("default"), 0)
+
+
+class TaskTracingTests(MonitorTestCase):
+    @override_settings(BYTEPING_TASK_TRACING=True, BYTEPING_PROFILE_SAMPLE_RATE=0)
+    @mock.patch("main.tasks.requests.get")
+    def test_trace_logs_phases_and_queries(self, get):
+        get.return_value = mock.Mock(status_code=200)
+        with self.assertLogs("byteping.tasks", "INFO") as logs:
+            monitor_webservice(self.service.id)
+        (line,) = logs.records
+        record = json.loads(line.getMessage())
+        self.assertEqual(record["task"], "main.tasks.monitor_webservice")
+        self.assertEqual(record["webservice_id"], self.service.id)
+        self.assertIn("insert", record["phases"])
+        self.assertEqual(
+            record["queries"],
+            sum(phase["queries"] for phase in record["phases"].values()),
+        )
+        self.assertNotIn("profile", record)
+
+    @mock.patch("main.tasks.requests.get")
+    def test_slow_sampled_runs_keep_a_profile(self, get):
+        get.return_value = mock.Mock(status_code=200)
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+            BYTEPING_TASK_TRACING=True,
+            BYTEPING_PROFILE_SAMPLE_RATE=1.0,
+            BYTEPING_SLOW_TASK_SECONDS=0,
+            BYTEPING_PROFILE_DIR=directory,
+        ):
+            with self.assertLogs("byteping.tasks", "INFO") as logs:
+                monitor_webservice(self.service.id)
+            record = json.loads(logs.records[0].getMessage())
+            self.assertTrue(os.path.exists(record["profile"]))
+
+    @mock.patch("main.tasks.requests.get")
+    def test_tracing_is_off_by_default(self, get):
+        get.return_value = mock.Mock(status_code=200)
+        with self.assertNoLogs("byteping.tasks", "INFO"):
+            monitor_webservice(self.service.id)
+
+
+class BenchmarkTests(QueryCountTestCase):
+    def test_farm_serves_configured_behaviour(self):
+        farm = TargetFarm(servers=2, latency_ms=0, jitter_ms=0, body_bytes=10)
+        farm.start()
+        try:
+            self.assertEqual(len(set(farm.urls)), 2)
+            response = requests.get(farm.urls[0], timeout=5)
+            self.assertEqual((response.status_code, response.content), (200, b"x" * 10))
+            farm.error_rate = 1.0
+            self.assertEqual(requests.get(farm.urls[1], timeout=5).status_code, 500)
+            farm.error_rate, farm.hang_rate = 0.0, 1.0
+            with self.assertRaises(requests.exceptions.ReadTimeout):
+                requests.get(farm.urls[0], timeout=(1, 0.2))
+        finally:
+            farm.stop()
+
+    def test_percentiles_use_nearest_rank(self):
+        self.assertEqual(
+            percentiles(list(range(1, 101))),
+            {"p50": 50, "p90": 90, "p99": 99, "max": 100},
+        )
+        self.assertEqual(
+            percentiles([]), {"p50": None, "p90": None, "p99": None, "max": None}
+        )
+        self.assertEqual(percentiles([7]), {"p50": 7, "p90": 7, "p99": 7, "max": 7})
+
+    def test_outcomes_are_counted_from_written_rows(self):
+        (service,) = self.create_services(1, checks=10)
+        Webstatus.objects.create(
+            webservice=service,
+            ping=10000,
+            status=False,
+            status_code=0,
+            date_and_time=timezone.now(),
+        )
+        self.assertEqual(outcome_counts([service.id]), {"up": 9, "down": 1, "error": 1})
+
+
+class BenchmarkRunTests(TransactionTestCase):
+    """
+    Committed rows, so the benchmark's worker threads can read them
+    """
+
+    def setUp(self):
+        cache.clear()
+        service_cache.clear_local()
+        timeout_cache.clear_local()
+        self.farm = TargetFarm(servers=2, latency_ms=0, jitter_ms=0).start()
+        self.addCleanup(self.farm.stop)
+
+    def test_run_reports_checks_and_outcomes(self):
+        # Set after start, so the farm still serves plain HTTP
+        self.farm.certfile = "/tmp/farm.pem"
+        self.farm.error_rate = 0.5
+        with mock.patch.dict(os.environ, {"REQUESTS_CA_BUNDLE": "/etc/bundle.pem"}):
+            report = run_benchmark(
+                self.farm, services=4, interval=0.2, duration=0.4, concurrency=2
+            )
+            self.assertEqual(os.environ["REQUESTS_CA_BUNDLE"], "/etc/bundle.pem")
+
+        self.assertEqual((report["planned_checks"], report["checks"]), (8, 8))
+        outcomes = report["outcomes"]
+        self.assertEqual(outcomes["up"] + outcomes["down"] + outcomes["no_row"], 8)
+        self.assertEqual(outcomes["error"], 0)
+        self.assertEqual(report["webstatus_inserts"], 8 - outcomes["no_row"])
+        self.assertFalse(WebService.objects.exists())
+
+    def test_command_writes_only_the_report_to_stdout(self):
+        stdout, stderr = StringIO(), StringIO()
+        with mock.patch(
+            "main.management.commands.benchmark_probes.TargetFarm",
+            return_value=self.farm,
+        ):
+            call_command(
+                "benchmark_probes",
+                services=2,
+                interval=0.2,
+                duration=0.2,
+                stdout=stdout,
+                stderr=stderr,
+            )
+        self.assertEqual(json.loads(stdout.getvalue())["checks"], 2)
+        self.assertIn("BytePing: benchmarking", stderr.getvalue())
+
+
+class LatencyAnomalyTests(MonitorTestCase):
+    def setUp(self):
+        super().setUp()
+        for index in range(50):
+            observe_latency(self.service.id, 80 + index % 7)
+
+    def test_sustained_slowdown_is_flagged_once(self):
+        events = [observe_latency(self.service.id, 4000)[0] for _ in range(5)]
+        self.assertEqual(events, [None, None, "started", None, None])
+        event, baseline = observe_latency(self.service.id, 85)
+        self.assertEqual(event, "ended")
+        # Slow pings did not drag the baseline up
+        self.assertLess(baseline, 90)
+
+        # A single spike is not sustained
+        self.assertEqual(observe_latency(self.service.id, 4000)[0], None)
+        self.assertEqual(observe_latency(self.service.id, 82)[0], None)
+
+    def test_baseline_survives_a_cache_loss(self):
+        stored = LatencyBaseline.objects.get(webservice=self.service)
+        self.assertEqual(stored.samples, 50)
+        cache.clear()
+        state = load_state(self.service.id)
+        self.assertEqual(state["samples"], 50)
+        self.assertAlmostEqual(state["mean"], stored.mean)
+
+    @mock.patch("main.tasks.observe_latency")
+    @mock.patch("main.tasks.requests.get")
+    def test_anomalies_alert_through_email_setting(self, get, observe):
+        get.return_value = mock.Mock(status_code=200)
+        observe.return_value = ("started", 80.0)
+        monitor_webservice(self.service.id)
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.service.email_alert = True
+        self.service.save()
+        monitor_webservice(self.service.id)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn("SLOW", mail.outbox[0].subject)
+
+
+class MetricsEndpointTests(QueryCountTestCase):
+    @override_settings(BYTEPING_METRICS_TOKEN="", DEBUG=False)
+    def test_endpoint_is_closed_without_a_token(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 404)
+
+    @override_settings(BYTEPING_METRICS_TOKEN="scrape-secret")
+    def test_gauges_do_not_label_users(self):
+        (service,) = self.create_services(1)
+        WebService.objects.filter(id=service.id).update(
+            next_check_at=timezone.now() - timezone.timedelta(minutes=5)
+        )
+        scraper = APIClient()
+        self.assertEqual(scraper.get("/metrics").status_code, 401)
+        response = scraper.get("/metrics", HTTP_AUTHORIZATION="Bearer scrape-secret")
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn("byteping_tenants_overdue 1", body)
+        self.assertNotIn("user=", body)
+
+    def test_retired_process_counts_are_kept(self):
+        metrics.webstatus_inserts.inc(3)
+        before = metrics.collect()["byteping_webstatus_inserts_total"][()]
+        dead = f"{metrics.CACHE_KEY_PREFIX}:process:dead"
+        cache.set(
+            dead,
+            {
+                "flushed_at": time.time() - settings.BYTEPING_METRICS_TTL - 1,
+                "metrics": {"byteping_webstatus_inserts_total": {(): 5}},
+            },
+            None,
+        )
+        state = metrics.load_state()
+        state["processes"].append(dead)
+        cache.set(metrics.STATE_KEY, state, None)
+
+        self.assertEqual(
+            metrics.collect()["byteping_webstatus_inserts_total"][()], before + 5
+        )
+        self.assertNotIn(dead, metrics.load_state()["processes"])
+        cache.delete(dead)
+        self.assertEqual(
+            metrics.collect()["byteping_webstatus_inserts_total"][()], before + 5
+        )
+
+
+class MonitorQueryCountTests(MonitorTestCase):
+    def test_owner_email_change_refreshes_cached_config(self):
+        self.assertEqual(
+            get_service_config(self.service.id).user_email, self.user.email
+        )
+        # Logins only touch last_login and leave the services alone
+        with self.assertNumQueries(1):
+            self.user.last_login = timezone.now()
+            self.user.save(update_fields=["last_login"])
+
+        self.user.email = "renamed@byteping.invalid"
+        self.user.save(update_fields=["email"])
+        self.assertEqual(
+            get_service_config(self.service.id).user_email, "renamed@byteping.invalid"
+        )
+
+    @mock.patch("main.tasks.requests.get")
+    def test_steady_state_checks_skip_config_lookup(self, get):
+        get.return_value = mock.Mock(status_code=200)
+        # Config lookup, the latency sketches behind the probe timeouts, insert,
+        # closing any incident left open before the incident state was cached,
+        # creating the hour's latency sketch (inside savepoints here;
+        # BEGIN/COMMIT in production are not queries), then loading the
+        # latency baseline before it is cached
+        with self.assertNumQueries(11):
+            monitor_webservice(self.service.id)
+        # Insert plus a locked read-modify-write of the sketch
+        with self.assertNumQueries(5):
+            monitor_webservice(self.service.id)
+
+    @mock.patch("main.tasks.requests.get")
+    def test_saving_a_service_invalidates_its_config(self, get):
+        get.return_value = mock.Mock(status_code=200)
+        monitor_webservice(self.service.id)
+        self.service.expect_status_code = 204
+        self.service.save()
+        monitor_webservice(self.service.id)
+        self.assertFalse(
+            Webstatus.objects.filter(webservice=self.service).latest("id").status
+        )
@@ -4,6 +4,7 @@ from . import views
 urlpatterns = [
     # WebService endpoints
     path("webservice/add/", views.add, name="add"),
+    path("webservice/bulk/", views.bulk_add, name="bulk_add"),
     path("webservice/all/", views.get_all, name="get_all"),
     path("webservice/<int:id>/", views.get, name="get"),
     path("webservice/<int:id>/update/", views.update, name="update"),
@@ -15,6 +16,33 @@ urlpatterns = [
         views.get_webstatus_by_service,
         name="get_webstatus_by_service",
     ),
+    path(
+        "webservice/<int:service_id>/chart/",
+        views.chart_webstatus,
+        name="chart_webstatus",
+    ),
+    path(
+        "webservice/<int:service_id>/incidents/",
+        views.get_incidents,
+        name="get_incidents",
+    ),
+    path("webstatus/latency/", views.latency_percentiles, name="latency_percentiles"),
+    path("webstatus/export/", views.export_webstatus, name="export_webstatus"),
+    path("sla/report/", views.sla_report, name="sla_report"),
+    # Status pages
+    path("statuspage/add/", views.add_status_page, name="add_status_page"),
+    path("statuspage/all/", views.get_status_pages, name="get_status_pages"),
+    path(
+        "statuspage/<int:id>/delete/",
+        views.delete_status_page,
+        name="delete_status_page",
+    ),
+    path("status/<slug:slug>/", views.public_status_page, name="public_status_page"),
+    # Heartbeat monitor ping URL
+    path("heartbeat/<str:token>/", views.heartbeat, name="heartbeat"),
+    # Probe agent endpoints
+    path("agent/checks/", views.agent_checks, name="agent_checks"),
+    path("agent/results/", views.agent_results, name="agent_results"),
 ]
   # path("webstatus/all/", views.get_all_webstatus, name="get_all_webstatus"),
     # path("webstatus/<int:id>/", views.get_webstatus, name="get_webstatus"),
\ No newline at end of file
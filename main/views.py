@@ -1,15 +1,74 @@
 from django.shortcuts import render
-from .serializers import WebServiceSerializer, WebstatusSerializer
-from rest_framework.decorators import api_view, permission_classes
+import json
+from .serializers import (
+    IncidentSerializer,
+    StatusPageSerializer,
+    WebServiceSerializer,
+    WebstatusSerializer,
+    webstatus_columns,
+    webstatus_rows,
+)
+from rest_framework.decorators import (
+    api_view,
+    authentication_classes,
+    parser_classes,
+    permission_classes,
+)
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
-from .models import WebService, Webstatus
+from .agents import IsProbeAgent, ProbeAgentAuthentication, assigned_checks, ingest
+from .models import Incident, ProbeAgent, StatusPage, WebService, Webstatus
+from .cache import service_cache
+from .downsampling import chart_series
+from .heartbeats import record_ping
+from .incidents import summarize
+from .export import RENDERERS, iter_webstatus, parse_time_bound
+from .parsers import CSVParser, GzipJSONParser, read_csv_rows
+from .probes import probe_timeouts
+from .routers import pin_primary, replica_reads
+from .sketches import DEFAULT_QUANTILES, merged_sketch
+from .sla import parse_month, user_reports
+from .status_pages import get_snapshot, rebuild_snapshot, snapshot_cache
+from django.conf import settings
+from django.db import connection, transaction
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+from . import metrics as byteping_metrics
+from django_q.tasks import async_task
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
 from django.utils.timezone import now
-from django.db.models import Count, Q, Avg
+from django.db.models import Count, Q, Avg, Max, Min
 from datetime import timedelta
 
 
+def conditional_response(request, etag, last_modified):
+    """
+    Answer If-None-Match / If-Modified-Since with a 304 when the validators match
+    """
+    return get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(last_modified.timestamp()) if last_modified else None,
+    )
+
+
+def set_validators(response, etag, last_modified):
+    """
+    Attach ETag / Last-Modified so clients can revalidate instead of re-downloading
+    """
+    response["ETag"] = etag
+    if last_modified:
+        response["Last-Modified"] = http_date(last_modified.timestamp())
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def add(request):
@@ -30,16 +89,237 @@ def add(request):
     )
 
 
+@csrf_exempt
+@require_http_methods(["GET", "HEAD", "POST"])
+def heartbeat(request, token):
+    """
+    Ping URL of a heartbeat monitor
+    A plain Django view: no authentication or DRF negotiation, and usually no
+    queries, so jobs can ping it as often as they like.
+    """
+    if not record_ping(token):
+        return HttpResponse("Not found", status=404, content_type="text/plain")
+    return HttpResponse("OK", content_type="text/plain")
+
+
+@require_http_methods(["GET", "HEAD"])
+def public_status_page(request, slug):
+    """
+    Public status page, served from its precomputed snapshot
+    Shared caches and browsers may keep it for BYTEPING_STATUS_PAGE_MAX_AGE
+    seconds and revalidate with the ETag after that.
+    """
+    snapshot = get_snapshot(slug)
+    if snapshot is None:
+        return HttpResponse("Not found", status=404, content_type="text/plain")
+    body, etag, built_at = snapshot
+
+    response = conditional_response(request, etag, built_at)
+    if response is None:
+        response = HttpResponse(body, content_type="application/json")
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(built_at.timestamp())
+    patch_cache_control(
+        response, public=True, max_age=settings.BYTEPING_STATUS_PAGE_MAX_AGE
+    )
+    return response
+
+
+def metrics(request):
+    """
+    Prometheus scrape endpoint for probe, scheduler and queue health
+    Requires BYTEPING_METRICS_TOKEN as a bearer token; without a token it is only
+    served when DEBUG is on
+    """
+    token = settings.BYTEPING_METRICS_TOKEN
+    if not token and not settings.DEBUG:
+        return HttpResponse("Not Found", status=404, content_type="text/plain")
+    if token and not constant_time_compare(
+        request.META.get("HTTP_AUTHORIZATION", ""), f"Bearer {token}"
+    ):
+        return HttpResponse("Unauthorized", status=401, content_type="text/plain")
+
+    return HttpResponse(
+        byteping_metrics.render(byteping_metrics.scrape_gauges()),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+@parser_classes([JSONParser, CSVParser, MultiPartParser])
+def bulk_add(request):
+    """
+    Create or upsert many webservices at once and schedule them in one reconciliation
+    Accepts a JSON list (or {"mode", "webservices"}), a text/csv body or a CSV "file" upload
+    """
+    mode = request.query_params.get("mode", "create")
+    data = request.data
+    if "file" in request.FILES:
+        try:
+            data = read_csv_rows(request.FILES["file"].read().decode("utf-8"))
+        except UnicodeDecodeError:
+            return Response(
+                {"success": False, "error": "CSV file must be UTF-8 encoded."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+    elif isinstance(data, dict):
+        mode = data.get("mode", mode)
+        data = data.get("webservices")
+
+    if mode not in ("create", "upsert"):
+        return Response(
+            {"success": False, "error": "mode must be one of: create, upsert."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if not isinstance(data, list) or not data:
+        return Response(
+            {"success": False, "error": "A non-empty list of webservices is required."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if len(data) > settings.BYTEPING_BULK_IMPORT_LIMIT:
+        return Response(
+            {
+                "success": False,
+                "error": f"At most {settings.BYTEPING_BULK_IMPORT_LIMIT} webservices per request.",
+            },
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    # Validate every row first so nothing is written for rows that fail
+    results = [None] * len(data)
+    valid_rows = {}
+    for index, row in enumerate(data):
+        serializer = WebServiceSerializer(data=row)
+        if not serializer.is_valid():
+            results[index] = {
+                "row": index,
+                "success": False,
+                "error": serializer.errors,
+            }
+            continue
+        url = serializer.validated_data["webservice_url"]
+        if url in valid_rows:
+            results[index] = {
+                "row": index,
+                "success": False,
+                "error": f"Duplicate of row {valid_rows[url][0]}.",
+            }
+            continue
+        valid_rows[url] = (index, serializer.validated_data)
+
+    existing = {
+        webservice.webservice_url: webservice
+        for webservice in WebService.objects.filter(
+            user=request.user, webservice_url__in=list(valid_rows)
+        )
+    }
+
+    to_create, to_update = [], []
+    update_fields = set()
+    for url, (index, attrs) in valid_rows.items():
+        webservice = existing.get(url)
+        if webservice is None:
+            to_create.append(WebService(user=request.user, **attrs))
+        elif mode == "upsert":
+            for field, value in attrs.items():
+                setattr(webservice, field, value)
+            webservice.updated_at = now()
+            update_fields.update(attrs)
+            to_update.append(webservice)
+        else:
+            results[index] = {
+                "row": index,
+                "success": False,
+                "error": "WebService with this URL already exists, use mode=upsert.",
+            }
+
+    with transaction.atomic():
+        if connection.features.can_return_rows_from_bulk_insert:
+            WebService.objects.bulk_create(to_create, batch_size=500)
+        else:
+            # MySQL does not return primary keys from bulk inserts; these saves
+            # also send post_save, which schedules each service as add does
+            for webservice in to_create:
+                webservice.save(force_insert=True)
+        if to_update:
+            WebService.objects.bulk_update(
+                to_update, sorted(update_fields | {"updated_at"}), batch_size=500
+            )
+    # bulk_update does not send post_save, so invalidate cached configs here
+    for webservice in to_update:
+        service_cache.invalidate(str(webservice.id))
+    pin_primary(request.user.id)
+
+    for webservice in to_create:
+        index = valid_rows[webservice.webservice_url][0]
+        results[index] = {
+            "row": index,
+            "success": True,
+            "action": "created",
+            "id": webservice.id,
+        }
+    for webservice in to_update:
+        index = valid_rows[webservice.webservice_url][0]
+        results[index] = {
+            "row": index,
+            "success": True,
+            "action": "updated",
+            "id": webservice.id,
+        }
+
+    scheduled_ids = [webservice.id for webservice in to_create + to_update]
+    if scheduled_ids:
+        async_task("main.tasks.reconcile_monitoring", scheduled_ids)
+
+    failed = sum(1 for result in results if not result["success"])
+    if to_create:
+        response_status = status.HTTP_201_CREATED
+    elif to_update:
+        response_status = status.HTTP_200_OK
+    else:
+        response_status = status.HTTP_400_BAD_REQUEST
+    return Response(
+        {
+            "success": failed < len(results),
+            "created": len(to_create),
+            "updated": len(to_update),
+            "failed": failed,
+            "results": results,
+        },
+        status=response_status,
+    )
+
+
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@replica_reads
 def get_all(request):
     try:
         webservices = WebService.objects.filter(user=request.user)
+
+        # Validators come from a single aggregate, so unchanged polls skip serialization.
+        # No Last-Modified: Max(updated_at) does not move when a service is
+        # deleted, while the count in the ETag does.
+        stats = webservices.aggregate(
+            count=Count("id"), last_id=Max("id"), last_updated=Max("updated_at")
+        )
+        last_updated = stats["last_updated"]
+        etag = '"ws-{}-{}-{}"'.format(
+            stats["count"],
+            stats["last_id"] or 0,
+            int(last_updated.timestamp() * 1000000) if last_updated else 0,
+        )
+        not_modified = conditional_response(request, etag, None)
+        if not_modified is not None:
+            return not_modified
+
         serializer = WebServiceSerializer(webservices, many=True)
-        return Response(
+        response = Response(
             {"success": True, "webservices": serializer.data},
             status=status.HTTP_200_OK,
         )
+        return set_validators(response, etag, None)
     except Exception as e:
         return Response(
             {"success": False, "error": "An unexpected error occurred."},
@@ -49,6 +329,7 @@ def get_all(request):
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@replica_reads
 def get(request, id):
     try:
         webservice = WebService.objects.get(id=id, user=request.user)
@@ -131,10 +412,18 @@ def delete(request, id):
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@replica_reads
 def get_webstatus_by_service(request, service_id):
     """
     Get all webstatus entries for a specific webservice
+    ?layout=columnar returns parallel arrays instead of one object per row
     """
+    layout = request.query_params.get("layout", "rows")
+    if layout not in ("rows", "columnar"):
+        return Response(
+            {"success": False, "error": "layout must be one of: rows, columnar."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
     try:
         # First check if the webservice belongs to the user
         webservice = WebService.objects.get(id=service_id, user=request.user)
@@ -143,16 +432,50 @@ def get_webstatus_by_service(request, service_id):
             "-date_and_time"
         )
 
-        serializer = WebstatusSerializer(webstatus_list, many=True)
-        return Response(
-            {
+        # Webstatus is append-only, so the id bounds plus the newest check time
+        # identify the payload without touching the rows themselves
+        stats = Webstatus.objects.filter(webservice=webservice).aggregate(
+            first_id=Min("id"), last_id=Max("id"), last_checked=Max("date_and_time")
+        )
+        last_modified = max(
+            filter(None, [webservice.updated_at, stats["last_checked"]])
+        )
+        # The layouts share validators otherwise, so one could revalidate the other
+        etag = '"wst-{}-{}-{}-{}-{}"'.format(
+            layout,
+            webservice.id,
+            stats["first_id"] or 0,
+            stats["last_id"] or 0,
+            int(webservice.updated_at.timestamp() * 1000000),
+        )
+        not_modified = conditional_response(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        webservice_data = WebServiceSerializer(webservice).data
+        if layout == "columnar":
+            columns = webstatus_columns(webstatus_list)
+            payload = {
                 "success": True,
-                "webstatus": serializer.data,
-                "webservice": WebServiceSerializer(webservice).data,
-                "count": webstatus_list.count(),
-            },
-            status=status.HTTP_200_OK,
+                "columns": columns,
+                "webservice": webservice_data,
+                "count": len(columns["timestamp"]),
+            }
+        else:
+            rows = webstatus_rows(webstatus_list)
+            payload = {
+                "success": True,
+                "webstatus": rows,
+                "webservice": webservice_data,
+                "count": len(rows),
+            }
+
+        # Rows are already JSON-native, so skip DRF's renderer for large payloads
+        response = HttpResponse(
+            json.dumps(payload, cls=DjangoJSONEncoder, separators=(",", ":")),
+            content_type="application/json",
         )
+        return set_validators(response, etag, last_modified)
     except WebService.DoesNotExist:
         return Response(
             {"success": False, "error": "WebService not found for this user."},
@@ -166,6 +489,357 @@ def get_webstatus_by_service(request, service_id):
         )
 
 
+def requested_services(request):
+    """
+    The user's service ids, narrowed by ?services=1,2,3
+    Returns (ids, None) or (None, error response).
+    """
+    service_ids = set(
+        WebService.objects.filter(user=request.user).values_list("id", flat=True)
+    )
+    requested = request.query_params.get("services")
+    if requested:
+        try:
+            requested_ids = {int(value) for value in requested.split(",") if value}
+        except ValueError:
+            return None, Response(
+                {"success": False, "error": "services must be a list of ids."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not requested_ids <= service_ids:
+            return None, Response(
+                {"success": False, "error": "WebService not found for this user."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        service_ids = requested_ids
+    return service_ids, None
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+@replica_reads
+def chart_webstatus(request, service_id):
+    """
+    Downsampled ping and uptime series for charting a webservice
+    ?start=&end= bound the range (default: the last 24 hours), ?points= the
+    number of buckets (default BYTEPING_CHART_DEFAULT_POINTS)
+    """
+    try:
+        end = parse_time_bound(request.query_params.get("end")) or now()
+        start = parse_time_bound(request.query_params.get("start")) or end - timedelta(
+            hours=24
+        )
+    except ValueError as e:
+        return Response(
+            {"success": False, "error": str(e)},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if start >= end:
+        return Response(
+            {"success": False, "error": "start must be before end."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    try:
+        points = int(
+            request.query_params.get("points", settings.BYTEPING_CHART_DEFAULT_POINTS)
+        )
+    except ValueError:
+        points = 0
+    if not 1 <= points <= settings.BYTEPING_CHART_MAX_POINTS:
+        return Response(
+            {
+                "success": False,
+                "error": f"points must be between 1 and {settings.BYTEPING_CHART_MAX_POINTS}.",
+            },
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    if not WebService.objects.filter(id=service_id, user=request.user).exists():
+        return Response(
+            {"success": False, "error": "WebService not found for this user."},
+            status=status.HTTP_404_NOT_FOUND,
+        )
+
+    chart = chart_series(service_id, start, end, points)
+    return Response(
+        {
+            "success": True,
+            "start": start,
+            "end": end,
+            "points": points,
+            **chart,
+        }
+    )
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+@replica_reads
+def sla_report(request):
+    """
+    SLA report over the user's services for one month
+    ?month=YYYY-MM, the last full month by default
+    """
+    try:
+        start, end = parse_month(request.query_params.get("month"))
+    except ValueError as e:
+        return Response(
+            {"success": False, "error": str(e)},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    report = user_reports(start, end, [request.user.id]).get(request.user.id)
+    if report is None:
+        return Response(
+            {"success": False, "error": "No services to report on for this month."},
+            status=status.HTTP_404_NOT_FOUND,
+        )
+    return Response({"success": True, **report})
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def add_status_page(request):
+    """
+    Create a public status page for some of the user's services
+    Its first snapshot is built before responding, so the page works at once.
+    """
+    serializer = StatusPageSerializer(data=request.data, context={"request": request})
+    if not serializer.is_valid():
+        return Response(
+            {"success": False, "error": serializer.errors},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    page = serializer.save(user=request.user)
+    rebuild_snapshot(page.id)
+    page.refresh_from_db()
+    return Response(
+        {"success": True, "status_page": StatusPageSerializer(page).data},
+        status=status.HTTP_201_CREATED,
+    )
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def get_status_pages(request):
+    pages = StatusPage.objects.filter(user=request.user).prefetch_related("webservices")
+    return Response(
+        {
+            "success": True,
+            "status_pages": StatusPageSerializer(pages, many=True).data,
+        }
+    )
+
+
+@api_view(["DELETE"])
+@permission_classes([IsAuthenticated])
+def delete_status_page(request, id):
+    page = StatusPage.objects.filter(id=id, user=request.user).first()
+    if page is None:
+        return Response(
+            {"success": False, "error": "StatusPage not found."},
+            status=status.HTTP_404_NOT_FOUND,
+        )
+    page.delete()
+    snapshot_cache.invalidate(page.slug)
+    return Response({"success": True, "message": "status page removed"})
+
+
+@api_view(["GET"])
+@authentication_classes([ProbeAgentAuthentication])
+@permission_classes([IsProbeAgent])
+def agent_checks(request):
+    """
+    Checks assigned to the calling probe agent, with their probe timeouts
+    """
+    agent = request.auth
+    ProbeAgent.objects.filter(id=agent.id).update(last_seen_at=now())
+    checks = [
+        {
+            "id": check["id"],
+            "url": check["webservice_url"],
+            "expect_status_code": check["expect_status_code"],
+            "interval": check["monitor_interval"],
+            "timeouts": probe_timeouts(check["id"]),
+        }
+        for check in assigned_checks(agent)
+    ]
+    return Response(
+        {
+            "success": True,
+            "agent": agent.name,
+            "poll_seconds": settings.BYTEPING_AGENT_POLL_SECONDS,
+            "max_batch": settings.BYTEPING_AGENT_MAX_BATCH,
+            "checks": checks,
+        }
+    )
+
+
+@api_view(["POST"])
+@authentication_classes([ProbeAgentAuthentication])
+@permission_classes([IsProbeAgent])
+@parser_classes([GzipJSONParser])
+def agent_results(request):
+    """
+    Ingest a batch of check results from a probe agent
+    Body: {"idempotency_key": "...", "results": [...]}, optionally gzip-encoded.
+    Re-sending a batch with the same key returns the first outcome unchanged.
+    """
+    data = request.data if isinstance(request.data, dict) else {}
+    idempotency_key = data.get("idempotency_key")
+    results = data.get("results")
+    if not isinstance(idempotency_key, str) or not 0 < len(idempotency_key) <= 64:
+        return Response(
+            {
+                "success": False,
+                "error": "An idempotency_key of up to 64 characters is required.",
+            },
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if not isinstance(results, list):
+        return Response(
+            {"success": False, "error": "results must be a list."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if len(results) > settings.BYTEPING_AGENT_MAX_BATCH:
+        return Response(
+            {
+                "success": False,
+                "error": f"At most {settings.BYTEPING_AGENT_MAX_BATCH} results per batch.",
+            },
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    outcome, replayed = ingest(request.auth, idempotency_key, results)
+    return Response(
+        {"success": True, "replayed": replayed, **outcome},
+        status=status.HTTP_200_OK if replayed else status.HTTP_201_CREATED,
+    )
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+@replica_reads
+def get_incidents(request, service_id):
+    """
+    Outage timeline and downtime summary for a webservice
+    ?start=&end= limit it to incidents overlapping that range
+    """
+    try:
+        start = parse_time_bound(request.query_params.get("start"))
+        end = parse_time_bound(request.query_params.get("end"))
+    except ValueError as e:
+        return Response(
+            {"success": False, "error": str(e)},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    if not WebService.objects.filter(id=service_id, user=request.user).exists():
+        return Response(
+            {"success": False, "error": "WebService not found for this user."},
+            status=status.HTTP_404_NOT_FOUND,
+        )
+
+    incidents = Incident.objects.filter(webservice_id=service_id)
+    if start is not None:
+        incidents = incidents.filter(Q(ended_at__gte=start) | Q(ended_at__isnull=True))
+    if end is not None:
+        incidents = incidents.filter(started_at__lt=end)
+    incidents = list(incidents.order_by("-started_at"))
+
+    return Response(
+        {
+            "success": True,
+            "incidents": IncidentSerializer(incidents, many=True).data,
+            **summarize(incidents, now()),
+        }
+    )
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+@replica_reads
+def latency_percentiles(request):
+    """
+    Latency percentiles over a time range for the user's services
+    ?services=1,2 narrows the services, ?start=&end= the range (whole hours),
+    ?quantiles=0.5,0.95,0.99 picks the quantiles
+    """
+    try:
+        start = parse_time_bound(request.query_params.get("start"))
+        end = parse_time_bound(request.query_params.get("end"))
+        quantiles = [
+            float(value)
+            for value in request.query_params.get("quantiles", "").split(",")
+            if value
+        ] or list(DEFAULT_QUANTILES)
+    except ValueError as e:
+        return Response(
+            {"success": False, "error": str(e)},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if not all(0 <= quantile <= 1 for quantile in quantiles):
+        return Response(
+            {"success": False, "error": "quantiles must be between 0 and 1."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    service_ids, error = requested_services(request)
+    if error is not None:
+        return error
+
+    sketch = merged_sketch(service_ids, start, end)
+    percentiles = {}
+    for quantile in quantiles:
+        value = sketch.quantile(quantile)
+        percentiles[f"p{quantile * 100:g}"] = None if value is None else round(value, 2)
+    return Response(
+        {
+            "success": True,
+            "services": sorted(service_ids),
+            "count": sketch.count,
+            "relative_accuracy": sketch.accuracy,
+            "percentiles": percentiles,
+        }
+    )
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+@replica_reads
+def export_webstatus(request):
+    """
+    Stream raw webstatus rows for the user's services as NDJSON or CSV
+    """
+    output = request.query_params.get("output", "ndjson")
+    if output not in RENDERERS:
+        return Response(
+            {"success": False, "error": "output must be one of: ndjson, csv."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    try:
+        start = parse_time_bound(request.query_params.get("start"))
+        end = parse_time_bound(request.query_params.get("end"))
+    except ValueError as e:
+        return Response(
+            {"success": False, "error": str(e)},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    service_ids, error = requested_services(request)
+    if error is not None:
+        return error
+
+    render, content_type = RENDERERS[output]
+    response = StreamingHttpResponse(
+        render(iter_webstatus(service_ids, start, end)), content_type=content_type
+    )
+    response["Content-Disposition"] = f'attachment; filename="webstatus.{output}"'
+    return response
+
+
 # @api_view(["GET"])
 # @permission_classes([IsAuthenticated])
 # def get_webstatus(request, id):
@@ -0,0 +1,225 @@
+"""
+BytePing remote probe agent
+
+Runs checks from another region or network and pushes the results to a
+BytePing server in batches. Needs only Python 3 and `requests`:
+
+    python agent.py --server https://byteping.example.com --token <token>
+
+Create a token with `python manage.py create_probe_agent <name> --assign <ids>`.
+Several agents can run side by side, each with its own token.
+"""
+
+import argparse
+import gzip
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import requests
+
+logger = logging.getLogger("byteping.agent")
+
+# Failed batches wait at most this long before the next attempt
+MAX_RETRY_SECONDS = 300
+# Oldest failed batches are dropped beyond this many, bounding memory while the
+# server is unreachable
+MAX_QUEUED_BATCHES = 1000
+
+
+class Agent:
+    def __init__(self, server, token, concurrency, batch_size, flush_seconds):
+        self.server = server.rstrip("/")
+        self.session = requests.Session()
+        self.session.headers["Authorization"] = f"Agent {token}"
+        self.pool = ThreadPoolExecutor(max_workers=concurrency)
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.checks = []
+        self.poll_seconds = 60
+        self.next_run = {}
+        self.pending = []
+        self.lock = threading.Lock()
+        # Batches awaiting delivery; only the sender thread touches it
+        self.outbox = deque()
+        self.wake = threading.Event()
+
+    def poll(self):
+        """
+        Refresh the assigned checks from the server
+        """
+        response = self.session.get(f"{self.server}/api/agent/checks/", timeout=30)
+        response.raise_for_status()
+        data = response.json()
+        self.checks = data["checks"]
+        self.poll_seconds = data["poll_seconds"]
+        self.batch_size = min(self.batch_size, data["max_batch"])
+        logger.info("%s checks assigned", len(self.checks))
+
+    def run_check(self, check):
+        started = time.perf_counter()
+        try:
+            response = requests.get(
+                check["url"], timeout=tuple(check["timeouts"]), allow_redirects=True
+            )
+            status_code = response.status_code
+            status = status_code == check["expect_status_code"]
+        except requests.exceptions.RequestException:
+            status_code, status = 0, False
+        ping = int((time.perf_counter() - started) * 1000)
+
+        with self.lock:
+            self.pending.append(
+                {
+                    "webservice_id": check["id"],
+                    "ping": ping,
+                    "status": status,
+                    "status_code": status_code,
+                    "date_and_time": datetime.now(timezone.utc).isoformat(),
+                }
+            )
+
+    def flush(self):
+        """
+        Batch the pending results and try each due batch once
+
+        A batch that fails is kept with its idempotency key and retried after
+        a growing delay, so results survive an outage and a batch the server
+        already applied is not written twice.
+        """
+        with self.lock:
+            pending, self.pending = self.pending, []
+        for start in range(0, len(pending), self.batch_size):
+            self.outbox.append(
+                {
+                    "idempotency_key": uuid.uuid4().hex,
+                    "results": pending[start : start + self.batch_size],
+                    "attempts": 0,
+                    "retry_at": 0,
+                }
+            )
+        while len(self.outbox) > MAX_QUEUED_BATCHES:
+            dropped = self.outbox.popleft()
+            logger.error("Dropped a batch of %s results", len(dropped["results"]))
+
+        now = time.monotonic()
+        for batch in list(self.outbox):
+            if batch["retry_at"] > now:
+                continue
+            if self.send(batch):
+                self.outbox.remove(batch)
+                continue
+            batch["attempts"] += 1
+            batch["retry_at"] = now + min(MAX_RETRY_SECONDS, 2 ** batch["attempts"])
+            logger.warning(
+                "Could not send %s results, %s batches queued",
+                len(batch["results"]),
+                len(self.outbox),
+            )
+            # The server is likely down; leave the rest for the next round
+            break
+
+    def send(self, batch):
+        """
+        Post one batch; returns False if it should be retried
+        """
+        body = gzip.compress(
+            json.dumps(
+                {
+                    "idempotency_key": batch["idempotency_key"],
+                    "results": batch["results"],
+                }
+            ).encode()
+        )
+        try:
+            response = self.session.post(
+                f"{self.server}/api/agent/results/",
+                data=body,
+                headers={
+                    "Content-Type": "application/json",
+                    "Content-Encoding": "gzip",
+                },
+                timeout=30,
+            )
+        except requests.exceptions.RequestException:
+            return False
+        if response.ok:
+            self.report(response.json(), len(batch["results"]))
+            return True
+        if response.status_code < 500:
+            # Retrying a rejected batch will not change the answer
+            logger.error("Batch rejected: %s", response.text[:200])
+            return True
+        return False
+
+    def report(self, outcome, sent):
+        """
+        Log the server's verdict on a delivered batch
+        Rejected rows are not retried: the server would reject them again.
+        """
+        logger.info("Sent %s results, %s accepted", sent, outcome["accepted"])
+        if outcome["rejected"]:
+            logger.warning("%s results rejected", outcome["rejected"])
+            for error in outcome.get("errors", [])[:5]:
+                logger.warning("Row %s: %s", error["row"], error["error"])
+
+    def send_loop(self):
+        """
+        Flush every flush_seconds, or sooner when a full batch is waiting
+
+        Runs on its own thread so slow or failing deliveries never hold up
+        the checks.
+        """
+        while True:
+            self.wake.wait(self.flush_seconds)
+            self.wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Flush failed")
+
+    def run(self):
+        threading.Thread(target=self.send_loop, daemon=True).start()
+        last_poll = 0
+        while True:
+            now = time.monotonic()
+            if now - last_poll >= self.poll_seconds:
+                try:
+                    self.poll()
+                except requests.exceptions.RequestException as e:
+                    logger.warning("Poll failed: %s", e)
+                last_poll = now
+
+            for check in self.checks:
+                if self.next_run.get(check["id"], 0) <= now:
+                    self.next_run[check["id"]] = now + check["interval"] * 60
+                    self.pool.submit(self.run_check, check)
+
+            if len(self.pending) >= self.batch_size:
+                self.wake.set()
+            time.sleep(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--server", required=True, help="BytePing base URL")
+    parser.add_argument("--token", required=True, help="Agent token")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument(
+        "--flush-seconds", type=int, default=15, help="Send results at least this often"
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="BytePing agent: %(message)s")
+    Agent(
+        args.server, args.token, args.concurrency, args.batch_size, args.flush_seconds
+    ).run()
+
+
+if __name__ == "__main__":
+    main()